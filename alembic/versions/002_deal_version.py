@@ -0,0 +1,22 @@
+"""Deal version column for optimistic concurrency
+
+Revision ID: 002_deal_version
+Revises: 001_initial
+Create Date: 2026-10-19 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '002_deal_version'
+down_revision = '001_initial'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column(
+        'deals',
+        sa.Column('version', sa.Integer(), nullable=False, server_default='1'),
+    )
+
+def downgrade() -> None:
+    op.drop_column('deals', 'version')
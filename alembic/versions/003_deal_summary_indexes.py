@@ -0,0 +1,31 @@
+"""Deal updated_at default and per-participant keyset indexes
+
+Revision ID: 003_deal_summary_indexes
+Revises: 002_deal_version
+Create Date: 2026-10-19 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '003_deal_summary_indexes'
+down_revision = '002_deal_version'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.execute('UPDATE deals SET updated_at = created_at WHERE updated_at IS NULL')
+    op.alter_column('deals', 'updated_at', server_default=sa.func.now())
+
+    op.create_index(
+        'idx_deals_student_updated', 'deals',
+        ['student_id', sa.text('updated_at DESC'), sa.text('id DESC')],
+    )
+    op.create_index(
+        'idx_deals_teacher_updated', 'deals',
+        ['teacher_id', sa.text('updated_at DESC'), sa.text('id DESC')],
+    )
+
+def downgrade() -> None:
+    op.drop_index('idx_deals_teacher_updated', table_name='deals')
+    op.drop_index('idx_deals_student_updated', table_name='deals')
+    op.alter_column('deals', 'updated_at', server_default=None)
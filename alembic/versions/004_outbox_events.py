@@ -0,0 +1,34 @@
+"""Transactional outbox table
+
+Revision ID: 004_outbox_events
+Revises: 003_deal_summary_indexes
+Create Date: 2026-10-19 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '004_outbox_events'
+down_revision = '003_deal_summary_indexes'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'outbox_events',
+        sa.Column('id', sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column('aggregate_type', sa.String(50), nullable=False),
+        sa.Column('aggregate_id', sa.String(36), nullable=False),
+        sa.Column('event_type', sa.String(100), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column('published_at', sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index(
+        'idx_outbox_unpublished', 'outbox_events', ['id'],
+        postgresql_where=sa.text('published_at IS NULL'),
+    )
+
+def downgrade() -> None:
+    op.drop_index('idx_outbox_unpublished', table_name='outbox_events')
+    op.drop_table('outbox_events')
@@ -0,0 +1,59 @@
+"""Gamification: user stats, reviews, processed deals
+
+Revision ID: 005_gamification_stats
+Revises: 004_outbox_events
+Create Date: 2026-10-19 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '005_gamification_stats'
+down_revision = '004_outbox_events'
+branch_labels = None
+depends_on = None
+
+EXCHANGE_CATEGORIES = ['programming', 'design', 'languages', 'math', 'science',
+                       'business', 'music', 'sports', 'other']
+
+def upgrade() -> None:
+    op.execute("ALTER TYPE badgetype ADD VALUE IF NOT EXISTS 'category_expert'")
+
+    op.create_table(
+        'user_stats',
+        sa.Column('user_id', sa.String(36), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('reputation', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('exchanges_completed', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total_ratings', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('average_rating', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('level', sa.Integer(), nullable=False, server_default='1'),
+        sa.Column('experience', sa.Integer(), nullable=False, server_default='0'),
+        *[sa.Column(f'{category}_exchanges', sa.Integer(), nullable=False, server_default='0')
+          for category in EXCHANGE_CATEGORIES],
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+    op.create_table(
+        'reviews',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('author_id', sa.String(36), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('target_user_id', sa.String(36), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('deal_id', sa.Integer(), sa.ForeignKey('deals.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('rating', sa.Integer(), nullable=False),
+        sa.Column('text', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.UniqueConstraint('deal_id', 'author_id', name='uq_reviews_deal_author'),
+    )
+    op.create_index('ix_reviews_target_user_id', 'reviews', ['target_user_id'])
+
+    op.create_table(
+        'gamification_processed_deals',
+        sa.Column('deal_id', sa.Integer(), sa.ForeignKey('deals.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('processed_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+def downgrade() -> None:
+    op.drop_table('gamification_processed_deals')
+    op.drop_index('ix_reviews_target_user_id', table_name='reviews')
+    op.drop_table('reviews')
+    op.drop_table('user_stats')
+    # Значение category_expert остаётся в типе badgetype: PostgreSQL не удаляет значения enum
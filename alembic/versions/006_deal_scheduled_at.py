@@ -0,0 +1,25 @@
+"""Deal session time for reminders
+
+Revision ID: 006_deal_scheduled_at
+Revises: 005_gamification_stats
+Create Date: 2026-10-19 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '006_deal_scheduled_at'
+down_revision = '005_gamification_stats'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # Существующие сделки остаются без scheduled_at: время заполнится при следующем предложении условий
+    op.add_column('deals', sa.Column('scheduled_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index(
+        'idx_deals_confirmed_scheduled', 'deals', ['scheduled_at'],
+        postgresql_where=sa.text("status = 'CONFIRMED'"),
+    )
+
+def downgrade() -> None:
+    op.drop_index('idx_deals_confirmed_scheduled', table_name='deals')
+    op.drop_column('deals', 'scheduled_at')
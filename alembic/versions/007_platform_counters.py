@@ -0,0 +1,153 @@
+"""Platform counters maintained by triggers
+
+Revision ID: 007_platform_counters
+Revises: 006_deal_scheduled_at
+Create Date: 2026-10-19 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '007_platform_counters'
+down_revision = '006_deal_scheduled_at'
+branch_labels = None
+depends_on = None
+
+COUNTER_FUNCTIONS = [
+    """
+    CREATE OR REPLACE FUNCTION platform_counter_add(p_kind text, p_key text, p_delta bigint)
+    RETURNS void AS $$
+    BEGIN
+        IF p_delta = 0 OR p_key IS NULL OR p_key = '' THEN
+            RETURN;
+        END IF;
+        INSERT INTO platform_counters (kind, key, value) VALUES (p_kind, p_key, p_delta)
+        ON CONFLICT (kind, key) DO UPDATE SET value = platform_counters.value + EXCLUDED.value;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION platform_counters_users() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM platform_counter_add('total', 'users', 1);
+            PERFORM platform_counter_add(
+                'users_day', to_char(COALESCE(NEW.created_at, now()) AT TIME ZONE 'UTC', 'YYYY-MM-DD'), 1
+            );
+        ELSE
+            PERFORM platform_counter_add('total', 'users', -1);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION platform_counters_profiles() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE' AND OLD.university IS NOT DISTINCT FROM NEW.university THEN
+            RETURN NULL;
+        END IF;
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            PERFORM platform_counter_add('university', OLD.university, -1);
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            PERFORM platform_counter_add('university', NEW.university, 1);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION platform_counters_reviews() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM platform_counter_add('total', 'reviews', 1);
+            PERFORM platform_counter_add('total', 'rating_sum', NEW.rating);
+        ELSE
+            PERFORM platform_counter_add('total', 'reviews', -1);
+            PERFORM platform_counter_add('total', 'rating_sum', -OLD.rating);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION platform_counters_deals() RETURNS trigger AS $$
+    DECLARE
+        was_completed boolean := TG_OP <> 'INSERT' AND OLD.status = 'COMPLETED';
+        is_completed boolean := TG_OP <> 'DELETE' AND NEW.status = 'COMPLETED';
+        delta bigint;
+        deal_category text;
+    BEGIN
+        IF was_completed = is_completed THEN
+            RETURN NULL;
+        END IF;
+        delta := CASE WHEN is_completed THEN 1 ELSE -1 END;
+        SELECT ads.category::text INTO deal_category
+        FROM chats JOIN ads ON ads.id = chats.ad_id
+        WHERE chats.id = CASE WHEN TG_OP = 'DELETE' THEN OLD.chat_id ELSE NEW.chat_id END;
+        PERFORM platform_counter_add('total', 'exchanges', delta);
+        PERFORM platform_counter_add('category', deal_category, delta);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+]
+
+TRIGGERS = [
+    ('trg_platform_counters_users', 'users', 'INSERT OR DELETE', 'platform_counters_users'),
+    ('trg_platform_counters_profiles', 'user_profiles', 'INSERT OR DELETE OR UPDATE OF university', 'platform_counters_profiles'),
+    ('trg_platform_counters_reviews', 'reviews', 'INSERT OR DELETE', 'platform_counters_reviews'),
+    ('trg_platform_counters_deals', 'deals', 'INSERT OR DELETE OR UPDATE OF status', 'platform_counters_deals'),
+]
+
+FUNCTION_NAMES = [
+    'platform_counters_deals()', 'platform_counters_reviews()', 'platform_counters_profiles()',
+    'platform_counters_users()', 'platform_counter_add(text, text, bigint)',
+]
+
+BACKFILL = """
+INSERT INTO platform_counters (kind, key, value)
+SELECT 'total', 'users', count(*) FROM users
+UNION ALL
+SELECT 'users_day', day, count(*) FROM (
+    SELECT to_char(created_at AT TIME ZONE 'UTC', 'YYYY-MM-DD') AS day FROM users WHERE created_at IS NOT NULL
+) AS days GROUP BY day
+UNION ALL
+SELECT 'university', university, count(*) FROM user_profiles WHERE university <> '' GROUP BY university
+UNION ALL
+SELECT 'total', 'reviews', count(*) FROM reviews
+UNION ALL
+SELECT 'total', 'rating_sum', COALESCE(sum(rating), 0) FROM reviews
+UNION ALL
+SELECT 'total', 'exchanges', count(*) FROM deals WHERE status = 'COMPLETED'
+UNION ALL
+SELECT 'category', ads.category::text, count(*)
+FROM deals JOIN chats ON chats.id = deals.chat_id JOIN ads ON ads.id = chats.ad_id
+WHERE deals.status = 'COMPLETED' GROUP BY ads.category
+ON CONFLICT (kind, key) DO UPDATE SET value = EXCLUDED.value
+"""
+
+def upgrade() -> None:
+    op.create_table(
+        'platform_counters',
+        sa.Column('kind', sa.String(20), primary_key=True),
+        sa.Column('key', sa.String(200), primary_key=True),
+        sa.Column('value', sa.BigInteger(), nullable=False, server_default='0'),
+    )
+
+    for statement in COUNTER_FUNCTIONS:
+        op.execute(statement)
+
+    # Счётчики заполняются под блокировкой исходных таблиц, чтобы не потерять
+    # записи между созданием триггеров и подсчётом
+    op.execute("LOCK TABLE users, user_profiles, reviews, deals IN SHARE ROW EXCLUSIVE MODE")
+    for name, table, events, function in TRIGGERS:
+        op.execute(f"CREATE TRIGGER {name} AFTER {events} ON {table} FOR EACH ROW EXECUTE FUNCTION {function}()")
+    op.execute(BACKFILL)
+
+def downgrade() -> None:
+    for name, table, _, _ in TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+    for function in FUNCTION_NAMES:
+        op.execute(f"DROP FUNCTION IF EXISTS {function}")
+    op.drop_table('platform_counters')
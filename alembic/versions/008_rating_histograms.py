@@ -0,0 +1,56 @@
+"""Rating histograms, bayesian rating and keyset index for reviews
+
+Revision ID: 008_rating_histograms
+Revises: 007_platform_counters
+Create Date: 2026-10-19 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '008_rating_histograms'
+down_revision = '007_platform_counters'
+branch_labels = None
+depends_on = None
+
+RATING_FIELDS = [f'rating_{stars}' for stars in range(1, 6)]
+
+# Должны совпадать с app.models.gamification
+RATING_PRIOR_MEAN = 4.0
+RATING_PRIOR_WEIGHT = 5
+
+def upgrade() -> None:
+    for field in RATING_FIELDS:
+        op.add_column('user_stats', sa.Column(field, sa.Integer(), nullable=False, server_default='0'))
+    op.add_column(
+        'user_stats',
+        sa.Column('bayesian_rating', sa.Float(), nullable=False, server_default=str(RATING_PRIOR_MEAN))
+    )
+
+    histogram = ', '.join(f'count(*) FILTER (WHERE rating = {stars}) AS {field}'
+                          for stars, field in enumerate(RATING_FIELDS, 1))
+    op.execute(f"""
+        UPDATE user_stats SET
+            {', '.join(f'{field} = agg.{field}' for field in RATING_FIELDS)},
+            bayesian_rating = ({RATING_PRIOR_MEAN * RATING_PRIOR_WEIGHT} + agg.rating_sum)::float
+                              / ({RATING_PRIOR_WEIGHT} + agg.total)
+        FROM (
+            SELECT target_user_id, count(*) AS total, sum(rating) AS rating_sum, {histogram}
+            FROM reviews GROUP BY target_user_id
+        ) AS agg
+        WHERE user_stats.user_id = agg.target_user_id
+    """)
+
+    op.create_index('idx_user_stats_bayesian_rating', 'user_stats', [sa.text('bayesian_rating DESC')])
+    op.create_index(
+        'idx_reviews_target_created', 'reviews',
+        ['target_user_id', sa.text('created_at DESC'), sa.text('id DESC')]
+    )
+    op.drop_index('ix_reviews_target_user_id', table_name='reviews')
+
+def downgrade() -> None:
+    op.create_index('ix_reviews_target_user_id', 'reviews', ['target_user_id'])
+    op.drop_index('idx_reviews_target_created', table_name='reviews')
+    op.drop_index('idx_user_stats_bayesian_rating', table_name='user_stats')
+    op.drop_column('user_stats', 'bayesian_rating')
+    for field in RATING_FIELDS:
+        op.drop_column('user_stats', field)
@@ -0,0 +1,34 @@
+"""Activity counters and unlocked achievements
+
+Revision ID: 009_activity_achievements
+Revises: 008_rating_histograms
+Create Date: 2026-10-19 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '009_activity_achievements'
+down_revision = '008_rating_histograms'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'user_activity_counters',
+        sa.Column('user_id', sa.String(36), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('messages_sent', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('ads_viewed', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('responses_made', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+    op.create_table(
+        'user_achievements',
+        sa.Column('user_id', sa.String(36), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('code', sa.String(50), primary_key=True),
+        sa.Column('unlocked_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+def downgrade() -> None:
+    op.drop_table('user_achievements')
+    op.drop_table('user_activity_counters')
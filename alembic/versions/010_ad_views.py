@@ -0,0 +1,21 @@
+"""Ad views counter
+
+Revision ID: 010_ad_views
+Revises: 009_activity_achievements
+Create Date: 2026-10-19 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '010_ad_views'
+down_revision = '009_activity_achievements'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column('ads', sa.Column('views_count', sa.Integer(), nullable=False, server_default='0'))
+    op.create_index('idx_ads_views', 'ads', [sa.text('views_count DESC'), sa.text('created_at DESC')])
+
+def downgrade() -> None:
+    op.drop_index('idx_ads_views', table_name='ads')
+    op.drop_column('ads', 'views_count')
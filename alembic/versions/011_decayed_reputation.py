@@ -0,0 +1,61 @@
+"""Time-decayed reputation in user_stats
+
+Revision ID: 011_decayed_reputation
+Revises: 010_ad_views
+Create Date: 2026-10-19 00:00:00.000000
+"""
+import math
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '011_decayed_reputation'
+down_revision = '010_ad_views'
+branch_labels = None
+depends_on = None
+
+# Должны совпадать с app.models.gamification и app.services.gamification
+REPUTATION_DECAY_RATE = math.log(2) / (30 * 24 * 60 * 60)
+REPUTATION_PER_EXCHANGE = 10
+REPUTATION_PER_RATING_POINT = 2
+
+def upgrade() -> None:
+    op.add_column('user_stats', sa.Column('decayed_reputation', sa.Float(), nullable=False, server_default='0'))
+    op.add_column('user_stats', sa.Column('decayed_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('user_stats', sa.Column('trending_score', sa.Float(), nullable=True))
+
+    # Начальное значение — сумма прошлых начислений, каждое со своим затуханием.
+    # Момент завершения обмена берётся из deals.updated_at.
+    op.execute(f"""
+        WITH events AS (
+            SELECT student_id AS user_id, updated_at AS at, {REPUTATION_PER_EXCHANGE} AS points
+            FROM deals WHERE status = 'COMPLETED'
+            UNION ALL
+            SELECT teacher_id, updated_at, {REPUTATION_PER_EXCHANGE}
+            FROM deals WHERE status = 'COMPLETED'
+            UNION ALL
+            SELECT target_user_id, created_at, rating * {REPUTATION_PER_RATING_POINT} FROM reviews
+        ), agg AS (
+            SELECT user_id, sum(points * exp(-least(
+                {REPUTATION_DECAY_RATE} * greatest(extract(epoch FROM now() - at)::float, 0), 700
+            ))) AS decayed
+            FROM events GROUP BY user_id
+        )
+        UPDATE user_stats SET
+            decayed_reputation = agg.decayed,
+            decayed_at = now(),
+            trending_score = CASE WHEN agg.decayed > 0
+                THEN ln(agg.decayed) + {REPUTATION_DECAY_RATE} * extract(epoch FROM now())::float END
+        FROM agg
+        WHERE user_stats.user_id = agg.user_id
+    """)
+
+    op.create_index(
+        'idx_user_stats_trending_score', 'user_stats', [sa.text('trending_score DESC NULLS LAST')]
+    )
+
+def downgrade() -> None:
+    op.drop_index('idx_user_stats_trending_score', table_name='user_stats')
+    op.drop_column('user_stats', 'trending_score')
+    op.drop_column('user_stats', 'decayed_at')
+    op.drop_column('user_stats', 'decayed_reputation')
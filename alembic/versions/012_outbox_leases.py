@@ -0,0 +1,19 @@
+"""Outbox event leases and retry backoff
+
+Revision ID: 012_outbox_leases
+Revises: 011_decayed_reputation
+Create Date: 2026-10-19 00:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '012_outbox_leases'
+down_revision = '011_decayed_reputation'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column('outbox_events', sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=True))
+
+def downgrade() -> None:
+    op.drop_column('outbox_events', 'next_attempt_at')
@@ -11,9 +11,11 @@ from app.models.deal import DealStatus
 from app.schemas.admin import (
     UserListOut, AdListAdminOut, AdminLogOut, AdminStatsOut,
     ChatAdminOut, DealAdminOut, MessageAdminOut,
-    UserBanRequest, AdminActionRequest
+    UserBanRequest, AdminActionRequest, BroadcastRequest
 )
 from app.services.admin import AdminService
+from app.services.sms import sms_dispatcher
+from app.services.broadcast import telegram_broadcast
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
@@ -304,4 +306,53 @@ async def get_admin_stats(
     """Получение статистики для админ-панели."""
     admin_service = AdminService(db)
     stats = await admin_service.get_admin_stats()
-    return AdminStatsOut(**stats)
\ No newline at end of file
+    return AdminStatsOut(**stats)
+
+@router.get("/sms/metrics", response_model=dict)
+async def get_sms_metrics(
+    current_user: User = Depends(get_admin_user)
+):
+    """Очередь отправки кодов: глубина, доставка по каналам, задержка и состояние провайдеров (по текущему процессу)."""
+    return sms_dispatcher.metrics()
+
+# --- Рассылки ---
+
+@router.post("/telegram/broadcast", response_model=dict, status_code=status.HTTP_202_ACCEPTED)
+async def start_telegram_broadcast(
+    broadcast: BroadcastRequest,
+    current_user: User = Depends(get_admin_user)
+):
+    """Запуск рассылки объявления всем подписчикам Telegram (выполняется в фоне)."""
+    try:
+        return await telegram_broadcast.create(broadcast.title, broadcast.content, str(current_user.id))
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+
+@router.get("/telegram/broadcast", response_model=dict)
+async def get_telegram_broadcast(
+    current_user: User = Depends(get_admin_user)
+):
+    """Прогресс последней рассылки: отправлено, ошибки, осталось, ETA."""
+    progress = await telegram_broadcast.get_progress()
+    if progress is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No broadcasts yet"
+        )
+    return progress
+
+@router.post("/telegram/broadcast/cancel", response_model=dict)
+async def cancel_telegram_broadcast(
+    current_user: User = Depends(get_admin_user)
+):
+    """Остановка текущей рассылки."""
+    progress = await telegram_broadcast.cancel()
+    if progress is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No broadcasts yet"
+        )
+    return progress
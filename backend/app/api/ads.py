@@ -1,18 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 import math 
 
 from app.database import get_db
-from app.api.deps import get_current_active_user
+from app.api.deps import get_current_active_user, get_optional_user_id, write_rate_limit
 from app.models.user import User
 from app.models.ad import Ad, AdCategory, AdLevel, AdFormat
-from app.schemas.ad import AdCreate, AdUpdate, AdOut, AdListOut, AdFilter
+from app.schemas.ad import AdCreate, AdUpdate, AdOut, AdListOut, AdFilter, AdStatsOut
 from app.services.ad import AdService
+from app.services.ad_views import ad_views
 
 router = APIRouter(prefix="/ads", tags=["Ads"])
 
-@router.post("", response_model=AdOut, status_code=status.HTTP_201_CREATED)
+@router.post("", response_model=AdOut, status_code=status.HTTP_201_CREATED, dependencies=[Depends(write_rate_limit)])
 async def create_ad(
     ad_data: AdCreate,
     current_user: User = Depends(get_current_active_user),
@@ -33,6 +34,8 @@ async def create_ad(
 @router.get("/{ad_id}", response_model=AdOut)
 async def get_ad(
     ad_id: str,
+    request: Request,
+    viewer_id: Optional[str] = Depends(get_optional_user_id),
     db: AsyncSession = Depends(get_db)
 ):
     """Получение объявления по ID."""
@@ -44,9 +47,39 @@ async def get_ad(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Ad not found"
         )
+
+    if viewer_id != ad.author_id:
+        viewer = viewer_id or f"ip:{request.client.host if request.client else 'unknown'}"
+        ad_views.record_view(ad.id, viewer, user_id=viewer_id)
     
     return ad
 
+@router.get("/{ad_id}/stats", response_model=AdStatsOut)
+async def get_ad_stats(
+    ad_id: str,
+    days: int = Query(30, ge=1, le=90, description="Глубина дневной статистики"),
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Статистика просмотров объявления (только для автора)."""
+    ad_service = AdService(db)
+    ad = await ad_service.get_ad_by_id(ad_id)
+
+    if not ad:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Ad not found"
+        )
+
+    if ad.author_id != str(current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Cannot view other user's ad stats"
+        )
+
+    stats = await ad_views.get_stats(ad.id, days)
+    return AdStatsOut(ad_id=ad.id, views_count=ad.views_count, **stats)
+
 @router.patch("/{ad_id}", response_model=AdOut)
 async def update_ad(
     ad_id: str,
@@ -104,7 +137,7 @@ async def get_ads(
     level: Optional[AdLevel] = Query(None),
     format: Optional[AdFormat] = Query(None),
     q: Optional[str] = Query(None),
-    sort: str = Query("newest", regex="^(newest|popular)$"),
+    sort: str = Query("newest", regex="^(newest|popular|rating)$"),
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
     db: AsyncSession = Depends(get_db)
@@ -122,6 +155,7 @@ async def get_ads(
     
     ad_service = AdService(db)
     ads, total = await ad_service.get_ads_with_filters(filters)
+    ad_views.record_impressions(ad.id for ad in ads)
 
     pages = math.ceil(total / page_size) if total > 0 else 1
     
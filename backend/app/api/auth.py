@@ -2,15 +2,18 @@ from fastapi import APIRouter, Depends, HTTPException, status, Response, Request
 from app.schemas.auth import (
     PhoneRequest, CodeVerifyRequest, TokenResponse, CodeRequestResponse
 )
-from app.services.auth import AuthService, get_auth_service, create_tokens 
-from app.api.deps import get_refresh_token
+from app.services.auth import AuthService, get_auth_service
+from app.services.tokens import RefreshTokenStore, get_token_store, revocations
+from app.api.deps import get_refresh_token, get_current_user, rate_limit
 from app.utils.security import decode_token, verify_token_type
 from app.config import settings
 from app.models.user import User 
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
-@router.post("/request_code", response_model=CodeRequestResponse)
+auth_ip_rate_limit = rate_limit("auth:ip", settings.AUTH_IP_RATE_LIMIT, settings.AUTH_IP_RATE_WINDOW)
+
+@router.post("/request_code", response_model=CodeRequestResponse, dependencies=[Depends(auth_ip_rate_limit)])
 async def request_verification_code(
     data: PhoneRequest,
     auth_service: AuthService = Depends(get_auth_service)
@@ -33,11 +36,12 @@ async def request_verification_code(
         debug_code=debug_code
     )
 
-@router.post("/verify_code", response_model=TokenResponse)
+@router.post("/verify_code", response_model=TokenResponse, dependencies=[Depends(auth_ip_rate_limit)])
 async def verify_code(
     data: CodeVerifyRequest,
     response: Response,
-    auth_service: AuthService = Depends(get_auth_service)
+    auth_service: AuthService = Depends(get_auth_service),
+    token_store: RefreshTokenStore = Depends(get_token_store)
 ):
     """
     Verify SMS code. If correct, return Access Token and set Refresh Token in HTTP-only cookie.
@@ -46,11 +50,11 @@ async def verify_code(
     
     if error:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS if "Too many" in error else status.HTTP_400_BAD_REQUEST,
             detail=error
         )
 
-    access_token, access_exp, refresh_token, refresh_exp = create_tokens(user)
+    access_token, access_exp, refresh_token, refresh_exp = await token_store.issue(user)
 
     response.set_cookie(
         key="refresh_token",
@@ -68,14 +72,17 @@ async def verify_code(
     )
 
 
-@router.post("/refresh_token", response_model=TokenResponse)
+@router.post("/refresh_token", response_model=TokenResponse, dependencies=[Depends(auth_ip_rate_limit)])
 async def refresh_token(
     response: Response,
     refresh_token: str = Depends(get_refresh_token), 
-    auth_service: AuthService = Depends(get_auth_service)
+    auth_service: AuthService = Depends(get_auth_service),
+    token_store: RefreshTokenStore = Depends(get_token_store)
 ):
     """
     Refresh Access Token using Refresh Token from cookie (token rotation).
+    Each refresh token is single-use: presenting an already rotated one
+    revokes all sessions of the user.
     """
     token_payload = decode_token(refresh_token)
     
@@ -104,7 +111,13 @@ async def refresh_token(
             detail="Пользователь неактивен"
         )
 
-    access_token, access_exp, new_refresh_token, refresh_exp = create_tokens(user)
+    tokens, error = await token_store.rotate(user, token_payload)
+    if error:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=error
+        )
+    access_token, access_exp, new_refresh_token, refresh_exp = tokens
 
     response.set_cookie(
         key="refresh_token",
@@ -123,10 +136,38 @@ async def refresh_token(
     )
 
 @router.post("/logout")
-async def logout(response: Response):
+async def logout(
+    request: Request,
+    response: Response,
+    token_store: RefreshTokenStore = Depends(get_token_store)
+):
+    """
+    Revokes the current session's Refresh Token and deletes its cookie.
+    """
+    token_payload = decode_token(request.cookies.get("refresh_token", ""))
+    if token_payload is not None and token_payload.fam:
+        await token_store.revoke_family(token_payload.fam)
+
+    response.delete_cookie(
+        key="refresh_token",
+        httponly=True,
+
+        samesite="lax",
+        path="/api/v1/auth"
+    )
+    return {"message": "Logout successful"}
+
+@router.post("/logout_all")
+async def logout_all(
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    token_store: RefreshTokenStore = Depends(get_token_store)
+):
     """
-    Deletes the Refresh Token cookie.
+    Revokes all sessions of the current user: every Refresh Token and
+    every Access Token issued so far.
     """
+    await token_store.revoke_user(str(current_user.id))
 
     response.delete_cookie(
         key="refresh_token",
@@ -135,4 +176,4 @@ async def logout(response: Response):
         samesite="lax",
         path="/api/v1/auth"
     )
-    return {"message": "Logout successful"}
\ No newline at end of file
+    return {"message": "All sessions revoked"}
@@ -4,17 +4,27 @@ from typing import List
 import json
 
 from app.database import get_db
-from app.api.deps import get_current_user
+from app.api.deps import get_current_user, write_rate_limit
 from app.models.user import User
 from app.schemas.chat import ChatResponse, MessageResponse, MessageCreate
 from app.services.chat import ChatService
 from app.websocket.manager import manager
+from app.services.platform_stats import active_users
 
 router = APIRouter()
 
 router = APIRouter(prefix="/chats", tags=["Chats"]) 
 
-@router.post("/ads/{ad_id}/respond", response_model=ChatResponse)
+
+def _sender_name(sender: User) -> str:
+    """Имя отправителя из профиля (профиль загружен вместе с сообщением)"""
+    profile = sender.profile if sender else None
+    if not profile:
+        return ""
+    return f"{profile.first_name} {profile.last_name}".strip()
+
+
+@router.post("/ads/{ad_id}/respond", response_model=ChatResponse, dependencies=[Depends(write_rate_limit)])
 async def respond_to_ad(
     ad_id: str,  
     current_user: User = Depends(get_current_user),
@@ -81,7 +91,7 @@ async def get_chat_messages(
             "text": message.text,
             "created_at": message.created_at,
             "read_at": message.read_at,
-            "sender_name": f"{message.sender.first_name} {message.sender.last_name}"
+            "sender_name": _sender_name(message.sender)
         }
         response_messages.append(MessageResponse(**message_dict))
     
@@ -97,13 +107,14 @@ async def websocket_chat(
 ):
     """WebSocket endpoint для чата"""
     from app.utils.security import decode_token
+    from app.services.tokens import revocations
 
     token_payload = decode_token(token)
-    if not token_payload:
+    if not token_payload or revocations.is_revoked(token_payload):
         await websocket.close(code=1008)
         return
     
-    user_id = token_payload.get("sub")
+    user_id = token_payload.sub
     if not user_id:
         await websocket.close(code=1008)
         return
@@ -115,6 +126,7 @@ async def websocket_chat(
         return
 
     await manager.connect(websocket, chat_id, user_id)
+    active_users.track(user_id)
     
     try:
         while True:
@@ -139,7 +151,7 @@ async def websocket_chat(
                             "id": new_message.id,
                             "chat_id": new_message.chat_id,
                             "sender_id": new_message.sender_id,
-                            "sender_name": f"{new_message.sender.first_name} {new_message.sender.last_name}",
+                            "sender_name": _sender_name(new_message.sender),
                             "text": new_message.text,
                             "created_at": new_message.created_at.isoformat(),
                             "read_at": new_message.read_at.isoformat() if new_message.read_at else None
@@ -1,6 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, status, WebSocket
+from fastapi import APIRouter, Depends, HTTPException, status, WebSocket, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Optional
 from sqlalchemy import select, func, and_, or_
 from app.database import get_db
 from app.api.deps import get_current_user
@@ -8,9 +8,9 @@ from app.models.user import User
 from app.models.deal import Deal, DealStatusLog
 from app.schemas.deal import (
     DealOut, DealCreate, DealUpdate, DealStatusUpdate, 
-    DealProposal, DealStatusLogOut
+    DealProposal, DealStatusLogOut, DealSummaryPageOut
 )
-from app.services.deal import DealService
+from app.services.deal import DealService, DealConflictError
 from app.websocket.manager import manager
 
 router = APIRouter(prefix="/deals", tags=["Deals"])
@@ -40,7 +40,13 @@ async def propose_deal(
             detail="Cannot create deal"
         )
 
-    updated_deal = await deal_service.propose_deal_terms(deal, proposal, str(current_user.id))
+    try:
+        updated_deal = await deal_service.propose_deal_terms(deal, proposal, str(current_user.id))
+    except DealConflictError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
     if not updated_deal:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -73,15 +79,19 @@ async def update_deal_status(
             detail="Not a participant of this deal"
         )
     
-    updated_deal = await deal_service.update_deal_status(deal, status_update, str(current_user.id))
+    try:
+        updated_deal = await deal_service.update_deal_status(deal, status_update, str(current_user.id))
+    except DealConflictError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
     if not updated_deal:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid status transition"
         )
 
-    await _broadcast_deal_update(chat_id, updated_deal, str(current_user.id))
-    
     return _enrich_deal_response(updated_deal)
 
 
@@ -110,17 +120,31 @@ async def get_chat_deal(
     return _enrich_deal_response(deal)
 
 
-@router.get("/my", response_model=List[DealOut])
+@router.get("/my", response_model=DealSummaryPageOut)
 async def get_my_deals(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из предыдущего ответа"),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Получить все мои сделки"""
+    """
+    Получить мои сделки (краткие сводки, от последних изменённых).
+
+    История статусов отдаётся отдельно через /deals/{deal_id}/logs.
+    """
     deal_service = DealService(db)
-    
-    deals = await deal_service.get_user_deals(str(current_user.id))
-    
-    return [_enrich_deal_response(deal) for deal in deals]
+
+    try:
+        items, next_cursor = await deal_service.get_user_deal_summaries(
+            str(current_user.id), limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    return DealSummaryPageOut(items=items, next_cursor=next_cursor)
 
 
 @router.get("/{deal_id}/logs", response_model=List[DealStatusLogOut])
@@ -179,6 +203,8 @@ def _enrich_deal_response(deal: Deal) -> dict:
         "proposed_skill": deal.proposed_skill,
         "proposed_time": deal.proposed_time,
         "proposed_place": deal.proposed_place,
+        "scheduled_at": deal.scheduled_at,
+        "version": deal.version,
         "created_at": deal.created_at,
         "updated_at": deal.updated_at,
         "status_logs": [
@@ -195,23 +221,3 @@ def _enrich_deal_response(deal: Deal) -> dict:
         "student_name": f"{deal.student.first_name} {deal.student.last_name}",
         "teacher_name": f"{deal.teacher.first_name} {deal.teacher.last_name}"
     }
-
-
-async def _broadcast_deal_update(chat_id: int, deal: Deal, user_id: str):
-    """Отправить обновление сделки через WebSocket"""
-    from app.websocket.manager import manager
-    import json
-    
-    deal_response = _enrich_deal_response(deal)
-
-    await manager.send_deal_update(chat_id, deal_response)
-
-    if deal.status_logs:
-        last_log = deal.status_logs[-1]
-        await manager.send_deal_status_change(
-            chat_id=chat_id,
-            old_status=last_log.old_status.value if last_log.old_status else None,
-            new_status=last_log.new_status.value,
-            user_id=user_id,
-            reason=last_log.reason
-        )
\ No newline at end of file
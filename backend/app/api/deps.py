@@ -1,19 +1,25 @@
+import math
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 from redis.asyncio import Redis
+from app.config import settings
 from app.database import get_db, get_redis
-from app.services.sms import get_sms_provider, SMSProvider
+from app.services.sms import get_sms_provider, SMSDispatcher
 from app.utils.security import decode_token, verify_token_type
 from app.models.user import User, UserRole
 from app.services.auth import AuthService
+from app.services.user_cache import user_cache
+from app.services.tokens import revocations
+from app.services.platform_stats import active_users
+from app.services.rate_limit import Algorithm, RateLimit, rate_limiter
 
 security = HTTPBearer(auto_error=False)
 
 async def get_auth_service(
     db: AsyncSession = Depends(get_db),
     redis: Redis = Depends(get_redis),
-    sms_provider: SMSProvider = Depends(get_sms_provider)
+    sms_provider: SMSDispatcher = Depends(get_sms_provider)
 ) -> AuthService:
     return AuthService(db, redis, sms_provider)
 
@@ -42,19 +48,81 @@ async def get_current_user(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token type"
         )
+
+    if revocations.is_revoked(token_payload):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked"
+        )
     
-    from sqlalchemy import select
-    result = await db.execute(select(User).where(User.id == token_payload.sub))
-    user = result.scalar_one_or_none()
+    user = await user_cache.get(token_payload.sub, db)
     
     if user is None or not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found or inactive"
         )
-    
+
+    active_users.track(user.id)
     return user
 
+async def get_optional_user_id(
+    credentials: HTTPAuthorizationCredentials | None = Depends(security)
+) -> str | None:
+    """User id from a valid access token, or None for anonymous requests (no DB lookup)."""
+    if credentials is None:
+        return None
+
+    token_payload = decode_token(credentials.credentials)
+    if token_payload is None or not verify_token_type(token_payload, "access"):
+        return None
+    if revocations.is_revoked(token_payload):
+        return None
+
+    return token_payload.sub
+
+def rate_limit(
+    name: str,
+    limit: int,
+    window: int,
+    per: str = "ip",
+    algorithm: Algorithm = Algorithm.SLIDING_WINDOW
+):
+    """
+    Dependency factory limiting a route to `limit` requests per `window` seconds.
+    per: "ip", "user" (token subject, falls back to IP for anonymous requests)
+    or "route" (one shared budget for all clients).
+    """
+    rule = RateLimit(name, limit, window, algorithm)
+
+    async def check_rate_limit(
+        request: Request,
+        credentials: HTTPAuthorizationCredentials | None = Depends(security)
+    ):
+        client_ip = request.client.host if request.client else "unknown"
+        if per == "route":
+            identity = "all"
+        elif per == "user":
+            user_id = await get_optional_user_id(credentials)
+            identity = f"user:{user_id}" if user_id else f"ip:{client_ip}"
+        else:
+            identity = f"ip:{client_ip}"
+
+        result = await rate_limiter.hit(rule, identity)
+        if not result.allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests",
+                headers={"Retry-After": str(max(math.ceil(result.retry_after), 1))}
+            )
+
+    return check_rate_limit
+
+# Shared per-user budget for creating content (ads, chat responses, reviews)
+write_rate_limit = rate_limit(
+    "write", settings.WRITE_RATE_LIMIT, settings.WRITE_RATE_WINDOW, per="user", algorithm=Algorithm.TOKEN_BUCKET
+)
+
 async def get_current_active_user(
     current_user: User = Depends(get_current_user)
 ) -> User:
@@ -1,16 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
 from app.database import get_db
-from app.api.deps import get_current_active_user, get_admin_user
+from app.api.deps import get_current_active_user, get_admin_user, write_rate_limit
 from app.models.user import User
 from app.schemas.gamification import (
-    ReviewCreate, ReviewOut, UserProfileGamifiedOut, 
-    LevelProgressOut, LeaderboardUserOut, BadgeOut,
+    ReviewCreate, ReviewOut, ReviewPageOut, RatingSummaryOut, UserProfileGamifiedOut, 
+    LevelProgressOut, LeaderboardUserOut, LeaderboardAroundOut, BadgeOut,
     BadgeCreate, GlobalStatsOut, UserAchievementsOut,
     BadgeAwardResponse, DetailedStatsOut
 )
+from app.models.ad import AdCategory
+from app.services.gamification import GamificationService
+from app.services.leaderboard import LeaderboardService, LeaderboardScope
+from app.services.badge_rules import badge_catalog
+from app.services.platform_stats import PlatformStatsService
+from app.services.profile_cache import profile_cache
+from app.services.achievements import AchievementService
 
 router = APIRouter(prefix="/gamification", tags=["Gamification"])
 
@@ -31,7 +38,10 @@ async def gamification_test():
         ]
     }
 
-@router.post("/reviews", response_model=ReviewOut, status_code=status.HTTP_201_CREATED)
+@router.post(
+    "/reviews", response_model=ReviewOut, status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(write_rate_limit)]
+)
 async def create_review(
     review_data: ReviewCreate,
     current_user: User = Depends(get_current_active_user),
@@ -45,18 +55,17 @@ async def create_review(
     - **rating**: Оценка от 1 до 5
     - **text**: Текст отзыва (опционально)
     """
+    gamification_service = GamificationService(db)
 
-    return {
-        "id": 1,
-        "author_id": str(current_user.id),
-        "target_user_id": review_data.target_user_id,
-        "deal_id": review_data.deal_id,
-        "rating": review_data.rating,
-        "text": review_data.text,
-        "created_at": "2024-01-01T00:00:00Z",
-        "author_name": f"{current_user.profile.first_name} {current_user.profile.last_name}",
-        "author_avatar": current_user.profile.avatar_url
-    }
+    try:
+        review = await gamification_service.create_review(review_data, str(current_user.id))
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    return await gamification_service.get_review(review.id)
 
 @router.get("/profile/{user_id}", response_model=UserProfileGamifiedOut)
 async def get_user_profile_gamified(
@@ -71,83 +80,23 @@ async def get_user_profile_gamified(
     - Статистику и уровни
     - Значки и достижения
     - Отзывы
+
+    Документ отдаётся из кэша готовым JSON и пересобирается только после
+    событий, которые его меняют.
     """
+    async def build() -> str:
+        profile = await GamificationService(db).get_user_profile_with_gamification(user_id)
+        return UserProfileGamifiedOut(**profile).model_dump_json()
 
-    return {
-        "id": user_id,
-        "first_name": "Иван",
-        "last_name": "Иванов",
-        "avatar_url": "https://example.com/avatar.jpg",
-        "university": "МГУ",
-        "faculty": "Факультет компьютерных наук",
-        "year": 2024,
-        "bio": "Люблю учиться и делиться знаниями!",
-        "stats": {
-            "reputation": 150,
-            "exchanges_completed": 15,
-            "total_ratings": 12,
-            "average_rating": 4.8,
-            "level": 3,
-            "experience": 75,
-            "next_level_exp": 100,
-            "programming_exchanges": 8,
-            "design_exchanges": 2,
-            "languages_exchanges": 3,
-            "math_exchanges": 1,
-            "science_exchanges": 1,
-            "business_exchanges": 0,
-            "music_exchanges": 0,
-            "sports_exchanges": 0,
-            "other_exchanges": 0
-        },
-        "badges": [
-            {
-                "id": 1,
-                "name": "Новичок",
-                "type": "newcomer",
-                "description": "Добро пожаловать в Скилл Свап!",
-                "icon": "👋"
-            },
-            {
-                "id": 2,
-                "name": "Первый обмен", 
-                "type": "first_exchange",
-                "description": "Провёл первый обмен знаниями",
-                "icon": "🎯"
-            },
-            {
-                "id": 3,
-                "name": "Популярный",
-                "type": "popular", 
-                "description": "10+ успешных обменов",
-                "icon": "⭐"
-            }
-        ],
-        "reviews": [
-            {
-                "id": 1,
-                "author_id": "user456",
-                "target_user_id": user_id,
-                "deal_id": 1,
-                "rating": 5,
-                "text": "Отличный преподаватель! Очень понятно объясняет сложные темы.",
-                "created_at": "2024-01-15T10:30:00Z",
-                "author_name": "Мария Петрова",
-                "author_avatar": "https://example.com/avatar2.jpg"
-            },
-            {
-                "id": 2,
-                "author_id": "user789", 
-                "target_user_id": user_id,
-                "deal_id": 2,
-                "rating": 4,
-                "text": "Хороший обмен, рекомендую!",
-                "created_at": "2024-01-20T14:45:00Z",
-                "author_name": "Алексей Сидоров",
-                "author_avatar": "https://example.com/avatar3.jpg"
-            }
-        ]
-    }
+    try:
+        document = await profile_cache.get(user_id, build)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+
+    return Response(content=document, media_type="application/json")
 
 @router.get("/my/profile", response_model=UserProfileGamifiedOut)
 async def get_my_profile_gamified(
@@ -163,58 +112,41 @@ async def get_my_profile_gamified(
 @router.get("/leaderboard", response_model=List[LeaderboardUserOut])
 async def get_leaderboard(
     limit: int = Query(50, ge=1, le=100, description="Количество пользователей в таблице лидеров"),
+    scope: LeaderboardScope = Query(LeaderboardScope.ALL, description="Разрез: all, week, month, trending, university, category"),
+    university: Optional[str] = Query(None, description="Университет (для scope=university)"),
+    category: Optional[AdCategory] = Query(None, description="Категория (для scope=category)"),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Получение таблицы лидеров.
     
-    Сортировка по репутации в порядке убывания.
+    Сортировка по очкам выбранного разреза в порядке убывания: общая
+    репутация, репутация за неделю/месяц, репутация с затуханием (trending),
+    репутация внутри университета или число обменов в категории.
     """
 
-    leaderboard_data = [
-        {
-            "id": "user1",
-            "first_name": "Анна",
-            "last_name": "Смирнова", 
-            "avatar_url": "https://example.com/avatar1.jpg",
-            "university": "МГУ",
-            "reputation": 450,
-            "level": 8,
-            "position": 1
-        },
-        {
-            "id": "user2",
-            "first_name": "Дмитрий",
-            "last_name": "Козлов",
-            "avatar_url": "https://example.com/avatar2.jpg", 
-            "university": "СПбГУ",
-            "reputation": 380,
-            "level": 7,
-            "position": 2
-        },
-        {
-            "id": "user3", 
-            "first_name": "Екатерина",
-            "last_name": "Новикова",
-            "avatar_url": "https://example.com/avatar3.jpg",
-            "university": "МФТИ", 
-            "reputation": 320,
-            "level": 6,
-            "position": 3
-        },
-        {
-            "id": "current_user",
-            "first_name": "Иван",
-            "last_name": "Иванов", 
-            "avatar_url": "https://example.com/avatar4.jpg",
-            "university": "МГУ",
-            "reputation": 150, 
-            "level": 3,
-            "position": 25
-        }
-    ]
-    
-    return leaderboard_data[:limit]
+    try:
+        return await LeaderboardService(db).get_top(limit, scope, university, category)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.get("/leaderboard/me", response_model=LeaderboardAroundOut)
+async def get_my_leaderboard_position(
+    radius: int = Query(5, ge=0, le=25, description="Количество соседей сверху и снизу"),
+    scope: LeaderboardScope = Query(LeaderboardScope.ALL, description="Разрез: all, week, month, trending, university, category"),
+    university: Optional[str] = Query(None, description="Университет (по умолчанию — из профиля)"),
+    category: Optional[AdCategory] = Query(None, description="Категория (для scope=category)"),
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Место текущего пользователя в таблице лидеров и ближайшие соседи.
+    """
+
+    try:
+        return await LeaderboardService(db).get_around(str(current_user.id), radius, scope, university, category)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 @router.get("/level-progress", response_model=LevelProgressOut)
 async def get_level_progress(
@@ -243,58 +175,37 @@ async def get_level_progress(
         "progress_percentage": round(progress_percentage, 2)
     }
 
-@router.get("/users/{user_id}/reviews", response_model=List[ReviewOut])
+@router.get("/users/{user_id}/reviews", response_model=ReviewPageOut)
 async def get_user_reviews(
     user_id: str,
     limit: int = Query(20, ge=1, le=50, description="Количество отзывов"),
-    offset: int = Query(0, ge=0, description="Смещение для пагинации"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из предыдущего ответа"),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Получение отзывов о пользователе.
-    
-    Возвращает список отзывов с пагинацией.
+
+    Возвращает отзывы от новых к старым с курсорной пагинацией.
     """
+    try:
+        items, next_cursor = await GamificationService(db).get_user_reviews(user_id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
 
-    reviews = [
-        {
-            "id": 1,
-            "author_id": "author1",
-            "target_user_id": user_id,
-            "deal_id": 1,
-            "rating": 5,
-            "text": "Отличный преподаватель! Очень понятно объясняет сложные темы.",
-            "created_at": "2024-01-15T10:30:00Z",
-            "author_name": "Мария Петрова",
-            "author_avatar": "https://example.com/avatar2.jpg"
-        },
-        {
-            "id": 2,
-            "author_id": "author2",
-            "target_user_id": user_id,
-            "deal_id": 2,
-            "rating": 4,
-            "text": "Хороший обмен, рекомендую!",
-            "created_at": "2024-01-20T14:45:00Z", 
-            "author_name": "Алексей Сидоров",
-            "author_avatar": "https://example.com/avatar3.jpg"
-        },
-        {
-            "id": 3,
-            "author_id": "author3",
-            "target_user_id": user_id,
-            "deal_id": 3,
-            "rating": 5, 
-            "text": "Очень доволен обменом. Профессиональный подход!",
-            "created_at": "2024-01-25T16:20:00Z",
-            "author_name": "Ольга Кузнецова",
-            "author_avatar": "https://example.com/avatar4.jpg"
-        }
-    ]
+    return ReviewPageOut(items=items, next_cursor=next_cursor)
 
-    start_index = offset
-    end_index = offset + limit
-    return reviews[start_index:end_index]
+@router.get("/users/{user_id}/ratings", response_model=RatingSummaryOut)
+async def get_user_rating_summary(
+    user_id: str,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Распределение оценок пользователя (1-5 звёзд), средний и байесовский рейтинг.
+    """
+    return await GamificationService(db).get_rating_summary(user_id)
 
 @router.get("/badges", response_model=List[BadgeOut])
 async def get_all_badges(
@@ -378,17 +289,11 @@ async def get_global_stats(
 ):
     """
     Получение глобальной статистики платформы.
+
+    Все значения заранее посчитаны: итоги ведут триггеры БД в
+    platform_counters, активных пользователей считает HyperLogLog в Redis.
     """
-    return {
-        "total_users": 1250,
-        "total_exchanges": 5432,
-        "total_reviews": 4890,
-        "average_rating": 4.7,
-        "most_popular_category": "programming",
-        "top_university": "МГУ",
-        "active_this_week": 347,
-        "new_users_today": 23
-    }
+    return await PlatformStatsService(db).get_global()
 
 @router.get("/achievements/unlocked", response_model=UserAchievementsOut)
 async def get_unlocked_achievements(
@@ -397,51 +302,11 @@ async def get_unlocked_achievements(
 ):
     """
     Получение разблокированных достижений текущего пользователя.
+
+    Прогресс читается из счётчиков активности (сохранённое значение плюс
+    ещё не сброшенное в БД приращение).
     """
-    return {
-        "user_id": str(current_user.id),
-        "unlocked_achievements": [
-            {
-                "id": 1,
-                "name": "Первый шаг",
-                "description": "Создал первый профиль",
-                "unlocked_at": "2024-01-01T00:00:00Z",
-                "icon": "🚶"
-            },
-            {
-                "id": 2,
-                "name": "Социальная бабочка",
-                "description": "Отправил 10 сообщений в чатах", 
-                "unlocked_at": "2024-01-05T12:30:00Z",
-                "icon": "🦋"
-            },
-            {
-                "id": 3,
-                "name": "Исследователь",
-                "description": "Просмотрел 50 объявлений",
-                "unlocked_at": "2024-01-10T15:45:00Z",
-                "icon": "🔍"
-            }
-        ],
-        "next_achievements": [
-            {
-                "id": 4,
-                "name": "Мастер обмена",
-                "description": "Заверши 5 успешных обменов",
-                "progress": 3,
-                "required": 5,
-                "progress_percentage": 60
-            },
-            {
-                "id": 5, 
-                "name": "Отличник",
-                "description": "Получи 10 отзывов с оценкой 5",
-                "progress": 7,
-                "required": 10,
-                "progress_percentage": 70
-            }
-        ]
-    }
+    return await AchievementService(db).get_user_achievements(str(current_user.id))
 
 @router.post("/admin/badges", response_model=BadgeOut, status_code=status.HTTP_201_CREATED)
 async def create_badge(
@@ -454,7 +319,7 @@ async def create_badge(
     
     Требуются права администратора.
     """
-    from app.models.gamification import Badge, BadgeType
+    from app.models.gamification import Badge
 
     from sqlalchemy import select
     result = await db.execute(
@@ -478,6 +343,7 @@ async def create_badge(
     db.add(new_badge)
     await db.commit()
     await db.refresh(new_badge)
+    await badge_catalog.invalidate()
     
     return {
         "id": new_badge.id,
@@ -498,8 +364,9 @@ async def award_badge_to_user(
     Выдача значка пользователю (только для администраторов).
     """
     from app.models.gamification import Badge
-    from app.models.user import User
+    from app.models.user import User, user_badges
     from sqlalchemy import select
+    from sqlalchemy.dialects.postgresql import insert as pg_insert
 
     user_result = await db.execute(
         select(User).where(User.id == user_id)
@@ -523,14 +390,20 @@ async def award_badge_to_user(
             detail="Badge not found"
         )
 
-    if badge in user.badges:
+    awarded = await db.execute(
+        pg_insert(user_badges)
+        .values(user_id=user_id, badge_id=badge_id)
+        .on_conflict_do_nothing()
+        .returning(user_badges.c.badge_id)
+    )
+    if awarded.scalar_one_or_none() is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="User already has this badge"
         )
-    
-    user.badges.append(badge)
+
     await db.commit()
+    await profile_cache.invalidate(user_id)
     
     return {
         "message": "Badge awarded successfully",
@@ -539,6 +412,16 @@ async def award_badge_to_user(
         "badge_name": badge.name
     }
 
+@router.get("/admin/cache/profile", response_model=dict)
+async def get_profile_cache_metrics(
+    current_user: User = Depends(get_admin_user)
+):
+    """
+    Метрики кэша геймифицированных профилей: запросы, промахи, hit ratio
+    (только для администраторов).
+    """
+    return await profile_cache.metrics()
+
 @router.get("/admin/stats/detailed", response_model=DetailedStatsOut)
 async def get_detailed_gamification_stats(
     current_user: User = Depends(get_admin_user),  
@@ -596,6 +479,7 @@ async def gamification_root():
             "/api/v1/gamification/leaderboard",
             "/api/v1/gamification/level-progress",
             "/api/v1/gamification/users/{user_id}/reviews",
+            "/api/v1/gamification/users/{user_id}/ratings",
             "/api/v1/gamification/badges",
             "/api/v1/gamification/stats/global",
             "/api/v1/gamification/achievements/unlocked",
@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
-from app.api.deps import get_db, get_current_user
+from app.api.deps import get_db, get_current_user, get_admin_user
 from app.services.telegram_service import telegram_service
+from app.services.telegram_dispatcher import telegram_dispatcher
 from app.schemas.telegram import TelegramSubscribe
 from app.config import settings
 
@@ -84,13 +85,13 @@ async def send_test_notification(
     db: Session = Depends(get_db)
 ):
     """Отправка тестового уведомления"""
-    if not await telegram_service.is_subscribed(current_user.id):
+    chat_id = await telegram_service.get_chat_id(current_user.id)
+    if not chat_id:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Вы не подписаны на уведомления"
         )
     
-    chat_id = await telegram_service.get_chat_id(current_user.id)
     success = await telegram_service.send_message(
         chat_id,
         "🧪 **Тестовое уведомление**\n\n"
@@ -100,32 +101,34 @@ async def send_test_notification(
     
     return {
         "status": "success" if success else "error",
-        "message": "Тестовое уведомление отправлено" if success else "Не удалось отправить тестовое уведомление"
+        "message": "Тестовое уведомление поставлено в очередь" if success else "Не удалось отправить тестовое уведомление"
     }
 
 @router.get("/admin/subscriptions", summary="Получить все подписки (админ)")
 async def get_all_subscriptions(
-    current_user = Depends(get_current_user)
+    cursor: int = Query(0, ge=0, description="Курсор из next_cursor предыдущей страницы"),
+    count: int = Query(100, ge=1, le=1000),
+    current_user = Depends(get_admin_user)
 ):
-    """Получение всех подписок (только для админов)"""
-    # TODO: 
-    subscriptions = await telegram_service.get_all_subscriptions()
-    count = await telegram_service.get_subscriptions_count()
+    """Получение подписок постранично (только для админов); next_cursor = 0 — последняя страница"""
+    next_cursor, subscriptions = await telegram_service.scan_subscriptions(cursor, count)
+    total = await telegram_service.get_subscriptions_count()
     
     return {
-        "total_count": count,
+        "total_count": total,
+        "next_cursor": next_cursor,
         "subscriptions": subscriptions
     }
 
 @router.get("/admin/stats", summary="Статистика подписок (админ)")
 async def get_subscription_stats(
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_admin_user)
 ):
     """Статистика по подпискам (только для админов)"""
-    # TODO: 
     count = await telegram_service.get_subscriptions_count()
     
     return {
         "total_subscriptions": count,
-        "service_status": "active"
+        "service_status": "active",
+        "dispatcher": telegram_dispatcher.metrics()
     }
\ No newline at end of file
@@ -1,9 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
-from app.models.user import User
+from sqlalchemy import select
+from app.models.user import User, UserProfile
 from app.schemas.user import UserProfileOut, UserUpdate
 from app.api.deps import get_current_active_user
+from app.services.leaderboard import LeaderboardService
+from app.services.profile_cache import profile_cache
+from app.services.user_cache import user_cache
 
 router = APIRouter(tags=["Users"])
 
@@ -31,7 +35,9 @@ async def update_current_user_profile(
     """
     Обновление профиля текущего аутентифицированного пользователя.
     """
-    profile = current_user.profile
+    # current_user может прийти из кэша: изменяем профиль, загруженный в сессию
+    result = await db.execute(select(UserProfile).where(UserProfile.user_id == current_user.id))
+    profile = result.scalar_one_or_none()
     if not profile:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -45,5 +51,8 @@ async def update_current_user_profile(
 
     await db.commit()
     await db.refresh(profile)
+    await LeaderboardService(db).profile_updated(current_user.id, profile.university)
+    await profile_cache.invalidate(current_user.id)
+    await user_cache.invalidate(current_user.id)
     
     return UserProfileOut.model_validate(profile)
\ No newline at end of file
@@ -29,21 +29,103 @@ class Settings(BaseSettings):
 
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
 
+    REFRESH_REUSE_GRACE_SECONDS: int = 10
+
     SMS_PROVIDER: str = "mock" 
 
     SMS_API_KEY: Optional[str] = None
 
+    TWILIO_API_KEY: Optional[str] = None
+
+    SMSRU_API_KEY: Optional[str] = None
+
+    SMS_HTTP_TIMEOUT: float = 10.0
+
+    SMS_QUEUE_SIZE: int = 1000
+
+    SMS_WORKERS: int = 4
+
+    SMS_MAX_ATTEMPTS: int = 4
+
+    SMS_RETRY_BASE_DELAY: float = 1.0
+
+    SMS_RETRY_MAX_DELAY: float = 30.0
+
+    SMS_BREAKER_THRESHOLD: int = 5
+
+    SMS_BREAKER_COOLDOWN: float = 30.0
+
     CODE_EXPIRY: int = 300 
 
+    CODE_MAX_ATTEMPTS: int = 5
+
+    CODE_LOCK_SECONDS: int = 900
+
     CODE_REQUEST_LIMIT: int = 5 
 
     CODE_REQUEST_WINDOW: int = 3600
 
+    AUTH_IP_RATE_LIMIT: int = 30
+
+    AUTH_IP_RATE_WINDOW: int = 600
+
+    WRITE_RATE_LIMIT: int = 20
+
+    WRITE_RATE_WINDOW: int = 60
+
     TELEGRAM_BOT_TOKEN: Optional[str] = None
 
     TELEGRAM_BOT_USERNAME: Optional[str] = "SkillSwapNotifierBot"
+
+    TELEGRAM_WORKERS: int = 4
+
+    TELEGRAM_QUEUE_SIZE: int = 10000
+
+    TELEGRAM_GLOBAL_RATE: float = 30.0
+
+    TELEGRAM_PER_CHAT_RATE: float = 1.0
+
+    TELEGRAM_MAX_ATTEMPTS: int = 5
+
+    TELEGRAM_SEND_TIMEOUT: float = 15.0
+
+    TELEGRAM_BROADCAST_PAGE_SIZE: int = 200
+
+    TELEGRAM_BROADCAST_PAGE_TIMEOUT: float = 120.0
     
 
+    OUTBOX_BATCH_SIZE: int = 100
+
+    OUTBOX_POLL_INTERVAL: float = 1.0
+
+    OUTBOX_MAX_ATTEMPTS: int = 10
+
+    OUTBOX_LEASE_SECONDS: int = 300
+
+    OUTBOX_RETRY_BASE_DELAY: float = 2.0
+
+    OUTBOX_RETRY_MAX_DELAY: float = 600.0
+
+    DEAL_TIMEZONE: str = "Europe/Moscow"
+
+    REMINDER_POLL_INTERVAL: float = 1.0
+
+    REMINDER_BATCH_SIZE: int = 200
+
+    ACTIVITY_FLUSH_INTERVAL: float = 5.0
+
+    ACTIVITY_COUNTERS_FLUSH_INTERVAL: float = 10.0
+
+    ACTIVITY_COUNTERS_BATCH_SIZE: int = 500
+
+    AD_VIEWS_FLUSH_INTERVAL: float = 5.0
+
+    USER_CACHE_TTL: int = 300
+
+    USER_CACHE_LOCAL_TTL: float = 30.0
+
+    USER_CACHE_LOCAL_SIZE: int = 10000
+
     MAX_FILE_SIZE: int = 10 * 1024 * 1024 
     ALLOWED_IMAGE_TYPES: list = ["image/jpeg", "image/png", "image/gif", "image/webp"]
 
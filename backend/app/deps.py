@@ -2,18 +2,20 @@ from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 from redis.asyncio import Redis
-from app.services.sms import SMSProvider, get_sms_provider 
+from app.services.sms import SMSDispatcher, get_sms_provider 
 from app.database import get_db, get_redis
 from app.utils.security import decode_token, verify_token_type
 from app.models.user import User, UserRole
 from app.services.auth import AuthService 
+from app.services.user_cache import user_cache
+from app.services.tokens import revocations
 
 security = HTTPBearer(auto_error=False)
 
 async def get_auth_service(
     db: AsyncSession = Depends(get_db),
     redis: Redis = Depends(get_redis),
-    sms_provider: SMSProvider = Depends(get_sms_provider)
+    sms_provider: SMSDispatcher = Depends(get_sms_provider)
 ) -> AuthService:
     return AuthService(db, redis, sms_provider)
 
@@ -42,10 +44,14 @@ async def get_current_user(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token type"
         )
+
+    if revocations.is_revoked(token_payload):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked"
+        )
     
-    from sqlalchemy import select
-    result = await db.execute(select(User).where(User.id == token_payload.sub))
-    user = result.scalar_one_or_none()
+    user = await user_cache.get(token_payload.sub, db)
     
     if user is None or not user.is_active:
         raise HTTPException(
@@ -13,13 +13,27 @@ from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 
 from app.config import settings
-from app.database import engine, Base, init_redis, close_redis
+from app.database import engine, Base, init_redis, close_redis, AsyncSessionLocal
 from app.api.auth import router as auth_router
 from app.api.users import router as users_router
 from app.api.ads import router as ads_router
 from app.api.chat import router as chat_router
 from app.api.deal import router as deal_router
 from app.api.admin import router as admin_router
+from app.services.pubsub import pubsub_hub
+from app.services.tokens import revocations
+from app.services.outbox import outbox_relay
+from app.services.deal_events import register_deal_consumers
+from app.services.reminders import deal_reminders
+from app.services.leaderboard import LeaderboardService
+from app.services.platform_stats import active_users
+from app.services.achievements import activity_counters
+from app.services.ad_views import ad_views
+from app.services.sms import sms_dispatcher
+from app.services.telegram_dispatcher import telegram_dispatcher
+from app.services.broadcast import telegram_broadcast
+import app.models.gamification  # noqa: F401  (UserStats для User.stats)
+import app.models.platform  # noqa: F401  (счётчики и их триггеры в create_all)
 
 
 try:
@@ -78,10 +92,59 @@ async def lifespan(app: FastAPI):
         print(f"❌ Redis initialization error: {e}")
         raise
 
+    try:
+        await pubsub_hub.start()
+        print("✅ Redis pub/sub backplane started")
+    except Exception as e:
+        print(f"⚠️  Redis pub/sub backplane startup error: {e}")
+
+    try:
+        revoked = await revocations.load()
+        print(f"✅ Token revocations loaded ({revoked} users)")
+    except Exception as e:
+        print(f"⚠️  Token revocations load error: {e}")
+
+    register_deal_consumers(outbox_relay)
+    await outbox_relay.start()
+    print("✅ Outbox relay started")
+
+    try:
+        async with AsyncSessionLocal() as db:
+            rebuilt = await LeaderboardService(db).rebuild_if_missing()
+        print(f"✅ Leaderboard ready ({rebuilt} users loaded)" if rebuilt else "✅ Leaderboard ready")
+    except Exception as e:
+        print(f"⚠️  Leaderboard rebuild error: {e}")
+
+    try:
+        await deal_reminders.start()
+        print("✅ Deal reminder scheduler started")
+    except Exception as e:
+        print(f"⚠️  Deal reminder scheduler startup error: {e}")
+
+    await active_users.start()
+    print("✅ Active user tracker started")
+
+    await activity_counters.start()
+    print("✅ Activity counters flusher started")
+
+    await ad_views.start()
+    print("✅ Ad view counter started")
+
+    try:
+        await sms_dispatcher.start()
+        print("✅ SMS dispatcher started")
+    except Exception as e:
+        print(f"❌ SMS dispatcher startup error: {e}")
+
     if TELEGRAM_BOT_ENABLED and telegram_bot_instance:
         try:
             await telegram_bot_instance.start()
             print("✅ Telegram bot started successfully")
+            if telegram_bot_instance.token:
+                await telegram_dispatcher.start()
+                print("✅ Telegram dispatcher started")
+                await telegram_broadcast.start()
+                print("✅ Telegram broadcast watcher started")
         except Exception as e:
             print(f"⚠️  Telegram bot startup error: {e}")
     else:
@@ -97,9 +160,19 @@ async def lifespan(app: FastAPI):
     yield
 
     print("🛑 Shutting down SkillSwap API...")
+
+    await sms_dispatcher.stop()
+    await ad_views.stop()
+    await activity_counters.stop()
+    await active_users.stop()
+    await deal_reminders.stop()
+    await outbox_relay.stop()
+    await pubsub_hub.stop()
     
     if TELEGRAM_BOT_ENABLED and telegram_bot_instance:
         try:
+            await telegram_broadcast.stop()
+            await telegram_dispatcher.stop()
             await telegram_bot_instance.stop()
             print("✅ Telegram bot stopped successfully")
         except Exception as e:
@@ -142,6 +215,7 @@ async def seed_initial_data():
                     Badge(name="Топ рейтинг", type=BadgeType.TOP_RATED, description="Рейтинг 4.8+ с 5+ отзывами", icon="🏆"),
                     Badge(name="Ментор", type=BadgeType.MENTOR, description="25+ успешных обменов", icon="🎓"),
                     Badge(name="Эксперт", type=BadgeType.EXPERT, description="50+ успешных обменов", icon="💎"),
+                    Badge(name="Эксперт в категории", type=BadgeType.CATEGORY_EXPERT, description="10+ обменов в одной категории", icon="🏅"),
                 ]
                 db.add_all(badges)
                 await db.commit()
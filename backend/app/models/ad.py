@@ -47,6 +47,9 @@ class Ad(Base):
     level: Mapped[AdLevel] = mapped_column(Enum(AdLevel), nullable=False, index=True)
     format: Mapped[AdFormat] = mapped_column(Enum(AdFormat), nullable=False)
 
+    # Пополняется пачками из app.services.ad_views
+    views_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), onupdate=func.now())
 
@@ -58,4 +61,5 @@ class Ad(Base):
 
 Index('idx_ads_category_level', Ad.category, Ad.level)
 Index('idx_ads_author_created', Ad.author_id, Ad.created_at.desc())
-Index('idx_ads_created', Ad.created_at.desc())
\ No newline at end of file
+Index('idx_ads_created', Ad.created_at.desc())
+Index('idx_ads_views', Ad.views_count.desc(), Ad.created_at.desc())
\ No newline at end of file
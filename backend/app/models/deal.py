@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Text, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -29,15 +29,25 @@ class Deal(Base):
     proposed_skill = Column(String(200), nullable=True) 
     proposed_time = Column(String(100), nullable=True)   
     proposed_place = Column(String(200), nullable=True)  
+    scheduled_at = Column(DateTime(timezone=True), nullable=True)
     
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     chat = relationship("Chat", back_populates="deal")
     student = relationship("User", foreign_keys=[student_id])
     teacher = relationship("User", foreign_keys=[teacher_id])
     status_logs = relationship("DealStatusLog", back_populates="deal", cascade="all, delete-orphan")
 
+    __mapper_args__ = {"version_id_col": version}
+
+
+Index('idx_deals_student_updated', Deal.student_id, Deal.updated_at.desc(), Deal.id.desc())
+Index('idx_deals_teacher_updated', Deal.teacher_id, Deal.updated_at.desc(), Deal.id.desc())
+Index('idx_deals_confirmed_scheduled', Deal.scheduled_at, postgresql_where=Deal.status == DealStatus.CONFIRMED)
+
 
 class DealStatusLog(Base):
     """Логи изменений статуса сделки"""
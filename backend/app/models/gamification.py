@@ -1,34 +1,150 @@
 # app/models/gamification.py
-from sqlalchemy import Column, String, Integer, Float, DateTime, Enum, Text, ForeignKey, Table
+from sqlalchemy import Column, String, Integer, Float, DateTime, Enum, Text, ForeignKey, Table, UniqueConstraint, Index
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from sqlalchemy.sql import func
 from app.database import Base
 import enum
-from typing import TYPE_CHECKING
+import math
+from typing import TYPE_CHECKING, Optional
 from datetime import datetime
 
+# Значки и их типы живут в app.models.user (таблица badges); здесь они
+# реэкспортируются, чтобы в реестре моделей был ровно один класс Badge.
+from app.models.user import Badge, BadgeType
+
 if TYPE_CHECKING:
     from app.models.user import User
+    from app.models.deal import Deal
+
+# Априорное среднее и его вес (в «виртуальных отзывах») для байесовского
+# рейтинга: у пользователя с одним отзывом на 5 рейтинг ≈ 4.17, а не 5.0
+RATING_PRIOR_MEAN = 4.0
+RATING_PRIOR_WEIGHT = 5
+
+# Период полураспада «текущей» репутации: очки, набранные REPUTATION_HALF_LIFE_DAYS
+# назад, весят вдвое меньше свежих. Смена периода делает trending_score
+# несопоставимыми со старыми — их нужно пересчитать.
+REPUTATION_HALF_LIFE_DAYS = 30
+REPUTATION_DECAY_RATE = math.log(2) / (REPUTATION_HALF_LIFE_DAYS * 24 * 60 * 60)
+
+
+class UserStats(Base):
+    """Игровая статистика пользователя (репутация, уровень, обмены по категориям)."""
+    __tablename__ = "user_stats"
+
+    user_id: Mapped[str] = mapped_column(String(36), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+
+    reputation: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    exchanges_completed: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    total_ratings: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    average_rating: Mapped[float] = mapped_column(Float, default=0.0, server_default="0", nullable=False)
+    level: Mapped[int] = mapped_column(Integer, default=1, server_default="1", nullable=False)
+    experience: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+
+    # Гистограмма оценок: число отзывов с оценкой 1..5
+    rating_1: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    rating_2: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    rating_3: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    rating_4: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    rating_5: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    bayesian_rating: Mapped[float] = mapped_column(
+        Float, default=RATING_PRIOR_MEAN, server_default=str(RATING_PRIOR_MEAN), nullable=False
+    )
+
+    # Затухающая репутация: значение на момент decayed_at; в любой момент t она
+    # равна decayed_reputation * exp(-REPUTATION_DECAY_RATE * (t - decayed_at)).
+    # trending_score = ln(decayed_reputation) + REPUTATION_DECAY_RATE * epoch(decayed_at)
+    # не зависит от момента чтения, поэтому сортировка по нему совпадает
+    # с сортировкой по текущей затухающей репутации без пересчёта строк.
+    decayed_reputation: Mapped[float] = mapped_column(Float, default=0.0, server_default="0", nullable=False)
+    decayed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    trending_score: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
 
-class BadgeType(str, enum.Enum):
-    """Типы значков для геймификации."""
-    NEWCOMER = "newcomer"
-    FIRST_EXCHANGE = "first_exchange"
-    POPULAR = "popular"
-    TOP_RATED = "top_rated"
-    MENTOR = "mentor"
-    EXPERT = "expert"
-    CATEGORY_EXPERT = "category_expert"
+    programming_exchanges: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    design_exchanges: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    languages_exchanges: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    math_exchanges: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    science_exchanges: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    business_exchanges: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    music_exchanges: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    sports_exchanges: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    other_exchanges: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
 
-class Badge(Base):
-    """Модель значка для геймификации."""
-    __tablename__ = "gamification_badges"
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    user: Mapped["User"] = relationship("User", back_populates="stats")
+
+    def __repr__(self):
+        return f"<UserStats user_id={self.user_id}, reputation={self.reputation}, level={self.level}>"
+
+
+Index('idx_user_stats_bayesian_rating', UserStats.bayesian_rating.desc())
+Index('idx_user_stats_trending_score', UserStats.trending_score.desc().nulls_last())
+
+
+class Review(Base):
+    """Отзыв участника сделки о другом участнике."""
+    __tablename__ = "reviews"
+    __table_args__ = (
+        UniqueConstraint("deal_id", "author_id", name="uq_reviews_deal_author"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    name: Mapped[str] = mapped_column(String(50), unique=True, nullable=False)
-    type: Mapped[BadgeType] = mapped_column(Enum(BadgeType), nullable=False, unique=True)
-    description: Mapped[str] = mapped_column(String(255), nullable=False)
-    icon: Mapped[str] = mapped_column(String(10), nullable=False)
+    author_id: Mapped[str] = mapped_column(String(36), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    target_user_id: Mapped[str] = mapped_column(String(36), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    deal_id: Mapped[int] = mapped_column(Integer, ForeignKey("deals.id", ondelete="CASCADE"), nullable=False)
+
+    rating: Mapped[int] = mapped_column(Integer, nullable=False)
+    text: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+    author: Mapped["User"] = relationship("User", foreign_keys=[author_id])
+    target_user: Mapped["User"] = relationship("User", foreign_keys=[target_user_id])
+    deal: Mapped["Deal"] = relationship("Deal")
+
+    def __repr__(self):
+        return f"<Review id={self.id}, target={self.target_user_id}, rating={self.rating}>"
+
+Index('idx_reviews_target_created', Review.target_user_id, Review.created_at.desc(), Review.id.desc())
+
+
+class GamificationProcessedDeal(Base):
+    """Сделки, по которым уже начислена статистика (защита от повторной обработки события)."""
+    __tablename__ = "gamification_processed_deals"
+
+    deal_id: Mapped[int] = mapped_column(Integer, ForeignKey("deals.id", ondelete="CASCADE"), primary_key=True)
+    processed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+class UserActivityCounters(Base):
+    """
+    Счётчики активности пользователя для достижений.
+
+    Горячие пути увеличивают счётчики в Redis, в таблицу они попадают
+    пачками (app.services.achievements.ActivityCounters.flush).
+    """
+    __tablename__ = "user_activity_counters"
+
+    user_id: Mapped[str] = mapped_column(String(36), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+
+    messages_sent: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    ads_viewed: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    responses_made: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<UserActivityCounters user_id={self.user_id}>"
+
+
+class UserAchievement(Base):
+    """Разблокированное достижение пользователя (код из каталога ACHIEVEMENTS)."""
+    __tablename__ = "user_achievements"
+
+    user_id: Mapped[str] = mapped_column(String(36), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    code: Mapped[str] = mapped_column(String(50), primary_key=True)
+    unlocked_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
     def __repr__(self):
-        return f"<Badge {self.name} ({self.type.value})>"
\ No newline at end of file
+        return f"<UserAchievement user_id={self.user_id}, code={self.code}>"
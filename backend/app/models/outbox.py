@@ -0,0 +1,31 @@
+from sqlalchemy import Column, BigInteger, Integer, String, DateTime, JSON, Index
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class OutboxEvent(Base):
+    """
+    Событие в транзакционном outbox.
+
+    Пишется в той же транзакции, что и изменение агрегата; публикуется
+    фоновым релеем (app.services.outbox), который проставляет published_at.
+    """
+    __tablename__ = "outbox_events"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    aggregate_type = Column(String(50), nullable=False)
+    aggregate_id = Column(String(36), nullable=False)
+    event_type = Column(String(100), nullable=False)
+    payload = Column(JSON, nullable=False)
+
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    # Аренда захваченного релеем события, после неудачи — момент следующей попытки
+    next_attempt_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    published_at = Column(DateTime(timezone=True), nullable=True)
+
+    def __repr__(self):
+        return f"<OutboxEvent {self.id} {self.event_type} {self.aggregate_type}:{self.aggregate_id}>"
+
+
+Index('idx_outbox_unpublished', OutboxEvent.id, postgresql_where=OutboxEvent.published_at.is_(None))
@@ -0,0 +1,159 @@
+from sqlalchemy import Column, String, BigInteger, event, text
+from app.database import Base
+
+
+class PlatformCounter(Base):
+    """
+    Счётчик глобальной статистики платформы.
+
+    Значения поддерживают триггеры PostgreSQL на users, user_profiles,
+    reviews и deals (PLATFORM_COUNTER_TRIGGERS), поэтому они верны при любом
+    пути записи, включая каскадные удаления. Виды счётчиков:
+    total/{users,reviews,rating_sum,exchanges}, users_day/{YYYY-MM-DD},
+    university/{название}, category/{имя AdCategory}.
+    """
+    __tablename__ = "platform_counters"
+
+    kind = Column(String(20), primary_key=True)
+    key = Column(String(200), primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0, server_default="0")
+
+    def __repr__(self):
+        return f"<PlatformCounter {self.kind}:{self.key}={self.value}>"
+
+
+PLATFORM_COUNTER_TRIGGERS = [
+    """
+    CREATE OR REPLACE FUNCTION platform_counter_add(p_kind text, p_key text, p_delta bigint)
+    RETURNS void AS $$
+    BEGIN
+        IF p_delta = 0 OR p_key IS NULL OR p_key = '' THEN
+            RETURN;
+        END IF;
+        INSERT INTO platform_counters (kind, key, value) VALUES (p_kind, p_key, p_delta)
+        ON CONFLICT (kind, key) DO UPDATE SET value = platform_counters.value + EXCLUDED.value;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION platform_counters_users() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM platform_counter_add('total', 'users', 1);
+            PERFORM platform_counter_add(
+                'users_day', to_char(COALESCE(NEW.created_at, now()) AT TIME ZONE 'UTC', 'YYYY-MM-DD'), 1
+            );
+        ELSE
+            PERFORM platform_counter_add('total', 'users', -1);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION platform_counters_profiles() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE' AND OLD.university IS NOT DISTINCT FROM NEW.university THEN
+            RETURN NULL;
+        END IF;
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            PERFORM platform_counter_add('university', OLD.university, -1);
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            PERFORM platform_counter_add('university', NEW.university, 1);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION platform_counters_reviews() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM platform_counter_add('total', 'reviews', 1);
+            PERFORM platform_counter_add('total', 'rating_sum', NEW.rating);
+        ELSE
+            PERFORM platform_counter_add('total', 'reviews', -1);
+            PERFORM platform_counter_add('total', 'rating_sum', -OLD.rating);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    # Категория берётся из объявления чата; при каскадном удалении объявления
+    # строк уже нет, и уменьшается только общий счётчик обменов.
+    """
+    CREATE OR REPLACE FUNCTION platform_counters_deals() RETURNS trigger AS $$
+    DECLARE
+        was_completed boolean := TG_OP <> 'INSERT' AND OLD.status = 'COMPLETED';
+        is_completed boolean := TG_OP <> 'DELETE' AND NEW.status = 'COMPLETED';
+        delta bigint;
+        deal_category text;
+    BEGIN
+        IF was_completed = is_completed THEN
+            RETURN NULL;
+        END IF;
+        delta := CASE WHEN is_completed THEN 1 ELSE -1 END;
+        SELECT ads.category::text INTO deal_category
+        FROM chats JOIN ads ON ads.id = chats.ad_id
+        WHERE chats.id = CASE WHEN TG_OP = 'DELETE' THEN OLD.chat_id ELSE NEW.chat_id END;
+        PERFORM platform_counter_add('total', 'exchanges', delta);
+        PERFORM platform_counter_add('category', deal_category, delta);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS trg_platform_counters_users ON users",
+    """
+    CREATE TRIGGER trg_platform_counters_users AFTER INSERT OR DELETE ON users
+    FOR EACH ROW EXECUTE FUNCTION platform_counters_users()
+    """,
+    "DROP TRIGGER IF EXISTS trg_platform_counters_profiles ON user_profiles",
+    """
+    CREATE TRIGGER trg_platform_counters_profiles AFTER INSERT OR DELETE OR UPDATE OF university ON user_profiles
+    FOR EACH ROW EXECUTE FUNCTION platform_counters_profiles()
+    """,
+    "DROP TRIGGER IF EXISTS trg_platform_counters_reviews ON reviews",
+    """
+    CREATE TRIGGER trg_platform_counters_reviews AFTER INSERT OR DELETE ON reviews
+    FOR EACH ROW EXECUTE FUNCTION platform_counters_reviews()
+    """,
+    "DROP TRIGGER IF EXISTS trg_platform_counters_deals ON deals",
+    """
+    CREATE TRIGGER trg_platform_counters_deals AFTER INSERT OR DELETE OR UPDATE OF status ON deals
+    FOR EACH ROW EXECUTE FUNCTION platform_counters_deals()
+    """,
+]
+
+# Начальные значения по существующим данным
+PLATFORM_COUNTERS_BACKFILL = """
+INSERT INTO platform_counters (kind, key, value)
+SELECT 'total', 'users', count(*) FROM users
+UNION ALL
+SELECT 'users_day', day, count(*) FROM (
+    SELECT to_char(created_at AT TIME ZONE 'UTC', 'YYYY-MM-DD') AS day FROM users WHERE created_at IS NOT NULL
+) AS days GROUP BY day
+UNION ALL
+SELECT 'university', university, count(*) FROM user_profiles WHERE university <> '' GROUP BY university
+UNION ALL
+SELECT 'total', 'reviews', count(*) FROM reviews
+UNION ALL
+SELECT 'total', 'rating_sum', COALESCE(sum(rating), 0) FROM reviews
+UNION ALL
+SELECT 'total', 'exchanges', count(*) FROM deals WHERE status = 'COMPLETED'
+UNION ALL
+SELECT 'category', ads.category::text, count(*)
+FROM deals JOIN chats ON chats.id = deals.chat_id JOIN ads ON ads.id = chats.ad_id
+WHERE deals.status = 'COMPLETED' GROUP BY ads.category
+ON CONFLICT (kind, key) DO UPDATE SET value = EXCLUDED.value
+"""
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _install_platform_counters(target, connection, tables=(), **kw):
+    """При создании таблицы через create_all ставит триггеры и заполняет счётчики"""
+    if connection.dialect.name != "postgresql" or PlatformCounter.__table__ not in tables:
+        return
+    for statement in PLATFORM_COUNTER_TRIGGERS:
+        connection.execute(text(statement))
+    connection.execute(text(PLATFORM_COUNTERS_BACKFILL))
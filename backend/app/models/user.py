@@ -9,6 +9,7 @@ from datetime import datetime
 
 if TYPE_CHECKING:
     from app.models.ad import Ad
+    from app.models.gamification import UserStats
 
 class UserRole(str, enum.Enum):
     """Роли пользователей в системе."""
@@ -23,6 +24,7 @@ class BadgeType(str, enum.Enum):
     TOP_RATED = "top_rated"
     MENTOR = "mentor"
     EXPERT = "expert"
+    CATEGORY_EXPERT = "category_expert"
 
 user_badges = Table(
     "user_badges", Base.metadata,
@@ -46,6 +48,7 @@ class User(Base):
 
     profile: Mapped["UserProfile"] = relationship("UserProfile", uselist=False, back_populates="user", cascade="all, delete-orphan")
     badges: Mapped[List["Badge"]] = relationship("Badge", secondary=user_badges, back_populates="users")
+    stats: Mapped[Optional["UserStats"]] = relationship("UserStats", uselist=False, back_populates="user", cascade="all, delete-orphan")
     ads: Mapped[List["Ad"]] = relationship("Ad", back_populates="author", cascade="all, delete-orphan")
     admin_actions = relationship("AdminLog", foreign_keys="AdminLog.admin_id", back_populates="admin")
 
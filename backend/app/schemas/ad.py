@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, validator
 from typing import Optional
-from datetime import datetime
+from datetime import datetime, date
 from enum import Enum
 
 from app.models.ad import AdCategory, AdLevel, AdFormat
@@ -55,10 +55,24 @@ class AdOut(BaseModel):
     format: AdFormat
     created_at: datetime
     updated_at: Optional[datetime] = None
+    views_count: int = 0
 
     class Config:
         from_attributes = True
 
+class AdDailyStatsOut(BaseModel):
+    """Просмотры и показы объявления за день (UTC)."""
+    date: date
+    views: int
+    impressions: int
+
+class AdStatsOut(BaseModel):
+    """Статистика просмотров объявления для автора."""
+    ad_id: str
+    views_count: int
+    unique_viewers: int  # оценка HyperLogLog, погрешность ~1%
+    daily: list[AdDailyStatsOut]
+
 class AdListOut(BaseModel):
     """Схема для списка объявлений с пагинацией."""
     items: list[AdOut]
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 from enum import Enum
@@ -28,6 +28,11 @@ class AdminActionRequest(BaseModel):
     reason: Optional[str] = None
     details: Optional[str] = None
 
+class BroadcastRequest(BaseModel):
+    """Схема для рассылки объявления подписчикам Telegram."""
+    title: str = Field(..., min_length=1, max_length=200)
+    content: str = Field(..., min_length=1, max_length=3500)
+
 class AdminLogOut(BaseModel):
     """Схема для вывода логов администратора."""
     id: int
@@ -30,6 +30,9 @@ class TokenPayload(BaseModel):
     role: UserRole = Field(..., description="User role (e.g., student, admin)")
     exp: float = Field(..., description="Expiration time (timestamp in seconds)")
     type: str = Field(..., description="Token type (access or refresh)")
+    iat: Optional[float] = Field(None, description="Issued at (timestamp in seconds)")
+    jti: Optional[str] = Field(None, description="Refresh token ID within its rotation chain")
+    fam: Optional[str] = Field(None, description="Refresh token family (one per login session)")
 
 
 class PhoneRequest(BaseModel):
@@ -44,6 +44,8 @@ class DealOut(BaseModel):
     proposed_skill: Optional[str] = None
     proposed_time: Optional[str] = None
     proposed_place: Optional[str] = None
+    scheduled_at: Optional[datetime] = None
+    version: int
     created_at: datetime
     updated_at: Optional[datetime] = None
 
@@ -52,9 +54,35 @@ class DealOut(BaseModel):
     teacher_name: str = ""
 
 
+class DealCounterpartyOut(BaseModel):
+    """Карточка собеседника по сделке"""
+    id: str
+    first_name: str = ""
+    last_name: str = ""
+    avatar_url: Optional[str] = None
+
+
+class DealSummaryOut(BaseModel):
+    """Краткая сводка сделки для списка"""
+    id: int
+    chat_id: int
+    status: DealStatus
+    role: str  # роль текущего пользователя: student | teacher
+    proposed_skill: Optional[str] = None
+    version: int
+    updated_at: Optional[datetime] = None
+    counterparty: DealCounterpartyOut
+
+
+class DealSummaryPageOut(BaseModel):
+    items: List[DealSummaryOut]
+    next_cursor: Optional[str] = None
+
+
 class DealStatusUpdate(BaseModel):
     status: DealStatus
     reason: Optional[str] = None
+    version: Optional[int] = None  # версия сделки, которую видел клиент
 
 
 class DealProposal(BaseModel):
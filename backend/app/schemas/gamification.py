@@ -1,6 +1,6 @@
 # app/schemas/gamification.py
 from pydantic import BaseModel, Field, validator
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 from enum import Enum
 
@@ -84,6 +84,23 @@ class ReviewOut(BaseModel):
     class Config:
         from_attributes = True
 
+class ReviewPageOut(BaseModel):
+    """Страница отзывов о пользователе."""
+    items: List[ReviewOut] = Field(default_factory=list, description="Отзывы, от новых к старым")
+    next_cursor: Optional[str] = Field(None, description="Курсор следующей страницы (None — страниц больше нет)")
+
+class RatingSummaryOut(BaseModel):
+    """Распределение оценок пользователя."""
+    user_id: str
+    total_ratings: int = Field(..., ge=0, description="Общее количество оценок")
+    average_rating: float = Field(..., ge=0, le=5, description="Средний рейтинг")
+    bayesian_rating: float = Field(..., ge=0, le=5, description="Байесовский рейтинг для сортировки")
+    histogram: Dict[int, int] = Field(..., description="Количество оценок по звёздам (1-5)")
+
+    @validator('average_rating', 'bayesian_rating')
+    def validate_rating(cls, v):
+        return round(v, 2)
+
 class UserStatsOut(BaseModel):
     """Статистика пользователя."""
     reputation: int = Field(..., description="Общая репутация")
@@ -93,6 +110,9 @@ class UserStatsOut(BaseModel):
     level: int = Field(..., ge=1, description="Текущий уровень")
     experience: int = Field(..., ge=0, description="Текущий опыт")
     next_level_exp: int = Field(..., ge=1, description="Опыт до следующего уровня")
+    bayesian_rating: Optional[float] = Field(None, ge=0, le=5, description="Байесовский рейтинг для сортировки")
+    rating_histogram: Dict[int, int] = Field(default_factory=dict, description="Количество оценок по звёздам (1-5)")
+    trending_reputation: float = Field(0.0, ge=0, description="Репутация с затуханием: свежие очки весят больше")
 
     programming_exchanges: int = Field(0, description="Обмены в программировании")
     design_exchanges: int = Field(0, description="Обмены в дизайне")
@@ -151,12 +171,19 @@ class LeaderboardUserOut(BaseModel):
     avatar_url: Optional[str] = Field(None, description="URL аватара")
     university: str = Field(..., description="Университет")
     reputation: int = Field(..., description="Репутация")
+    score: int = Field(0, description="Очки в выбранном разрезе рейтинга")
     level: int = Field(..., description="Уровень")
     position: int = Field(..., ge=1, description="Позиция в рейтинге")
 
     class Config:
         from_attributes = True
 
+class LeaderboardAroundOut(BaseModel):
+    """Место пользователя в таблице лидеров и его соседи."""
+    position: Optional[int] = Field(None, ge=1, description="Позиция пользователя (None, если его нет в рейтинге)")
+    total: int = Field(..., ge=0, description="Всего участников рейтинга")
+    entries: List[LeaderboardUserOut] = Field(default_factory=list, description="Соседи по рейтингу, включая пользователя")
+
 class GlobalStatsOut(BaseModel):
     """Глобальная статистика платформы."""
     total_users: int = Field(..., description="Всего пользователей")
@@ -165,6 +192,7 @@ class GlobalStatsOut(BaseModel):
     average_rating: float = Field(..., description="Средний рейтинг")
     most_popular_category: str = Field(..., description="Самая популярная категория")
     top_university: str = Field(..., description="Топовый университет")
+    active_today: int = Field(..., description="Активных сегодня")
     active_this_week: int = Field(..., description="Активных за неделю")
     new_users_today: int = Field(..., description="Новых пользователей сегодня")
 
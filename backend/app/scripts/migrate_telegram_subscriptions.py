@@ -0,0 +1,67 @@
+"""
+Перенос подписок Telegram из ключей telegram:subscription:{user_id} в хэш
+telegram:subscriptions.
+
+Ключи обходятся через SCAN пачками, без блокирующего KEYS. Подписка,
+которая уже есть в хэше (пользователь переподписался после выката), не
+перезаписывается. Перенесённые ключи удаляются, поэтому повторный запуск
+безопасен и продолжает с оставшихся. Подписка и отписка удаляют старый
+ключ пользователя, так что отменённая до переноса подписка не вернётся.
+
+Пока перенос не завершён, приложение читает подписки и из старых ключей;
+в конце скрипт ставит telegram:subscriptions:migrated, и после этого
+запасное чтение отключается. Рассылка и список подписок в админке видят
+только хэш — запустите перенос сразу после выката.
+
+Запуск из каталога backend:
+
+    python -m app.scripts.migrate_telegram_subscriptions
+"""
+import asyncio
+
+from app.database import get_redis, init_redis, close_redis
+from app.services.telegram_service import SUBSCRIPTIONS_KEY, LEGACY_SUBSCRIPTION_PREFIX, LEGACY_MIGRATED_KEY
+
+BATCH_SIZE = 500
+
+
+async def migrate() -> int:
+    redis_client = await get_redis()
+    moved = 0
+    batch = []
+    async for key in redis_client.scan_iter(match=f"{LEGACY_SUBSCRIPTION_PREFIX}*", count=BATCH_SIZE):
+        batch.append(key)
+        if len(batch) >= BATCH_SIZE:
+            moved += await _move(redis_client, batch)
+            batch = []
+    if batch:
+        moved += await _move(redis_client, batch)
+    await redis_client.set(LEGACY_MIGRATED_KEY, 1)
+    return moved
+
+
+async def _move(redis_client, keys) -> int:
+    values = await redis_client.mget(keys)
+    pipe = redis_client.pipeline(transaction=False)
+    moved = 0
+    for key, value in zip(keys, values):
+        if value is None:
+            continue
+        pipe.hsetnx(SUBSCRIPTIONS_KEY, key[len(LEGACY_SUBSCRIPTION_PREFIX):], value)
+        moved += 1
+    pipe.delete(*keys)
+    await pipe.execute()
+    return moved
+
+
+async def main():
+    await init_redis()
+    try:
+        moved = await migrate()
+        print(f"Telegram subscriptions migrated: {moved}")
+    finally:
+        await close_redis()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,35 @@
+"""
+Пересборка таблицы лидеров в Redis из user_stats.
+
+Нужна после сбоя Redis, ручных правок статистики в БД или при первом
+развёртывании. Собирает таблицу во временный ключ и атомарно подменяет
+текущую, поэтому запускать можно на работающем приложении.
+
+Запуск из каталога backend:
+
+    python -m app.scripts.rebuild_leaderboard
+"""
+import asyncio
+
+from app.database import AsyncSessionLocal, engine, init_redis, close_redis
+import app.models.ad  # noqa: F401
+import app.models.chat  # noqa: F401
+import app.models.deal  # noqa: F401
+import app.models.admin  # noqa: F401
+import app.models.gamification  # noqa: F401
+from app.services.leaderboard import LeaderboardService
+
+
+async def main():
+    await init_redis()
+    try:
+        async with AsyncSessionLocal() as db:
+            total = await LeaderboardService(db).rebuild()
+        print(f"Leaderboard rebuilt: {total} users")
+    finally:
+        await close_redis()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,59 @@
+"""
+Пересчёт user_stats всех пользователей из сделок, объявлений и отзывов,
+включая затухающую репутацию (decayed_reputation, trending_score).
+
+Нужен после инцидентов (потерянные события, ручные правки) и после
+изменения правил начисления. С --dry-run ничего не пишет и печатает
+отчёт о расхождениях. Перед запуском без --dry-run остановите приложение
+(релей outbox), иначе сделки, завершённые во время пересчёта, могут быть
+учтены дважды. После пересчёта пересоберите таблицу лидеров
+(python -m app.scripts.rebuild_leaderboard).
+
+Запуск из каталога backend:
+
+    python -m app.scripts.recompute_user_stats [--chunk-size 5000] [--dry-run]
+"""
+import argparse
+import asyncio
+import time
+
+from app.database import AsyncSessionLocal, engine
+import app.models.ad  # noqa: F401
+import app.models.chat  # noqa: F401
+import app.models.deal  # noqa: F401
+import app.models.admin  # noqa: F401
+import app.models.gamification  # noqa: F401
+from app.services.stats_recompute import StatsRecomputeService
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Пересчёт статистики пользователей из исходных таблиц")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Пользователей в одной пачке")
+    parser.add_argument("--dry-run", action="store_true", help="Только отчёт, без записи в БД")
+    parser.add_argument("--samples", type=int, default=10, help="Сколько примеров расхождений показать")
+    return parser.parse_args()
+
+
+async def main(args: argparse.Namespace):
+    started = time.monotonic()
+    try:
+        async with AsyncSessionLocal() as db:
+            report = await StatsRecomputeService(db).recompute(args.chunk_size, args.dry_run, args.samples)
+    finally:
+        await engine.dispose()
+
+    mode = "dry run" if args.dry_run else "applied"
+    print(f"User stats recompute ({mode}) in {time.monotonic() - started:.1f}s")
+    print(f"  users scanned: {report['users']}")
+    print(f"  rows changed:  {report['changed']}")
+    print(f"  rows created:  {report['created']}")
+    for field, count in sorted(report["fields"].items(), key=lambda item: -item[1]):
+        print(f"    {field}: {count}")
+    for sample in report["samples"]:
+        user_id = sample.pop("user_id")
+        diff = ", ".join(f"{field} {old} -> {new}" for field, (old, new) in sample.items())
+        print(f"  {user_id}: {diff}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,44 @@
+"""
+Перепроверка значков всех пользователей по текущим правилам.
+
+Запускается после изменения BADGE_RULES (app.services.badge_rules): выдаёт
+значки, условия которых теперь выполнены, а с --revoke ещё и отзывает
+значки под управлением правил, которые пользователь больше не заслуживает.
+
+Запуск из каталога backend:
+
+    python -m app.scripts.reevaluate_badges [--chunk-size 1000] [--revoke]
+"""
+import argparse
+import asyncio
+
+from app.database import AsyncSessionLocal, engine
+import app.models.ad  # noqa: F401
+import app.models.chat  # noqa: F401
+import app.models.deal  # noqa: F401
+import app.models.admin  # noqa: F401
+import app.models.gamification  # noqa: F401
+from app.services.gamification import GamificationService
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Перепроверка значков всех пользователей")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Пользователей в одной транзакции")
+    parser.add_argument("--revoke", action="store_true", help="Отзывать значки, условия которых больше не выполняются")
+    return parser.parse_args()
+
+
+async def main(args: argparse.Namespace):
+    try:
+        async with AsyncSessionLocal() as db:
+            result = await GamificationService(db).reevaluate_badges(args.chunk_size, args.revoke)
+        print(
+            f"Badges re-evaluated: {result['processed']} users, "
+            f"{result['awarded']} awarded, {result['revoked']} revoked"
+        )
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
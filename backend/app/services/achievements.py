@@ -0,0 +1,260 @@
+"""
+Достижения за активность: каталог, буферизованные счётчики и чтение прогресса.
+
+Горячие пути (сообщения, просмотры объявлений, отклики) увеличивают счётчик
+в Redis-хэше activity:pending:{user_id} и помечают пользователя в множестве
+activity:dirty — без записи в БД. Фоновый воркер пачками переносит накопленные
+приращения в user_activity_counters одним upsert и тут же проверяет пороги
+достижений. Прогресс читается как сумма сохранённого значения и ещё не
+сброшенного приращения.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, List
+
+from redis.exceptions import LockError
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import AsyncSessionLocal, get_redis
+from app.models.gamification import UserActivityCounters, UserAchievement
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = "activity:pending:{}"
+DIRTY_KEY = "activity:dirty"
+FLUSH_LOCK_KEY = "activity:flush:lock"
+
+ACTIVITY_COUNTERS = ("messages_sent", "ads_viewed", "responses_made")
+
+# Вычесть сброшенные в БД приращения. Поля, дошедшие до нуля, удаляются;
+# если за время сброса пришли новые события, пользователь снова помечается.
+SETTLE_SCRIPT = """
+for i = 1, #ARGV, 2 do
+    if redis.call('HINCRBY', KEYS[1], ARGV[i], -tonumber(ARGV[i + 1])) <= 0 then
+        redis.call('HDEL', KEYS[1], ARGV[i])
+    end
+end
+local remaining = redis.call('HLEN', KEYS[1])
+if remaining > 0 then
+    redis.call('SADD', KEYS[2], KEYS[3])
+end
+return remaining
+"""
+
+
+@dataclass(frozen=True)
+class Achievement:
+    """Достижение: порог по одному счётчику активности."""
+    id: int
+    code: str
+    name: str
+    description: str
+    icon: str
+    counter: str
+    required: int
+
+
+ACHIEVEMENTS = (
+    Achievement(1, "first_message", "Первое слово", "Отправь первое сообщение в чате", "✉️", "messages_sent", 1),
+    Achievement(2, "social_butterfly", "Социальная бабочка", "Отправь 10 сообщений в чатах", "🦋", "messages_sent", 10),
+    Achievement(3, "chatterbox", "Душа компании", "Отправь 100 сообщений в чатах", "💬", "messages_sent", 100),
+    Achievement(4, "explorer", "Исследователь", "Просмотри 50 объявлений", "🔍", "ads_viewed", 50),
+    Achievement(5, "first_response", "Первый отклик", "Откликнись на объявление", "🙋", "responses_made", 1),
+    Achievement(6, "active_seeker", "Активный ученик", "Откликнись на 10 объявлений", "📚", "responses_made", 10),
+)
+
+
+def reached_achievements(counters: Dict[str, int]) -> List[Achievement]:
+    """Достижения, пороги которых достигнуты"""
+    return [a for a in ACHIEVEMENTS if counters.get(a.counter, 0) >= a.required]
+
+
+class ActivityCounters:
+    """
+    Буферизованные в Redis счётчики активности и их периодический сброс в БД.
+
+    Сбрасывает один процесс за раз (блокировка в Redis): иначе два воркера
+    могли бы прочитать одно и то же приращение до того, как первый его вычтет.
+    """
+
+    FLUSH_LOCK_TIMEOUT = 60
+
+    def __init__(self):
+        self._settle = None
+        self._task = None
+        self.is_running = False
+        self.flush_interval = settings.ACTIVITY_COUNTERS_FLUSH_INTERVAL
+        self.batch_size = settings.ACTIVITY_COUNTERS_BATCH_SIZE
+
+    async def increment(self, user_id: str, counter: str, amount: int = 1):
+        """Увеличить счётчик (best-effort: ошибка Redis не ломает основной запрос)"""
+        try:
+            redis_client = await get_redis()
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.hincrby(PENDING_KEY.format(user_id), counter, amount)
+            pipe.sadd(DIRTY_KEY, user_id)
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"Activity counter {counter} increment failed: {e}")
+
+    async def pending(self, user_id: str) -> Dict[str, int]:
+        """Ещё не сброшенные в БД приращения пользователя"""
+        redis_client = await get_redis()
+        raw = await redis_client.hgetall(PENDING_KEY.format(user_id))
+        return {field: int(value) for field, value in raw.items()}
+
+    async def flush(self) -> int:
+        """Перенести в БД одну пачку помеченных пользователей. Возвращает её размер."""
+        redis_client = await get_redis()
+        lock = redis_client.lock(FLUSH_LOCK_KEY, timeout=self.FLUSH_LOCK_TIMEOUT)
+        if not await lock.acquire(blocking=False):
+            return 0
+        try:
+            return await self._flush_batch(redis_client)
+        finally:
+            try:
+                await lock.release()
+            except LockError:
+                logger.warning("Activity counters flush outlived its lock")
+
+    async def _flush_batch(self, redis_client) -> int:
+        user_ids = await redis_client.spop(DIRTY_KEY, self.batch_size)
+        if not user_ids:
+            return 0
+
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for user_id in user_ids:
+                pipe.hgetall(PENDING_KEY.format(user_id))
+            deltas = {
+                user_id: {field: int(value) for field, value in raw.items() if field in ACTIVITY_COUNTERS}
+                for user_id, raw in zip(user_ids, await pipe.execute())
+            }
+            deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+            if deltas:
+                async with AsyncSessionLocal() as db:
+                    await self._apply(db, deltas)
+        except Exception:
+            # Пользователи вернутся в следующую пачку; приращения остались в хэшах
+            await redis_client.sadd(DIRTY_KEY, *user_ids)
+            raise
+
+        # Закоммиченные приращения вычитаются, пришедшие во время сброса остаются
+        if self._settle is None:
+            self._settle = redis_client.register_script(SETTLE_SCRIPT)
+        for user_id, delta in deltas.items():
+            args = [item for field, value in delta.items() for item in (field, value)]
+            await self._settle(keys=[PENDING_KEY.format(user_id), DIRTY_KEY, user_id], args=args)
+        return len(user_ids)
+
+    async def _apply(self, db: AsyncSession, deltas: Dict[str, Dict[str, int]]):
+        """Сложить приращения с сохранёнными счётчиками и выдать достигнутые достижения"""
+        rows = [
+            {"user_id": user_id, **{field: delta.get(field, 0) for field in ACTIVITY_COUNTERS}}
+            for user_id, delta in sorted(deltas.items())
+        ]
+        stmt = pg_insert(UserActivityCounters).values(rows)
+        current = UserActivityCounters.__table__.c
+        result = await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[UserActivityCounters.user_id],
+                set_={field: current[field] + stmt.excluded[field] for field in ACTIVITY_COUNTERS}
+            ).returning(UserActivityCounters.user_id, *[current[field] for field in ACTIVITY_COUNTERS])
+        )
+
+        unlocked = [
+            {"user_id": row.user_id, "code": achievement.code}
+            for row in result.all()
+            for achievement in reached_achievements(row._mapping)
+        ]
+        if unlocked:
+            await db.execute(pg_insert(UserAchievement).values(unlocked).on_conflict_do_nothing())
+        await db.commit()
+
+    async def start(self):
+        if self.is_running:
+            return
+        self.is_running = True
+        self._task = asyncio.create_task(self._run())
+        logger.info("Activity counters flusher started")
+
+    async def stop(self):
+        self.is_running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        logger.info("Activity counters flusher stopped")
+
+    async def _run(self):
+        while self.is_running:
+            try:
+                flushed = await self.flush()
+            except Exception as e:
+                logger.error(f"Activity counters flush failed: {e}")
+                flushed = 0
+            if flushed < self.batch_size:
+                await asyncio.sleep(self.flush_interval)
+
+
+class AchievementService:
+    """Чтение достижений и прогресса пользователя."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_user_achievements(self, user_id: str) -> Dict:
+        counters_result = await self.db.execute(
+            select(*[getattr(UserActivityCounters, field) for field in ACTIVITY_COUNTERS])
+            .where(UserActivityCounters.user_id == user_id)
+        )
+        stored = counters_result.one_or_none()
+        counters = {field: getattr(stored, field) if stored else 0 for field in ACTIVITY_COUNTERS}
+        try:
+            for field, value in (await activity_counters.pending(user_id)).items():
+                if field in counters:
+                    counters[field] += value
+        except Exception as e:
+            logger.error(f"Activity counters read failed: {e}")
+
+        unlocked_result = await self.db.execute(
+            select(UserAchievement.code, UserAchievement.unlocked_at).where(UserAchievement.user_id == user_id)
+        )
+        unlocked_at = dict(unlocked_result.all())
+
+        unlocked, upcoming = [], []
+        for achievement in ACHIEVEMENTS:
+            progress = counters[achievement.counter]
+            if achievement.code in unlocked_at or progress >= achievement.required:
+                # Порог мог быть пройден после последнего сброса: время появится после него
+                unlocked.append({
+                    "id": achievement.id,
+                    "name": achievement.name,
+                    "description": achievement.description,
+                    "unlocked_at": unlocked_at.get(achievement.code),
+                    "icon": achievement.icon
+                })
+            else:
+                upcoming.append({
+                    "id": achievement.id,
+                    "name": achievement.name,
+                    "description": achievement.description,
+                    "progress": progress,
+                    "required": achievement.required,
+                    "progress_percentage": progress / achievement.required * 100
+                })
+
+        return {
+            "user_id": user_id,
+            "unlocked_achievements": unlocked,
+            "next_achievements": upcoming
+        }
+
+
+activity_counters = ActivityCounters()
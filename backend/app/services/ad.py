@@ -6,6 +6,7 @@ import math
 
 from app.models.ad import Ad
 from app.models.user import User
+from app.models.gamification import UserStats, RATING_PRIOR_MEAN
 from app.schemas.ad import AdCreate, AdUpdate, AdFilter
 
 class AdService:
@@ -83,6 +84,17 @@ class AdService:
 
         if filters.sort == "newest":
             query = query.order_by(Ad.created_at.desc())
+        elif filters.sort == "popular":
+            query = query.order_by(Ad.views_count.desc(), Ad.created_at.desc())
+        elif filters.sort == "rating":
+            # Байесовский рейтинг автора: один отзыв на 5 не обгоняет десятки хороших
+            query = (
+                query.outerjoin(UserStats, UserStats.user_id == Ad.author_id)
+                .order_by(
+                    func.coalesce(UserStats.bayesian_rating, RATING_PRIOR_MEAN).desc(),
+                    Ad.created_at.desc()
+                )
+            )
 
         count_query = select(func.count()).select_from(query.subquery())
         total_result = await self.db.execute(count_query)
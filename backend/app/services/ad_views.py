@@ -0,0 +1,185 @@
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional, Set
+
+from sqlalchemy import update, values, column, String, Integer
+
+from app.config import settings
+from app.database import AsyncSessionLocal, get_redis
+from app.models.ad import Ad
+from app.services.achievements import PENDING_KEY, DIRTY_KEY
+
+logger = logging.getLogger(__name__)
+
+STATS_KEY = "ad:stats:{}"
+VIEWERS_KEY = "ad:viewers:{}"
+
+
+def _day(moment: datetime) -> str:
+    return moment.strftime("%Y%m%d")
+
+
+class AdViewCounter:
+    """
+    Счётчики просмотров и показов объявлений.
+
+    record_view()/record_impressions() синхронно пишут в память воркера и не
+    добавляют задержки запросу. Раз в AD_VIEWS_FLUSH_INTERVAL буфер уходит
+    пачкой: в Redis — дневные корзины в хэше ad:stats:{id} (views:/impressions:
+    {YYYYMMDD}) и HyperLogLog уникальных зрителей ad:viewers:{id}, в Postgres —
+    ads.views_count одним UPDATE ... FROM (VALUES ...) для сортировки ленты.
+    Просмотры авторизованных пользователей тем же сбросом попадают в их
+    счётчики активности (activity:pending:{user_id}, поле ads_viewed).
+
+    Если запись в Postgres не удалась, приращения views_count ждут следующего
+    сброса в отдельном буфере _pending_db: в Redis они уже записаны и
+    повторно туда не попадают.
+    """
+
+    STATS_TTL = 90 * 24 * 60 * 60
+
+    def __init__(self):
+        self._views: Counter = Counter()
+        self._impressions: Counter = Counter()
+        self._viewers: Dict[str, Set[str]] = {}
+        self._ads_viewed: Counter = Counter()
+        self._pending_db: Counter = Counter()
+        self._task = None
+        self.is_running = False
+        self.flush_interval = settings.AD_VIEWS_FLUSH_INTERVAL
+
+    def record_view(self, ad_id: str, viewer: str, user_id: Optional[str] = None):
+        """viewer — id пользователя или адрес клиента для анонимов; user_id — для счётчика активности"""
+        self._views[ad_id] += 1
+        self._viewers.setdefault(ad_id, set()).add(viewer)
+        if user_id:
+            self._ads_viewed[user_id] += 1
+
+    def record_impressions(self, ad_ids: Iterable[str]):
+        self._impressions.update(ad_ids)
+
+    async def flush(self) -> int:
+        """Сбросить буфер. Возвращает число затронутых объявлений."""
+        if not (self._views or self._impressions or self._pending_db):
+            return 0
+        views, self._views = self._views, Counter()
+        impressions, self._impressions = self._impressions, Counter()
+        viewers, self._viewers = self._viewers, {}
+        ads_viewed, self._ads_viewed = self._ads_viewed, Counter()
+
+        try:
+            await self._flush_redis(views, impressions, viewers, ads_viewed)
+        except Exception:
+            self._restore(views, impressions, viewers)
+            self._ads_viewed.update(ads_viewed)
+            raise
+
+        db_views, self._pending_db = self._pending_db + views, Counter()
+        if db_views:
+            try:
+                await self._flush_db(db_views)
+            except Exception:
+                # В Redis уже записано: повторяется только сохранение в БД
+                self._pending_db.update(db_views)
+                raise
+        return len(db_views.keys() | impressions.keys())
+
+    async def _flush_redis(
+        self, views: Counter, impressions: Counter, viewers: Dict[str, Set[str]], ads_viewed: Counter
+    ):
+        day = _day(datetime.now(timezone.utc))
+        redis_client = await get_redis()
+        pipe = redis_client.pipeline(transaction=False)
+        for ad_id in views.keys() | impressions.keys():
+            key = STATS_KEY.format(ad_id)
+            if views[ad_id]:
+                pipe.hincrby(key, f"views:{day}", views[ad_id])
+            if impressions[ad_id]:
+                pipe.hincrby(key, f"impressions:{day}", impressions[ad_id])
+            pipe.expire(key, self.STATS_TTL)
+        for ad_id, ad_viewers in viewers.items():
+            pipe.pfadd(VIEWERS_KEY.format(ad_id), *ad_viewers)
+            pipe.expire(VIEWERS_KEY.format(ad_id), self.STATS_TTL)
+        for user_id, count in ads_viewed.items():
+            pipe.hincrby(PENDING_KEY.format(user_id), "ads_viewed", count)
+        if ads_viewed:
+            pipe.sadd(DIRTY_KEY, *ads_viewed.keys())
+        await pipe.execute()
+
+    async def _flush_db(self, views: Counter):
+        increments = values(
+            column("id", String), column("views", Integer), name="increments"
+        ).data(sorted(views.items()))
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Ad)
+                .where(Ad.id == increments.c.id)
+                # updated_at не трогаем: просмотр не изменение объявления
+                .values(views_count=Ad.views_count + increments.c.views, updated_at=Ad.updated_at)
+            )
+            await db.commit()
+
+    def _restore(self, views: Counter, impressions: Counter, viewers: Dict[str, Set[str]]):
+        self._views.update(views)
+        self._impressions.update(impressions)
+        for ad_id, ad_viewers in viewers.items():
+            self._viewers.setdefault(ad_id, set()).update(ad_viewers)
+
+    async def get_stats(self, ad_id: str, days: int) -> Dict:
+        """Уникальные зрители и дневные корзины за последние days дней (от старых к новым)"""
+        today = datetime.now(timezone.utc)
+        dates = [_day(today - timedelta(days=offset)) for offset in range(days - 1, -1, -1)]
+
+        redis_client = await get_redis()
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.pfcount(VIEWERS_KEY.format(ad_id))
+        pipe.hmget(
+            STATS_KEY.format(ad_id),
+            [f"views:{date}" for date in dates] + [f"impressions:{date}" for date in dates]
+        )
+        unique_viewers, buckets = await pipe.execute()
+
+        return {
+            "unique_viewers": unique_viewers,
+            "daily": [
+                {
+                    "date": datetime.strptime(date, "%Y%m%d").date(),
+                    "views": int(buckets[i] or 0),
+                    "impressions": int(buckets[len(dates) + i] or 0)
+                } for i, date in enumerate(dates)
+            ]
+        }
+
+    async def start(self):
+        if self.is_running:
+            return
+        self.is_running = True
+        self._task = asyncio.create_task(self._run())
+        logger.info("Ad view counter started")
+
+    async def stop(self):
+        self.is_running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Ad view counter final flush failed: {e}")
+        logger.info("Ad view counter stopped")
+
+    async def _run(self):
+        while self.is_running:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ad view counter flush failed: {e}")
+
+
+ad_views = AdViewCounter()
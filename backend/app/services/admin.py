@@ -1,15 +1,24 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, and_, or_, desc
 from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.exc import StaleDataError
 from typing import Optional, Tuple, List
 import math
+import logging
 
+from app.database import get_redis
 from app.models.user import User, UserRole, UserProfile
 from app.models.ad import Ad
 from app.models.chat import Chat, Message
 from app.models.deal import Deal, DealStatus
 from app.models.admin import AdminLog, AdminActionType
 from app.schemas.admin import UserBanRequest, AdminActionRequest
+from app.services.leaderboard import LeaderboardService
+from app.services.profile_cache import profile_cache
+from app.services.user_cache import user_cache
+from app.services.tokens import RefreshTokenStore
+
+logger = logging.getLogger(__name__)
 
 class AdminService:
     """Сервис для работы с админ-панелью."""
@@ -208,6 +217,13 @@ class AdminService:
         
         await self.db.commit()
         await self.db.refresh(user)
+        await LeaderboardService(self.db).remove(user_id)
+        await profile_cache.invalidate(user_id)
+        await user_cache.invalidate(user_id)
+        try:
+            await RefreshTokenStore(await get_redis()).revoke_user(user_id)
+        except Exception as e:
+            logger.error(f"Token revocation for banned user {user_id} failed: {e}")
         
         return user
 
@@ -239,6 +255,9 @@ class AdminService:
         
         await self.db.commit()
         await self.db.refresh(user)
+        await LeaderboardService(self.db).restore(user_id)
+        await profile_cache.invalidate(user_id)
+        await user_cache.invalidate(user_id)
         
         return user
 
@@ -322,7 +341,11 @@ class AdminService:
         )
         self.db.add(admin_log)
         
-        await self.db.commit()
+        try:
+            await self.db.commit()
+        except StaleDataError:
+            await self.db.rollback()
+            raise ValueError("Deal was modified concurrently, try again")
         await self.db.refresh(deal)
         
         return deal
@@ -1,28 +1,57 @@
 from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from redis.asyncio import Redis 
 import logging
 from typing import Tuple, Optional
+from uuid import uuid4
 
 from app.config import settings
-from app.services.sms import SMSProvider, get_sms_provider 
+from app.services.sms import SMSDispatcher, get_sms_provider 
 from app.models.user import User, UserRole
 from app.utils.security import generate_verification_code, create_access_token, create_refresh_token
 from app.database import get_db, get_redis 
+from app.services.rate_limit import RateLimit, rate_limiter
 
 logger = logging.getLogger(__name__)
 
-def create_tokens(user: User) -> Tuple[str, int, str, int]:
+# Compare the code, consume it on success, count failures and lock after too many.
+# The attempt counter outlives the code, so requesting a new code does not reset it.
+# Returns {status, attempts left}: 1 ok, 0 wrong code, -1 no code, -2 locked.
+VERIFY_CODE_SCRIPT = """
+local attempts = tonumber(redis.call('GET', KEYS[2]) or '0')
+local max_attempts = tonumber(ARGV[2])
+if attempts >= max_attempts then
+    return {-2, 0}
+end
+local code = redis.call('GET', KEYS[1])
+if not code then
+    return {-1, max_attempts - attempts}
+end
+if code == ARGV[1] then
+    redis.call('DEL', KEYS[1], KEYS[2])
+    return {1, max_attempts - attempts}
+end
+attempts = redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+if attempts >= max_attempts then
+    redis.call('DEL', KEYS[1])
+end
+return {0, max_attempts - attempts}
+"""
+
+def create_tokens(user: User, family: str, jti: str) -> Tuple[str, int, str, int]:
     """
     Creates Access and Refresh tokens for a User object.
+    The refresh token must be registered in RefreshTokenStore (issue/rotate) to be usable.
     Returns: (access_token, access_exp, refresh_token, refresh_exp)
     """
     user_id = str(user.id) 
     role = str(user.role.value) 
     
     access_token, access_exp = create_access_token(user_id, role)
-    refresh_token, refresh_exp = create_refresh_token(user_id, role)
+    refresh_token, refresh_exp = create_refresh_token(user_id, role, family, jti)
     
     return access_token, access_exp, refresh_token, refresh_exp
 
@@ -33,13 +62,21 @@ async def get_user_by_phone(db: AsyncSession, phone: str) -> Optional[User]:
     )
     return result.scalars().first()
 
-async def create_new_user(db: AsyncSession, phone: str) -> User:
-    """Creates a new user with the STUDENT role."""
-    new_user = User(phone=phone, role=UserRole.STUDENT) 
-    db.add(new_user)
+async def upsert_user_by_phone(db: AsyncSession, phone: str) -> Tuple[User, bool]:
+    """
+    Returns the user with this phone, creating a STUDENT if there is none, in one statement.
+    The no-op update makes RETURNING yield existing rows; xmax = 0 only for a fresh insert.
+    Returns: (user, is_new)
+    """
+    stmt = pg_insert(User).values(id=str(uuid4()), phone=phone, role=UserRole.STUDENT, is_active=True)
+    stmt = stmt.on_conflict_do_update(index_elements=[User.phone], set_={"phone": stmt.excluded.phone})
+    result = await db.execute(
+        stmt.returning(User, literal_column("xmax = 0").label("inserted")),
+        execution_options={"populate_existing": True}
+    )
+    user, is_new = result.one()
     await db.commit()
-    await db.refresh(new_user)
-    return new_user
+    return user, is_new
 
 async def get_user_by_id_dao(db: AsyncSession, user_id: str) -> Optional[User]:
     """Retrieves a user by ID (UUID)."""
@@ -51,13 +88,15 @@ async def get_user_by_id_dao(db: AsyncSession, user_id: str) -> Optional[User]:
 
 class AuthService:
     """Service for phone authentication, rate limiting, and code management."""
-    def __init__(self, db: AsyncSession, redis: Redis, sms_provider: SMSProvider):
+    def __init__(self, db: AsyncSession, redis: Redis, sms_provider: SMSDispatcher):
         self.db = db
         self.redis = redis
         self.sms_provider = sms_provider
 
         self.limit = settings.CODE_REQUEST_LIMIT
         self.window = settings.CODE_REQUEST_WINDOW
+        self.code_rate_limit = RateLimit("auth:code", self.limit, self.window)
+        self._verify = redis.register_script(VERIFY_CODE_SCRIPT)
 
     async def get_user_by_id(self, user_id: str) -> Optional[User]:
         """Method used by router/dependency to get a user by token ID (UUID)."""
@@ -68,17 +107,8 @@ class AuthService:
         Generates and sends an SMS code, handling request limits.
         Returns: (success, message, debug_code)
         """
-        rate_key = f"auth:ratelimit:{phone}"
-        
-        count = await self.redis.incr(rate_key)
-        
-        if count == 1:
- 
-            await self.redis.expire(rate_key, self.window)
-
-        if count > self.limit:
-          
-            await self.redis.decr(rate_key) 
+        limited = await rate_limiter.hit(self.code_rate_limit, phone)
+        if not limited.allowed:
             minutes = self.window // 60
             return False, f"Too many requests. Limit is {self.limit} per {minutes} minutes.", None
 
@@ -88,15 +118,19 @@ class AuthService:
         
         await self.redis.set(code_key, code, ex=code_expiry)
 
-        success = await self.sms_provider.send_code(phone, code)
+        async def refund():
+            await rate_limiter.refund(self.code_rate_limit, phone)
+
+        # Delivery happens in the background; the request only waits for the queue
+        success = await self.sms_provider.enqueue(phone, code, on_failure=refund)
         
         if not success:
-            logger.error(f"Failed to send SMS to {phone} for code {code}")
+            logger.error(f"Failed to queue SMS to {phone}")
 
-            await self.redis.decr(rate_key)
+            await refund()
             return False, "Failed to send SMS. Please try again.", None
             
-        logger.info(f"Verification code requested and stored for {phone}")
+        logger.info(f"Verification code requested and queued for {phone}")
 
         debug_code = code if settings.DEBUG else None 
 
@@ -107,30 +141,29 @@ class AuthService:
         Verifies the code, and if successful, finds or creates a user.
         Returns: (user, is_new, error)
         """
-        code_key = f"auth:code:{phone}"
-        stored_code = await self.redis.get(code_key)
-        
-        if not stored_code:
-            return None, False, "Verification code expired or not requested."
+        status, attempts_left = await self._verify(
+            keys=[f"auth:code:{phone}", f"auth:code_attempts:{phone}"],
+            args=[submitted_code, settings.CODE_MAX_ATTEMPTS, settings.CODE_LOCK_SECONDS]
+        )
 
-        if stored_code != submitted_code:
-            return None, False, "Invalid verification code."
+        if status == -2 or (status == 0 and attempts_left <= 0):
+            minutes = settings.CODE_LOCK_SECONDS // 60
+            return None, False, f"Too many failed attempts. Try again in {minutes} minutes."
 
-        await self.redis.delete(code_key)
+        if status == -1:
+            return None, False, "Verification code expired or not requested."
 
-        user = await get_user_by_phone(self.db, phone)
-        is_new = False
-        
-        if user is None:
-            user = await create_new_user(self.db, phone)
-            is_new = True
+        if status == 0:
+            return None, False, f"Invalid verification code. Attempts left: {attempts_left}."
+
+        user, is_new = await upsert_user_by_phone(self.db, phone)
 
         return user, is_new, None
 
 def get_auth_service(
     db: AsyncSession = Depends(get_db), 
     redis: Redis = Depends(get_redis), 
-    sms_provider: SMSProvider = Depends(get_sms_provider), 
+    sms_provider: SMSDispatcher = Depends(get_sms_provider), 
 ) -> AuthService:
     """DI for the Authentication Service."""
     return AuthService(db=db, redis=redis, sms_provider=sms_provider)
\ No newline at end of file
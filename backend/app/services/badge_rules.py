@@ -0,0 +1,125 @@
+"""
+Правила выдачи значков и кэш каталога значков.
+
+Правила описаны данными (BADGE_RULES) и проверяются за один проход по
+неизменяемому снимку статистики. Каталог (тип значка -> id) загружается
+из БД один раз на процесс и сбрасывается во всех процессах через pub/sub,
+когда администратор добавляет значок.
+"""
+import asyncio
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import FrozenSet, Mapping, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.ad import AdCategory
+from app.models.gamification import UserStats
+from app.models.user import Badge, BadgeType
+from app.services.pubsub import pubsub_hub
+
+
+@dataclass(frozen=True)
+class StatsSnapshot:
+    """Снимок статистики пользователя, по которому проверяются правила."""
+    user_id: str
+    exchanges_completed: int
+    total_ratings: int
+    average_rating: float
+    best_category_exchanges: int
+
+    @classmethod
+    def from_stats(cls, stats) -> "StatsSnapshot":
+        return cls(
+            user_id=stats.user_id,
+            exchanges_completed=stats.exchanges_completed or 0,
+            total_ratings=stats.total_ratings or 0,
+            average_rating=stats.average_rating or 0.0,
+            best_category_exchanges=max(
+                getattr(stats, f"{category.value}_exchanges") or 0 for category in AdCategory
+            )
+        )
+
+
+@dataclass(frozen=True)
+class BadgeRule:
+    """Условие значка: все заданные пороги должны быть достигнуты."""
+    badge_type: BadgeType
+    min_exchanges: int = 0
+    min_ratings: int = 0
+    min_average_rating: float = 0.0
+    min_category_exchanges: int = 0
+
+    def matches(self, snapshot: StatsSnapshot) -> bool:
+        return (
+            snapshot.exchanges_completed >= self.min_exchanges
+            and snapshot.total_ratings >= self.min_ratings
+            and snapshot.average_rating >= self.min_average_rating
+            and snapshot.best_category_exchanges >= self.min_category_exchanges
+        )
+
+
+BADGE_RULES = (
+    BadgeRule(BadgeType.FIRST_EXCHANGE, min_exchanges=1),
+    BadgeRule(BadgeType.POPULAR, min_exchanges=10),
+    BadgeRule(BadgeType.MENTOR, min_exchanges=25),
+    BadgeRule(BadgeType.EXPERT, min_exchanges=50),
+    BadgeRule(BadgeType.TOP_RATED, min_ratings=5, min_average_rating=4.8),
+    BadgeRule(BadgeType.CATEGORY_EXPERT, min_category_exchanges=10),
+)
+
+# Значки, которыми управляют правила (остальные выдаются вручную)
+RULE_BADGE_TYPES: FrozenSet[BadgeType] = frozenset(rule.badge_type for rule in BADGE_RULES)
+
+# Колонки user_stats, нужные для снимка
+SNAPSHOT_COLUMNS = (
+    UserStats.user_id,
+    UserStats.exchanges_completed,
+    UserStats.total_ratings,
+    UserStats.average_rating,
+    *[getattr(UserStats, f"{category.value}_exchanges") for category in AdCategory],
+)
+
+
+def evaluate_badges(snapshot: StatsSnapshot) -> FrozenSet[BadgeType]:
+    """Типы значков, условия которых выполнены"""
+    return frozenset(rule.badge_type for rule in BADGE_RULES if rule.matches(snapshot))
+
+
+class BadgeCatalog:
+    """Неизменяемый кэш каталога значков: тип -> id."""
+
+    CHANNEL = "gamification:badge_catalog"
+
+    def __init__(self):
+        self._by_type: Optional[Mapping[BadgeType, int]] = None
+        self._lock = asyncio.Lock()
+
+    async def get(self, db: AsyncSession) -> Mapping[BadgeType, int]:
+        if self._by_type is not None:
+            return self._by_type
+        async with self._lock:
+            if self._by_type is None:
+                result = await db.execute(select(Badge.type, Badge.id))
+                by_type = MappingProxyType(dict(result.all()))
+                if not by_type:
+                    # Значки ещё не засеяны: не кэшируем пустой каталог
+                    return by_type
+                self._by_type = by_type
+        return self._by_type
+
+    def reset(self):
+        self._by_type = None
+
+    async def invalidate(self):
+        """Сбросить кэш в этом и во всех остальных процессах"""
+        self.reset()
+        await pubsub_hub.publish(self.CHANNEL, {})
+
+    async def _on_invalidate(self, data: dict):
+        self.reset()
+
+
+badge_catalog = BadgeCatalog()
+pubsub_hub.subscribe(BadgeCatalog.CHANNEL, badge_catalog._on_invalidate)
@@ -0,0 +1,287 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, Optional
+from uuid import uuid4
+
+from app.config import settings
+from app.database import get_redis
+from app.services.telegram_dispatcher import telegram_dispatcher
+from app.services.telegram_service import SUBSCRIPTIONS_KEY, announcement_text, telegram_service
+
+logger = logging.getLogger(__name__)
+
+CURRENT_KEY = "telegram:broadcast:current"
+ACTIVE_KEY = "telegram:broadcast:active"
+JOB_KEY = "telegram:broadcast:{}"
+LOCK_KEY = "telegram:broadcast:lock"
+
+RUNNING, COMPLETED, CANCELLED = "running", "completed", "cancelled"
+
+# Создать задачу, только если другой активной нет: проверка и запись — один шаг
+CREATE_SCRIPT = """
+if redis.call('SET', KEYS[1], ARGV[1], 'NX') == false then
+    return 0
+end
+for i = 2, #ARGV, 2 do
+    redis.call('HSET', KEYS[2], ARGV[i], ARGV[i + 1])
+end
+redis.call('SET', KEYS[3], ARGV[1])
+return 1
+"""
+
+# Продлить блокировку, только если она всё ещё наша
+EXTEND_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Сохранить итог страницы, только если блокировка всё ещё наша; на последней
+# странице — завершить задачу. Возвращает статус задачи или false без блокировки.
+CHECKPOINT_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return false
+end
+redis.call('HINCRBY', KEYS[2], 'sent', ARGV[2])
+redis.call('HINCRBY', KEYS[2], 'failed', ARGV[3])
+redis.call('HSET', KEYS[2], 'cursor', ARGV[4], 'updated_at', ARGV[5])
+local status = redis.call('HGET', KEYS[2], 'status')
+if ARGV[4] == '0' and status == 'running' then
+    status = 'completed'
+    redis.call('HSET', KEYS[2], 'status', status)
+end
+if status ~= 'running' then
+    if redis.call('GET', KEYS[3]) == ARGV[6] then
+        redis.call('DEL', KEYS[3])
+    end
+    redis.call('EXPIRE', KEYS[2], ARGV[7])
+end
+return status
+"""
+
+# Отменить задачу, только если она ещё идёт: не перезаписывает статус
+# completed, поставленный последней страницей в тот же момент
+CANCEL_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'status') ~= 'running' then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'status', 'cancelled', 'updated_at', ARGV[2])
+if redis.call('GET', KEYS[2]) == ARGV[1] then
+    redis.call('DEL', KEYS[2])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+
+class TelegramBroadcast:
+    """
+    Рассылка объявления всем подписчикам Telegram в фоне.
+
+    Состояние задачи — хэш telegram:broadcast:{id} (текст, курсор HSCAN по
+    подпискам, счётчики). Задача читает подписчиков страницами, отправляет
+    страницу через telegram_dispatcher (его token bucket задаёт темп — общий
+    предел Telegram на бота) и после каждой страницы сохраняет курсор.
+
+    Одновременно активна одна задача (telegram:broadcast:active, SET NX при
+    создании). Выполняет её один процесс — тот, кто держит
+    telegram:broadcast:lock. Пока страница отправляется, блокировку продлевает
+    отдельная задача-пульс, а TTL блокировки больше таймаута страницы;
+    итог страницы записывается, только если блокировка всё ещё у этого
+    процесса. Остальные процессы раз в WATCH_INTERVAL пробуют подхватить
+    незавершённую задачу, так что после падения исполнителя или перезапуска
+    рассылка продолжается с сохранённого курсора. Страница, прерванная на
+    середине, отправляется заново: доставка не реже одного раза.
+    """
+
+    WATCH_INTERVAL = 30
+    JOB_TTL = 30 * 24 * 60 * 60
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._job: Optional[asyncio.Task] = None
+        self._scripts = {}
+        self._owner = uuid4().hex
+        self.is_running = False
+        self.page_size = settings.TELEGRAM_BROADCAST_PAGE_SIZE
+        self.page_timeout = settings.TELEGRAM_BROADCAST_PAGE_TIMEOUT
+        self.lock_ttl = int(self.page_timeout) + 60
+
+    async def create(self, title: str, content: str, admin_id: str) -> Dict:
+        """Запустить рассылку. ValueError, если предыдущая ещё идёт."""
+        if not telegram_dispatcher.is_running:
+            raise ValueError("Telegram bot is not running")
+        redis_client = await get_redis()
+
+        job_id = uuid4().hex
+        now = time.time()
+        job = {
+            "id": job_id,
+            "title": title,
+            "content": content,
+            "created_by": admin_id,
+            "status": RUNNING,
+            "cursor": 0,
+            "total": await telegram_service.get_subscriptions_count(),
+            "sent": 0,
+            "failed": 0,
+            "created_at": now,
+            "updated_at": now,
+        }
+        fields = [value for pair in job.items() for value in pair]
+        created = await self._script(redis_client, CREATE_SCRIPT)(
+            keys=[ACTIVE_KEY, JOB_KEY.format(job_id), CURRENT_KEY], args=[job_id, *fields]
+        )
+        if not created:
+            raise ValueError("Broadcast is already running")
+
+        await self.resume()
+        return await self.get_progress(job_id)
+
+    async def cancel(self) -> Optional[Dict]:
+        """Остановить текущую рассылку (процесс-исполнитель увидит статус после страницы)"""
+        redis_client = await get_redis()
+        job_id = await redis_client.get(CURRENT_KEY)
+        if not job_id:
+            return None
+        await self._script(redis_client, CANCEL_SCRIPT)(
+            keys=[JOB_KEY.format(job_id), ACTIVE_KEY], args=[job_id, time.time(), self.JOB_TTL]
+        )
+        return await self.get_progress(job_id)
+
+    async def get_progress(self, job_id: Optional[str] = None) -> Optional[Dict]:
+        """Прогресс рассылки (по умолчанию — последней): отправлено, ошибки, осталось, ETA"""
+        redis_client = await get_redis()
+        job_id = job_id or await redis_client.get(CURRENT_KEY)
+        if not job_id:
+            return None
+        job = await redis_client.hgetall(JOB_KEY.format(job_id))
+        if not job:
+            return None
+
+        sent, failed, total = int(job["sent"]), int(job["failed"]), int(job["total"])
+        remaining = max(total - sent - failed, 0) if job["status"] == RUNNING else 0
+        elapsed = float(job["updated_at"]) - float(job["created_at"])
+        rate = (sent + failed) / elapsed if elapsed > 0 else 0.0
+        return {
+            "id": job["id"],
+            "title": job["title"],
+            "status": job["status"],
+            "total": total,
+            "sent": sent,
+            "failed": failed,
+            "remaining": remaining,
+            "rate_per_second": round(rate, 2),
+            "eta_seconds": round(remaining / rate) if rate > 0 and remaining else None,
+            "created_at": float(job["created_at"]),
+            "updated_at": float(job["updated_at"]),
+        }
+
+    async def resume(self):
+        """Подхватить незавершённую рассылку, если её никто не выполняет"""
+        if self._job and not self._job.done():
+            return
+        redis_client = await get_redis()
+        job_id = await redis_client.get(CURRENT_KEY)
+        if not job_id or await redis_client.hget(JOB_KEY.format(job_id), "status") != RUNNING:
+            return
+        if not await redis_client.set(LOCK_KEY, self._owner, nx=True, ex=self.lock_ttl):
+            return
+        self._job = asyncio.create_task(self._send_job(job_id))
+        logger.info(f"Telegram broadcast {job_id} started")
+
+    async def start(self):
+        if self.is_running:
+            return
+        self.is_running = True
+        self._task = asyncio.create_task(self._run())
+        logger.info("Telegram broadcast watcher started")
+
+    async def stop(self):
+        self.is_running = False
+        for task in (self._task, self._job):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._job = None
+        logger.info("Telegram broadcast watcher stopped")
+
+    async def _run(self):
+        while self.is_running:
+            try:
+                await self.resume()
+            except Exception as e:
+                logger.error(f"Telegram broadcast resume failed: {e}")
+            await asyncio.sleep(self.WATCH_INTERVAL)
+
+    async def _send_job(self, job_id: str):
+        redis_client = await get_redis()
+        key = JOB_KEY.format(job_id)
+        heartbeat = asyncio.create_task(self._heartbeat(redis_client, job_id, asyncio.current_task()))
+        try:
+            job = await redis_client.hgetall(key)
+            text = announcement_text(job["title"], job["content"])
+            cursor = int(job["cursor"])
+            while self.is_running:
+                cursor, page = await redis_client.hscan(SUBSCRIPTIONS_KEY, cursor=cursor, count=self.page_size)
+                results = await asyncio.gather(*[
+                    telegram_dispatcher.send(self._chat_id(value), text, timeout=self.page_timeout)
+                    for value in page.values()
+                ])
+                sent = sum(1 for delivered in results if delivered)
+
+                status = await self._script(redis_client, CHECKPOINT_SCRIPT)(
+                    keys=[LOCK_KEY, key, ACTIVE_KEY],
+                    args=[self._owner, sent, len(results) - sent, cursor, time.time(), job_id, self.JOB_TTL]
+                )
+                if status is None:
+                    logger.warning(f"Telegram broadcast {job_id} lock lost, page not recorded")
+                    return
+                if status != RUNNING:
+                    logger.info(f"Telegram broadcast {job_id} {status}")
+                    return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Telegram broadcast {job_id} failed: {e}")
+        finally:
+            heartbeat.cancel()
+            try:
+                if await redis_client.get(LOCK_KEY) == self._owner:
+                    await redis_client.delete(LOCK_KEY)
+            except Exception as e:
+                logger.error(f"Telegram broadcast lock release failed: {e}")
+
+    async def _heartbeat(self, redis_client, job_id: str, job_task: asyncio.Task):
+        """Продлевать блокировку, пока идёт отправка; потеряли — остановить задачу"""
+        extend = self._script(redis_client, EXTEND_LOCK_SCRIPT)
+        while True:
+            await asyncio.sleep(self.lock_ttl / 3)
+            try:
+                extended = await extend(keys=[LOCK_KEY], args=[self._owner, self.lock_ttl])
+            except Exception as e:
+                logger.error(f"Telegram broadcast {job_id} lock renewal failed: {e}")
+                continue
+            if not extended:
+                logger.warning(f"Telegram broadcast {job_id} lock lost, stopping")
+                job_task.cancel()
+                return
+
+    def _script(self, redis_client, source: str):
+        script = self._scripts.get(source)
+        if script is None:
+            script = self._scripts[source] = redis_client.register_script(source)
+        return script
+
+    @staticmethod
+    def _chat_id(value: str) -> str:
+        return json.loads(value)["chat_id"]
+
+
+telegram_broadcast = TelegramBroadcast()
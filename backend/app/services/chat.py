@@ -6,7 +6,9 @@ from datetime import datetime
 
 from app.models.chat import Chat, Message
 from app.models.ad import Ad
+from app.models.user import User
 from app.schemas.chat import ChatCreate, MessageCreate
+from app.services.achievements import activity_counters
 
 
 class ChatService:
@@ -41,6 +43,7 @@ class ChatService:
         self.db.add(chat)
         await self.db.commit()
         await self.db.refresh(chat)
+        await activity_counters.increment(current_user_id, "responses_made")
         
         return chat
 
@@ -97,9 +100,20 @@ class ChatService:
         
         self.db.add(message)
         await self.db.commit()
-        await self.db.refresh(message)
+        await activity_counters.increment(sender_id, "messages_sent")
         
-        return message
+        return await self._get_message(message.id)
+
+    async def _get_message(self, message_id: int) -> Optional[Message]:
+        """Сообщение с отправителем и его профилем (имя отправителя в ответе)"""
+        from sqlalchemy.orm import selectinload
+
+        result = await self.db.execute(
+            select(Message)
+            .options(selectinload(Message.sender).selectinload(User.profile))
+            .where(Message.id == message_id)
+        )
+        return result.scalar_one_or_none()
 
     async def get_chat_messages(self, chat_id: int, user_id: str, limit: int = 50, offset: int = 0) -> List[Message]:  
         """Получить сообщения чата с пагинацией"""
@@ -112,7 +126,7 @@ class ChatService:
         
         result = await self.db.execute(
             select(Message)
-            .options(selectinload(Message.sender))
+            .options(selectinload(Message.sender).selectinload(User.profile))
             .where(Message.chat_id == chat_id)
             .order_by(Message.created_at.asc())
             .limit(limit)
@@ -1,14 +1,28 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
-from typing import Optional, List
-from datetime import datetime
+from sqlalchemy import select, update, insert, and_, func, literal, true, tuple_, union_all
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.types import JSON
+from typing import Optional, List, Tuple
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+import base64
 
 from app.models.deal import Deal, DealStatus, DealStatusLog
 from app.models.chat import Chat
 from app.models.ad import Ad
+from app.models.user import UserProfile
+from app.models.outbox import OutboxEvent
+from app.services.outbox import outbox_event, outbox_relay
+from app.services.deal_events import DEAL_STATUS_CHANGED, DEAL_TERMS_PROPOSED
+from app.config import settings
 from app.schemas.deal import DealCreate, DealUpdate, DealStatusUpdate, DealProposal
 
 
+class DealConflictError(Exception):
+    """Сделка была изменена параллельно: клиенту нужно перечитать её и повторить запрос."""
+
+
 class DealService:
     def __init__(self, db: AsyncSession):
         self.db = db
@@ -37,6 +51,7 @@ class DealService:
             proposed_skill=deal_data.proposed_skill,
             proposed_time=deal_data.proposed_time,
             proposed_place=deal_data.proposed_place,
+            scheduled_at=parse_proposed_time(deal_data.proposed_time),
             status=DealStatus.NEW
         )
         
@@ -49,36 +64,86 @@ class DealService:
 
     async def get_deal_by_chat_id(self, chat_id: int) -> Optional[Deal]:
         """Получить сделку по ID чата"""
-        from sqlalchemy.orm import selectinload
-        
         result = await self.db.execute(
-            select(Deal)
-            .options(
-                selectinload(Deal.status_logs).selectinload(DealStatusLog.changed_by),
-                selectinload(Deal.student),
-                selectinload(Deal.teacher)
-            )
-            .where(Deal.chat_id == chat_id)
+            self._deal_with_relations().where(Deal.chat_id == chat_id)
         )
         return result.scalar_one_or_none()
 
     async def update_deal_status(self, deal: Deal, status_update: DealStatusUpdate, user_id: str) -> Optional[Deal]:
-        """Обновить статус сделки"""
+        """
+        Обновить статус сделки.
+
+        Переход выполняется одним условным UPDATE по (id, status, version) вместе
+        со вставкой записи в лог статусов. Если сделку успели изменить, UPDATE
+        не затронет ни одной строки и будет выброшено DealConflictError.
+        """
         old_status = deal.status
         new_status = status_update.status
 
         if not self._is_valid_status_transition(old_status, new_status):
             return None
 
-        deal.status = new_status
-        deal.updated_at = datetime.utcnow()
+        expected_version = status_update.version if status_update.version is not None else deal.version
+        status_type = Deal.__table__.c.status.type
+
+        transition = (
+            update(Deal)
+            .where(
+                Deal.id == deal.id,
+                Deal.status == old_status,
+                Deal.version == expected_version
+            )
+            .values(status=new_status, version=Deal.version + 1, updated_at=func.now())
+            .returning(Deal.id, Deal.version, Deal.updated_at)
+            .cte("transition")
+        )
+        status_log = (
+            insert(DealStatusLog)
+            .from_select(
+                ["deal_id", "old_status", "new_status", "changed_by_id", "reason"],
+                select(
+                    transition.c.id,
+                    literal(old_status, status_type),
+                    literal(new_status, status_type),
+                    literal(user_id),
+                    literal(status_update.reason)
+                )
+            )
+            .returning(DealStatusLog.id)
+            .cte("status_log")
+        )
+        event_payload = self._status_event_payload(
+            deal, old_status, new_status, user_id, status_update.reason, expected_version + 1
+        )
+        event = (
+            insert(OutboxEvent)
+            .from_select(
+                ["aggregate_type", "aggregate_id", "event_type", "payload"],
+                select(
+                    literal("deal"),
+                    literal(str(deal.id)),
+                    literal(DEAL_STATUS_CHANGED),
+                    literal(event_payload, JSON)
+                ).select_from(transition)
+            )
+            .returning(OutboxEvent.id)
+            .cte("event")
+        )
+
+        result = await self.db.execute(
+            select(transition.c.version, status_log.c.id, event.c.id)
+            .select_from(transition)
+            .join(status_log, true())
+            .join(event, true())
+        )
+        if result.first() is None:
+            await self.db.rollback()
+            raise DealConflictError("Deal was modified concurrently")
 
-        await self._create_status_log(deal, old_status, new_status, user_id, status_update.reason)
-        
         await self.db.commit()
-        await self.db.refresh(deal)
-        
-        return deal
+        outbox_relay.notify()
+
+        return await self._reload(deal)
 
     async def propose_deal_terms(self, deal: Deal, proposal: DealProposal, user_id: str) -> Optional[Deal]:
         """Предложить условия сделки"""
@@ -87,19 +152,83 @@ class DealService:
 
         deal.proposed_skill = proposal.skill
         deal.proposed_time = proposal.time
+        deal.scheduled_at = parse_proposed_time(proposal.time)
         deal.proposed_place = proposal.place
 
+        next_version = deal.version + 1
+        self.db.add(outbox_event("deal", deal.id, DEAL_TERMS_PROPOSED, {
+            "deal_id": deal.id,
+            "chat_id": deal.chat_id,
+            "student_id": deal.student_id,
+            "teacher_id": deal.teacher_id,
+            "proposed_by_id": user_id,
+            "skill": proposal.skill,
+            "time": proposal.time,
+            "place": proposal.place,
+            "version": next_version
+        }))
+
         if deal.status == DealStatus.NEW:
             old_status = deal.status
             deal.status = DealStatus.DISCUSSION
-            await self._create_status_log(deal, old_status, DealStatus.DISCUSSION, user_id, "Начало обсуждения условий")
+            reason = "Начало обсуждения условий"
+            await self._create_status_log(deal, old_status, DealStatus.DISCUSSION, user_id, reason)
+            self.db.add(outbox_event("deal", deal.id, DEAL_STATUS_CHANGED, self._status_event_payload(
+                deal, old_status, DealStatus.DISCUSSION, user_id, reason, next_version
+            )))
         
         deal.updated_at = datetime.utcnow()
-        await self.db.commit()
+        try:
+            await self.db.commit()
+        except StaleDataError:
+            await self.db.rollback()
+            raise DealConflictError("Deal was modified concurrently")
+        outbox_relay.notify()
         await self.db.refresh(deal)
         
         return deal
 
+    def _deal_with_relations(self):
+        """Запрос сделки со всеми связями, нужными для ответа API"""
+        return select(Deal).options(
+            selectinload(Deal.status_logs).selectinload(DealStatusLog.changed_by),
+            selectinload(Deal.student),
+            selectinload(Deal.teacher)
+        )
+
+    async def _reload(self, deal: Deal) -> Deal:
+        """Перечитать сделку после изменения в обход ORM"""
+        result = await self.db.execute(
+            self._deal_with_relations()
+            .where(Deal.id == deal.id)
+            .execution_options(populate_existing=True)
+        )
+        return result.scalar_one()
+
+    def _status_event_payload(
+        self,
+        deal: Deal,
+        old_status: Optional[DealStatus],
+        new_status: DealStatus,
+        user_id: str,
+        reason: Optional[str],
+        version: int
+    ) -> dict:
+        """Данные события смены статуса для outbox"""
+        return {
+            "deal_id": deal.id,
+            "chat_id": deal.chat_id,
+            "student_id": deal.student_id,
+            "teacher_id": deal.teacher_id,
+            "old_status": old_status.value if old_status else None,
+            "new_status": new_status.value,
+            "changed_by_id": user_id,
+            "reason": reason,
+            "version": version,
+            "scheduled_at": deal.scheduled_at.isoformat() if deal.scheduled_at else None,
+            "changed_at": datetime.utcnow().isoformat() + "Z"
+        }
+
     async def _create_status_log(self, deal: Deal, old_status: Optional[DealStatus], new_status: DealStatus, user_id: str, reason: Optional[str] = None):
         """Создать запись в логе статусов"""
         status_log = DealStatusLog(
@@ -123,61 +252,133 @@ class DealService:
         
         return new_status in valid_transitions.get(old_status, [])
 
-    async def get_user_deals(self, user_id: str) -> List[Deal]:
-        """Получить все сделки пользователя"""
-        from sqlalchemy.orm import selectinload
-        
-        result = await self.db.execute(
-            select(Deal)
-            .options(
-                selectinload(Deal.status_logs).selectinload(DealStatusLog.changed_by),
-                selectinload(Deal.student),
-                selectinload(Deal.teacher),
-                selectinload(Deal.chat)
-            )
-            .where(
-                and_(
-                    Deal.status != DealStatus.CANCELED,
-                    (Deal.student_id == user_id) | (Deal.teacher_id == user_id)
+    async def get_user_deal_summaries(
+        self,
+        user_id: str,
+        limit: int = 20,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        Получить страницу сделок пользователя в кратком виде.
+
+        Один запрос: по каждой роли (ученик/преподаватель) берётся не больше
+        limit + 1 строк по индексу (роль_id, updated_at, id), ветки склеиваются
+        через UNION ALL и дополняются карточкой собеседника.
+        Возвращает (сводки, курсор следующей страницы).
+        """
+        after = _decode_deal_cursor(cursor) if cursor else None
+
+        def side(own_column, counterparty_column, role: str):
+            query = (
+                select(
+                    Deal.id,
+                    Deal.chat_id,
+                    Deal.status,
+                    Deal.version,
+                    Deal.proposed_skill,
+                    Deal.updated_at,
+                    counterparty_column.label("counterparty_id"),
+                    literal(role).label("role")
                 )
+                .where(own_column == user_id, Deal.status != DealStatus.CANCELED)
+            )
+            if after:
+                query = query.where(tuple_(Deal.updated_at, Deal.id) < tuple_(*after))
+            return select(
+                query.order_by(Deal.updated_at.desc(), Deal.id.desc()).limit(limit + 1).subquery()
+            )
+
+        deals = union_all(
+            side(Deal.student_id, Deal.teacher_id, "student"),
+            side(Deal.teacher_id, Deal.student_id, "teacher")
+        ).subquery("my_deals")
+
+        result = await self.db.execute(
+            select(
+                deals,
+                UserProfile.first_name,
+                UserProfile.last_name,
+                UserProfile.avatar_url
             )
-            .order_by(Deal.updated_at.desc())
+            .outerjoin(UserProfile, UserProfile.user_id == deals.c.counterparty_id)
+            .order_by(deals.c.updated_at.desc(), deals.c.id.desc())
+            .limit(limit + 1)
         )
-        return result.scalars().all()
+        rows = result.all()
 
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _encode_deal_cursor(rows[-1].updated_at, rows[-1].id)
 
-async def complete_deal(self, deal: Deal, user_id: str) -> Optional[Deal]:
-    """Завершение сделки с обновлением статистики."""
-    from app.services.gamification import GamificationService
-    
-    old_status = deal.status
-    new_status = DealStatus.COMPLETED
-    
-    if not self._is_valid_status_transition(old_status, new_status):
+        summaries = [
+            {
+                "id": row.id,
+                "chat_id": row.chat_id,
+                "status": row.status,
+                "role": row.role,
+                "proposed_skill": row.proposed_skill,
+                "version": row.version,
+                "updated_at": row.updated_at,
+                "counterparty": {
+                    "id": row.counterparty_id,
+                    "first_name": row.first_name or "",
+                    "last_name": row.last_name or "",
+                    "avatar_url": row.avatar_url
+                }
+            } for row in rows
+        ]
+        return summaries, next_cursor
+
+
+def _encode_deal_cursor(updated_at: datetime, deal_id: int) -> str:
+    """Курсор пагинации: позиция последней выданной сделки"""
+    raw = f"{updated_at.isoformat()}|{deal_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_deal_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        updated_at, deal_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(updated_at), int(deal_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+PROPOSED_TIME_FORMATS = (
+    "%d.%m.%Y %H:%M",
+    "%d.%m.%Y, %H:%M",
+    "%d.%m.%y %H:%M",
+    "%Y-%m-%d %H:%M",
+)
+
+
+def parse_proposed_time(value: Optional[str]) -> Optional[datetime]:
+    """
+    Время занятия из свободного текста proposed_time.
+
+    Понимает ISO 8601 и "ДД.ММ.ГГГГ ЧЧ:ММ"; время без часового пояса
+    считается в settings.DEAL_TIMEZONE. Если разобрать не удалось,
+    возвращает None — сделка просто остаётся без напоминаний.
+    """
+    if not value:
         return None
-    
-    deal.status = new_status
-    deal.updated_at = datetime.utcnow()
-
-    await self._create_status_log(deal, old_status, new_status, user_id, "Сделка завершена")
-    
-    gamification_service = GamificationService(self.db)
- 
-    chat_result = await self.db.execute(
-        select(Chat).where(Chat.id == deal.chat_id)
-    )
-    chat = chat_result.scalar_one_or_none()
-    
-    if chat and chat.ad:
-    
-        await gamification_service.update_stats_after_exchange(
-            deal.student_id, chat.ad.category
-        )
-        await gamification_service.update_stats_after_exchange(
-            deal.teacher_id, chat.ad.category
-        )
-    
-    await self.db.commit()
-    await self.db.refresh(deal)
-    
-    return deal
\ No newline at end of file
+    text = value.strip()
+
+    parsed = None
+    try:
+        parsed = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        for fmt in PROPOSED_TIME_FORMATS:
+            try:
+                parsed = datetime.strptime(text, fmt)
+                break
+            except ValueError:
+                continue
+    if parsed is None:
+        return None
+
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=ZoneInfo(settings.DEAL_TIMEZONE))
+    return parsed.astimezone(timezone.utc)
@@ -0,0 +1,125 @@
+"""
+События сделок, публикуемые через outbox, и их потребители.
+
+Потребители вызываются релеем (app.services.outbox) уже после коммита,
+поэтому REST-запрос не ждёт ни WebSocket, ни Telegram. Событие может прийти
+повторно, так что все сообщения несут event_id для дедупликации на клиенте.
+"""
+import logging
+
+from app.models.outbox import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+DEAL_STATUS_CHANGED = "deal.status_changed"
+DEAL_TERMS_PROPOSED = "deal.terms_proposed"
+
+STATUS_TITLES = {
+    "new": "Новая сделка",
+    "discussion": "Обсуждение условий",
+    "confirmed": "Сделка подтверждена",
+    "completed": "Сделка завершена",
+    "canceled": "Сделка отменена",
+}
+
+
+def _counterparty_id(payload: dict, actor_id: str) -> str:
+    return payload["teacher_id"] if actor_id == payload["student_id"] else payload["student_id"]
+
+
+async def broadcast_status_change(event: OutboxEvent):
+    """WebSocket: обновление сделки и смена статуса в чате"""
+    from app.websocket.manager import manager
+
+    payload = event.payload
+    await manager.send_deal_update(payload["chat_id"], {
+        "id": payload["deal_id"],
+        "chat_id": payload["chat_id"],
+        "status": payload["new_status"],
+        "student_id": payload["student_id"],
+        "teacher_id": payload["teacher_id"],
+        "version": payload["version"],
+        "updated_at": payload["changed_at"]
+    }, event_id=event.id)
+    await manager.send_deal_status_change(
+        chat_id=payload["chat_id"],
+        old_status=payload["old_status"],
+        new_status=payload["new_status"],
+        user_id=payload["changed_by_id"],
+        reason=payload["reason"],
+        event_id=event.id
+    )
+
+
+async def broadcast_terms_proposed(event: OutboxEvent):
+    """WebSocket: новые условия сделки в чате"""
+    from app.websocket.manager import manager
+
+    payload = event.payload
+    await manager.send_deal_proposal(payload["chat_id"], {
+        "deal_id": payload["deal_id"],
+        "skill": payload["skill"],
+        "time": payload["time"],
+        "place": payload["place"],
+        "version": payload["version"]
+    }, payload["proposed_by_id"], event_id=event.id)
+
+
+async def notify_status_change(event: OutboxEvent):
+    """Telegram: уведомить второго участника о смене статуса"""
+    from app.services.telegram_service import telegram_service
+
+    payload = event.payload
+    title = STATUS_TITLES.get(payload["new_status"], "Сделка обновлена")
+    details = f"Статус: {payload['old_status'] or '—'} → {payload['new_status']}"
+    if payload.get("reason"):
+        details += f"\nПричина: {payload['reason']}"
+    await telegram_service.send_deal_notification(
+        _counterparty_id(payload, payload["changed_by_id"]), title, details
+    )
+
+
+async def notify_terms_proposed(event: OutboxEvent):
+    """Telegram: уведомить второго участника о предложенных условиях"""
+    from app.services.telegram_service import telegram_service
+
+    payload = event.payload
+    details = (
+        f"Навык: {payload['skill']}\n"
+        f"Время: {payload['time']}\n"
+        f"Место: {payload['place']}"
+    )
+    await telegram_service.send_deal_notification(
+        _counterparty_id(payload, payload["proposed_by_id"]), "Предложены условия сделки", details
+    )
+
+
+async def apply_gamification(event: OutboxEvent):
+    """Геймификация: статистика и значки участникам завершённой сделки"""
+    if event.payload["new_status"] != "completed":
+        return
+
+    from app.database import AsyncSessionLocal
+    from app.services.gamification import GamificationService
+
+    async with AsyncSessionLocal() as db:
+        # Идемпотентно по deal_id: повтор события ничего не начислит
+        await GamificationService(db).apply_deal_completion(event.payload["deal_id"])
+
+
+async def sync_reminders(event: OutboxEvent):
+    """Напоминания о занятии: поставить, перенести или снять по текущему состоянию сделки"""
+    from app.services.reminders import deal_reminders
+
+    await deal_reminders.sync_deal(event.payload["deal_id"])
+
+
+def register_deal_consumers(relay):
+    """Подписать потребителей событий сделок на релей outbox"""
+    relay.register(DEAL_STATUS_CHANGED, "websocket", broadcast_status_change)
+    relay.register(DEAL_STATUS_CHANGED, "telegram", notify_status_change)
+    relay.register(DEAL_STATUS_CHANGED, "gamification", apply_gamification)
+    relay.register(DEAL_STATUS_CHANGED, "reminders", sync_reminders)
+    relay.register(DEAL_TERMS_PROPOSED, "websocket", broadcast_terms_proposed)
+    relay.register(DEAL_TERMS_PROPOSED, "telegram", notify_terms_proposed)
+    relay.register(DEAL_TERMS_PROPOSED, "reminders", sync_reminders)
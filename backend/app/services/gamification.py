@@ -1,14 +1,53 @@
 # app/services/gamification.py
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_
-from typing import List, Optional, Dict
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import select, delete, func, and_, or_, tuple_, case, cast, Numeric, Float
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from typing import List, Optional, Dict, Tuple
+from datetime import datetime, timezone
+import base64
 import math
 
-from app.models.gamification import Review, UserStats, BadgeType
-from app.models.user import User, UserProfile, Badge
+from app.models.gamification import (
+    Review, UserStats, GamificationProcessedDeal, RATING_PRIOR_MEAN, RATING_PRIOR_WEIGHT, REPUTATION_DECAY_RATE
+)
+from app.models.user import User, UserProfile, user_badges
 from app.models.deal import Deal, DealStatus
+from app.models.chat import Chat
 from app.models.ad import Ad, AdCategory
 from app.schemas.gamification import ReviewCreate
+from app.services.leaderboard import LeaderboardService
+from app.services.profile_cache import profile_cache
+from app.services.badge_rules import (
+    RULE_BADGE_TYPES, SNAPSHOT_COLUMNS, StatsSnapshot, badge_catalog, evaluate_badges
+)
+
+# Колонки гистограммы оценок: RATING_FIELDS[k - 1] — число оценок k
+RATING_FIELDS = tuple(f"rating_{stars}" for stars in range(1, 6))
+
+# Счётчики user_stats, которые события только увеличивают
+STATS_COUNTERS = (
+    "reputation",
+    "exchanges_completed",
+    "total_ratings",
+    "experience",
+    *RATING_FIELDS,
+    *[f"{category.value}_exchanges" for category in AdCategory],
+)
+
+
+def bayesian_rating(rating_sum: float, total_ratings: int) -> float:
+    """Средняя оценка, сглаженная к RATING_PRIOR_MEAN с весом RATING_PRIOR_WEIGHT отзывов"""
+    return (RATING_PRIOR_MEAN * RATING_PRIOR_WEIGHT + rating_sum) / (RATING_PRIOR_WEIGHT + total_ratings)
+
+
+def current_decayed_reputation(score: float, at: Optional[datetime], now: Optional[datetime] = None) -> float:
+    """Затухающая репутация на момент now по сохранённой паре (значение, момент)"""
+    if not score or at is None:
+        return 0.0
+    elapsed = max(((now or datetime.now(timezone.utc)) - at).total_seconds(), 0.0)
+    return score * math.exp(-REPUTATION_DECAY_RATE * elapsed)
+
 
 class GamificationService:
     """Сервис для работы с геймификацией."""
@@ -17,6 +56,8 @@ class GamificationService:
         self.db = db
         self.EXP_PER_LEVEL = 100  
         self.REPUTATION_PER_EXCHANGE = 10  
+        self.EXP_PER_EXCHANGE = 10
+        self.REPUTATION_PER_RATING_POINT = 2
         self.LEVEL_CAPS = { 
             "exchanges": [5, 10, 25, 50, 100],
             "rating": [4.0, 4.5, 4.8, 4.9, 5.0]
@@ -38,6 +79,12 @@ class GamificationService:
         if not deal:
             raise ValueError("Deal not found or not completed")
 
+        if (
+            review_data.target_user_id == author_id
+            or review_data.target_user_id not in (deal.student_id, deal.teacher_id)
+        ):
+            raise ValueError("Review target must be the other deal participant")
+
         existing_review = await self.db.execute(
             select(Review).where(
                 and_(
@@ -54,139 +101,353 @@ class GamificationService:
             author_id=author_id
         )
         self.db.add(review)
+        try:
+            # Параллельный запрос мог вставить отзыв после проверки выше:
+            # уникальный индекс (deal_id, author_id) сработает здесь
+            await self.db.flush()
+        except IntegrityError:
+            await self.db.rollback()
+            raise ValueError("Review already exists for this deal")
 
-        await self._update_user_stats_after_review(review_data.target_user_id, review_data.rating)
+        stats = await self._update_user_stats_after_review(review_data.target_user_id, review_data.rating)
 
-        await self._check_and_award_badges(review_data.target_user_id)
+        await self._award_badges([stats])
         
         await self.db.commit()
         await self.db.refresh(review)
+        await LeaderboardService(self.db).update(
+            [stats], gained={stats.user_id: review_data.rating * self.REPUTATION_PER_RATING_POINT}
+        )
+        await profile_cache.invalidate(stats.user_id)
         
         return review
 
-    async def _update_user_stats_after_review(self, user_id: str, rating: int):
+    async def _update_user_stats_after_review(self, user_id: str, rating: int) -> UserStats:
         """Обновление статистики пользователя после отзыва."""
+        stats_by_user = await self._apply_stats_deltas({
+            user_id: {
+                "reputation": rating * self.REPUTATION_PER_RATING_POINT,
+                "total_ratings": 1,
+                RATING_FIELDS[rating - 1]: 1,
+            }
+        })
+        return stats_by_user[user_id]
 
-        stats_result = await self.db.execute(
-            select(UserStats).where(UserStats.user_id == user_id)
+    async def get_user_reviews(
+        self,
+        user_id: str,
+        limit: int = 20,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Страница отзывов о пользователе, от новых к старым.
+
+        Keyset-пагинация по индексу (target_user_id, created_at, id): любая
+        страница читается одним запросом вместе с именем и аватаром автора.
+        Возвращает (отзывы, курсор следующей страницы).
+        """
+        after = _decode_review_cursor(cursor) if cursor else None
+
+        query = self._reviews_query().where(Review.target_user_id == user_id)
+        if after:
+            query = query.where(tuple_(Review.created_at, Review.id) < tuple_(*after))
+        result = await self.db.execute(
+            query.order_by(Review.created_at.desc(), Review.id.desc()).limit(limit + 1)
         )
-        stats = stats_result.scalar_one_or_none()
-        
-        if not stats:
-            stats = UserStats(user_id=user_id)
-            self.db.add(stats)
+        rows = result.all()
 
-        total_ratings = stats.total_ratings
-        current_avg = stats.average_rating
-        
-        new_total = total_ratings + 1
-        new_avg = (current_avg * total_ratings + rating) / new_total
-        
-        stats.total_ratings = new_total
-        stats.average_rating = round(new_avg, 2)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _encode_review_cursor(rows[-1].created_at, rows[-1].id)
 
-        stats.reputation += rating * 2
+        return [self._review_out(row) for row in rows], next_cursor
 
-    async def update_stats_after_exchange(self, user_id: str, category: AdCategory):
-        """Обновление статистики после завершенного обмена."""
-        stats_result = await self.db.execute(
-            select(UserStats).where(UserStats.user_id == user_id)
+    async def get_review(self, review_id: int) -> Optional[Dict]:
+        """Отзыв с именем и аватаром автора"""
+        result = await self.db.execute(self._reviews_query().where(Review.id == review_id))
+        row = result.one_or_none()
+        return self._review_out(row) if row else None
+
+    async def get_rating_summary(self, user_id: str) -> Dict:
+        """Распределение оценок пользователя из гистограммы в user_stats (без чтения отзывов)"""
+        result = await self.db.execute(
+            select(
+                UserStats.total_ratings,
+                UserStats.average_rating,
+                UserStats.bayesian_rating,
+                *[getattr(UserStats, field) for field in RATING_FIELDS]
+            ).where(UserStats.user_id == user_id)
         )
-        stats = stats_result.scalar_one_or_none()
-        
-        if not stats:
-            stats = UserStats(user_id=user_id)
-            self.db.add(stats)
+        row = result.one_or_none()
 
-        stats.exchanges_completed += 1
-        stats.reputation += self.REPUTATION_PER_EXCHANGE
+        return {
+            "user_id": user_id,
+            "total_ratings": row.total_ratings if row else 0,
+            "average_rating": row.average_rating if row else 0.0,
+            "bayesian_rating": row.bayesian_rating if row else RATING_PRIOR_MEAN,
+            "histogram": {
+                stars: (getattr(row, field) if row else 0) for stars, field in enumerate(RATING_FIELDS, 1)
+            }
+        }
 
-        category_field = f"{category.value}_exchanges"
-        if hasattr(stats, category_field):
-            current_value = getattr(stats, category_field)
-            setattr(stats, category_field, current_value + 1)
+    @staticmethod
+    def _reviews_query():
+        return (
+            select(
+                Review.id,
+                Review.author_id,
+                Review.target_user_id,
+                Review.deal_id,
+                Review.rating,
+                Review.text,
+                Review.created_at,
+                UserProfile.first_name,
+                UserProfile.last_name,
+                UserProfile.avatar_url
+            )
+            .outerjoin(UserProfile, UserProfile.user_id == Review.author_id)
+        )
 
-        await self._update_level_and_experience(stats)
+    @staticmethod
+    def _review_out(row) -> Dict:
+        return {
+            "id": row.id,
+            "author_id": row.author_id,
+            "target_user_id": row.target_user_id,
+            "deal_id": row.deal_id,
+            "rating": row.rating,
+            "text": row.text,
+            "created_at": row.created_at,
+            "author_name": f"{row.first_name or ''} {row.last_name or ''}".strip(),
+            "author_avatar": row.avatar_url
+        }
 
-        await self._check_and_award_badges(user_id)
-        
+    async def apply_deal_completion(self, deal_id: int) -> bool:
+        """
+        Начислить статистику и значки обоим участникам завершенной сделки.
+
+        Вызывается потребителем события deal.status_changed. Сделка сначала
+        помечается обработанной в gamification_processed_deals, поэтому
+        повторная доставка события ничего не начисляет. Всё выполняется
+        в одной транзакции. Возвращает False, если сделка уже обработана
+        или не завершена.
+        """
+        claimed = await self.db.execute(
+            pg_insert(GamificationProcessedDeal)
+            .values(deal_id=deal_id)
+            .on_conflict_do_nothing(index_elements=[GamificationProcessedDeal.deal_id])
+            .returning(GamificationProcessedDeal.deal_id)
+        )
+        if claimed.scalar_one_or_none() is None:
+            await self.db.rollback()
+            return False
+
+        deal_result = await self.db.execute(
+            select(Deal.student_id, Deal.teacher_id, Deal.status, Ad.category)
+            .join(Chat, Chat.id == Deal.chat_id)
+            .join(Ad, Ad.id == Chat.ad_id)
+            .where(Deal.id == deal_id)
+        )
+        deal = deal_result.one_or_none()
+        if not deal or deal.status != DealStatus.COMPLETED:
+            await self.db.rollback()
+            return False
+
+        deltas: Dict[str, Dict[str, int]] = {}
+        for user_id in (deal.student_id, deal.teacher_id):
+            delta = deltas.setdefault(user_id, {})
+            for field, value in self._exchange_delta(deal.category).items():
+                delta[field] = delta.get(field, 0) + value
+        stats_by_user = await self._apply_stats_deltas(deltas)
+
+        await self._award_badges(list(stats_by_user.values()))
         await self.db.commit()
+        await LeaderboardService(self.db).update(
+            stats_by_user.values(),
+            gained={user_id: delta["reputation"] for user_id, delta in deltas.items()},
+            category=deal.category
+        )
+        await profile_cache.invalidate(*stats_by_user)
+        return True
+
+    def _exchange_delta(self, category: AdCategory) -> Dict[str, int]:
+        """Приращения статистики за один завершенный обмен."""
+        return {
+            "reputation": self.REPUTATION_PER_EXCHANGE,
+            "exchanges_completed": 1,
+            "experience": self.EXP_PER_EXCHANGE,
+            f"{category.value}_exchanges": 1,
+        }
 
-    async def _update_level_and_experience(self, stats: UserStats):
-        """Обновление уровня и опыта пользователя."""
+    async def _apply_stats_deltas(self, deltas: Dict[str, Dict[str, int]]) -> Dict[str, UserStats]:
+        """
+        Применить приращения статистики одним INSERT ... ON CONFLICT DO UPDATE.
 
-        stats.experience += 10
+        deltas: user_id -> {счётчик: прирост}; отзывы передают total_ratings
+        и +1 в колонку гистограммы своей оценки. Сложение счётчиков, пересчёт
+        среднего и байесовского рейтинга по гистограмме и переход уровня
+        выполняются в SQL над текущей строкой, поэтому параллельные события
+        не теряют обновлений, а отсутствующая строка создаётся тем же запросом.
+        Переход уровня делается за один шаг: опыта за событие меньше EXP_PER_LEVEL.
 
-        required_exp = stats.level * self.EXP_PER_LEVEL
-        while stats.experience >= required_exp:
-            stats.experience -= required_exp
-            stats.level += 1
-            required_exp = stats.level * self.EXP_PER_LEVEL
+        Затухающая репутация приводится к текущему моменту в замкнутом виде
+        (значение * exp(-λ·прошедшее время)), к ней прибавляется прирост,
+        и момент отсчёта сдвигается на now(); остальные строки не трогаются.
+        """
+        now = func.now()
+        now_epoch = cast(func.extract("epoch", now), Float)
+        rows = []
+        # Строки вставляются в порядке user_id, чтобы параллельные запросы блокировали их одинаково
+        for user_id in sorted(deltas):
+            delta = deltas[user_id]
+            total_ratings = delta.get("total_ratings", 0)
+            rating_sum = sum(stars * delta.get(field, 0) for stars, field in enumerate(RATING_FIELDS, 1))
+            rows.append({
+                "user_id": user_id,
+                **{field: delta.get(field, 0) for field in STATS_COUNTERS},
+                "average_rating": round(rating_sum / total_ratings, 2) if total_ratings else 0.0,
+                "bayesian_rating": bayesian_rating(rating_sum, total_ratings),
+                "level": 1,
+                "decayed_reputation": float(delta.get("reputation", 0)),
+                "decayed_at": now,
+                "trending_score": (
+                    math.log(delta["reputation"]) + REPUTATION_DECAY_RATE * now_epoch
+                    if delta.get("reputation", 0) > 0 else None
+                ),
+            })
 
-    async def _check_and_award_badges(self, user_id: str):
-        """Проверка и выдача значков пользователю."""
-        stats_result = await self.db.execute(
-            select(UserStats).where(UserStats.user_id == user_id)
+        stmt = pg_insert(UserStats).values(rows)
+        current, new = UserStats.__table__.c, stmt.excluded
+
+        ratings = current.total_ratings + new.total_ratings
+        rating_sum = sum(
+            stars * (current[field] + new[field]) for stars, field in enumerate(RATING_FIELDS, 1)
         )
-        stats = stats_result.scalar_one_or_none()
-        
-        if not stats:
-            return
-        
-        user_result = await self.db.execute(
-            select(User).where(User.id == user_id)
+        average_rating = func.round(cast(rating_sum, Numeric) / ratings, 2)
+        experience = current.experience + new.experience
+        level_threshold = current.level * self.EXP_PER_LEVEL
+        # Показатель экспоненты ограничен: exp() в PostgreSQL ошибается на underflow
+        elapsed = func.greatest(cast(func.extract("epoch", now - current.decayed_at), Float), 0.0)
+        decayed = case(
+            (current.decayed_at.is_(None), 0.0),
+            else_=current.decayed_reputation * func.exp(-func.least(REPUTATION_DECAY_RATE * elapsed, 700.0))
+        ) + new.reputation
+
+        set_ = {field: current[field] + new[field] for field in STATS_COUNTERS if field != "experience"}
+        set_.update(
+            average_rating=case((ratings == 0, current.average_rating), else_=average_rating),
+            bayesian_rating=(
+                (RATING_PRIOR_MEAN * RATING_PRIOR_WEIGHT + cast(rating_sum, Float))
+                / (RATING_PRIOR_WEIGHT + ratings)
+            ),
+            level=case((experience >= level_threshold, current.level + 1), else_=current.level),
+            experience=case((experience >= level_threshold, experience - level_threshold), else_=experience),
+            decayed_reputation=decayed,
+            decayed_at=now,
+            trending_score=case((decayed > 0, func.ln(decayed) + REPUTATION_DECAY_RATE * now_epoch), else_=None),
+            updated_at=now,
         )
-        user = user_result.scalar_one_or_none()
-        
-        if not user:
-            return
-
-        current_badge_types = {badge.type for badge in user.badges}
-        new_badges = []
-
-        badges_to_check = {
-            BadgeType.FIRST_EXCHANGE: stats.exchanges_completed >= 1,
-            BadgeType.POPULAR: stats.exchanges_completed >= 10,
-            BadgeType.MENTOR: stats.exchanges_completed >= 25,
-            BadgeType.EXPERT: stats.exchanges_completed >= 50,
-            BadgeType.TOP_RATED: stats.average_rating >= 4.8 and stats.total_ratings >= 5,
-        }
-        
-        for badge_type, condition in badges_to_check.items():
-            if condition and badge_type not in current_badge_types:
 
-                badge_result = await self.db.execute(
-                    select(Badge).where(Badge.type == badge_type)
+        result = await self.db.execute(
+            stmt.on_conflict_do_update(index_elements=[UserStats.user_id], set_=set_).returning(UserStats),
+            execution_options={"populate_existing": True}
+        )
+        return {stats.user_id: stats for stats in result.scalars().all()}
+
+    async def _award_badges(self, stats_list: List[UserStats]) -> List[Tuple[str, int]]:
+        """
+        Выдать заслуженные значки сразу нескольким пользователям.
+
+        Правила проверяются за один проход по снимкам статистики, id значков
+        берутся из кэша каталога, новые выдачи пишутся одной многострочной
+        вставкой (уже выданные отсекает ON CONFLICT). Возвращает новые пары
+        (user_id, badge_id).
+        """
+        catalog = await badge_catalog.get(self.db)
+        rows = [
+            {"user_id": stats.user_id, "badge_id": catalog[badge_type]}
+            for stats in stats_list
+            for badge_type in evaluate_badges(StatsSnapshot.from_stats(stats))
+            if badge_type in catalog
+        ]
+        if not rows:
+            return []
+
+        result = await self.db.execute(
+            pg_insert(user_badges)
+            .values(rows)
+            .on_conflict_do_nothing()
+            .returning(user_badges.c.user_id, user_badges.c.badge_id)
+        )
+        return [tuple(row) for row in result.all()]
+
+    async def reevaluate_badges(self, chunk_size: int = 1000, revoke: bool = False) -> Dict[str, int]:
+        """
+        Перепроверить значки всех пользователей (после изменения правил).
+
+        Статистика читается пачками по user_id, каждая пачка — одна вставка
+        и отдельный коммит. С revoke=True заодно отзываются значки под
+        управлением правил, условия которых больше не выполняются.
+        """
+        catalog = await badge_catalog.get(self.db)
+        rule_badge_ids = [catalog[badge_type] for badge_type in RULE_BADGE_TYPES if badge_type in catalog]
+        awarded = revoked = processed = 0
+        last_id = ""
+
+        while True:
+            result = await self.db.execute(
+                select(*SNAPSHOT_COLUMNS)
+                .where(UserStats.user_id > last_id)
+                .order_by(UserStats.user_id)
+                .limit(chunk_size)
+            )
+            chunk = result.all()
+            if not chunk:
+                break
+
+            earned = {
+                (row.user_id, catalog[badge_type])
+                for row in chunk
+                for badge_type in evaluate_badges(StatsSnapshot.from_stats(row))
+                if badge_type in catalog
+            }
+            changed_users = set()
+            if earned:
+                insert_result = await self.db.execute(
+                    pg_insert(user_badges)
+                    .values([{"user_id": user_id, "badge_id": badge_id} for user_id, badge_id in earned])
+                    .on_conflict_do_nothing()
+                    .returning(user_badges.c.user_id)
                 )
-                badge = badge_result.scalar_one_or_none()
-                
-                if badge:
-                    user.badges.append(badge)
-                    new_badges.append(badge)
-        
-        category_fields = {
-            'programming': BadgeType.CATEGORY_EXPERT,
-            'design': BadgeType.CATEGORY_EXPERT,
-            'languages': BadgeType.CATEGORY_EXPERT,
-            'math': BadgeType.CATEGORY_EXPERT,
-            'science': BadgeType.CATEGORY_EXPERT,
-            'business': BadgeType.CATEGORY_EXPERT,
-            'music': BadgeType.CATEGORY_EXPERT,
-            'sports': BadgeType.CATEGORY_EXPERT,
-            'other': BadgeType.CATEGORY_EXPERT,
-        }
-        
-        for category_field, badge_type in category_fields.items():
-            exchanges = getattr(stats, f"{category_field}_exchanges", 0)
-            if exchanges >= 10 and badge_type not in current_badge_types:
-                badge_result = await self.db.execute(
-                    select(Badge).where(Badge.type == badge_type)
+                new_owners = insert_result.scalars().all()
+                awarded += len(new_owners)
+                changed_users.update(new_owners)
+
+            if revoke and rule_badge_ids:
+                owned_result = await self.db.execute(
+                    select(user_badges.c.user_id, user_badges.c.badge_id)
+                    .where(
+                        user_badges.c.user_id.in_([row.user_id for row in chunk]),
+                        user_badges.c.badge_id.in_(rule_badge_ids)
+                    )
                 )
-                badge = badge_result.scalar_one_or_none()
-                
-                if badge:
-                    user.badges.append(badge)
-                    new_badges.append(badge)
+                lost = [pair for pair in map(tuple, owned_result.all()) if pair not in earned]
+                if lost:
+                    await self.db.execute(
+                        delete(user_badges).where(
+                            tuple_(user_badges.c.user_id, user_badges.c.badge_id).in_(lost)
+                        )
+                    )
+                    revoked += len(lost)
+                    changed_users.update(user_id for user_id, _ in lost)
+
+            await self.db.commit()
+            await profile_cache.invalidate(*changed_users)
+            processed += len(chunk)
+            last_id = chunk[-1].user_id
+
+        return {"processed": processed, "awarded": awarded, "revoked": revoked}
 
     async def get_user_profile_with_gamification(self, user_id: str) -> Dict:
         """Получение профиля пользователя с геймификацией."""
@@ -205,15 +466,9 @@ class GamificationService:
         
         if not user or not user.profile:
             raise ValueError("User or profile not found")
-      
-        reviews_result = await self.db.execute(
-            select(Review)
-            .options(selectinload(Review.author).selectinload(User.profile))
-            .where(Review.target_user_id == user_id)
-            .order_by(Review.created_at.desc())
-            .limit(10)
-        )
-        reviews = reviews_result.scalars().all()
+
+        reviews, _ = await self.get_user_reviews(user_id, limit=10)
+        stats = user.stats
 
         profile_data = {
             "id": user.id,
@@ -225,23 +480,21 @@ class GamificationService:
             "year": user.profile.year,
             "bio": user.profile.bio,
             "stats": {
-                "reputation": user.stats.reputation if user.stats else 0,
-                "exchanges_completed": user.stats.exchanges_completed if user.stats else 0,
-                "total_ratings": user.stats.total_ratings if user.stats else 0,
-                "average_rating": user.stats.average_rating if user.stats else 0.0,
-                "level": user.stats.level if user.stats else 1,
-                "experience": user.stats.experience if user.stats else 0,
-                "next_level_exp": (user.stats.level * self.EXP_PER_LEVEL) if user.stats else self.EXP_PER_LEVEL,
-                "programming_exchanges": user.stats.programming_exchanges if user.stats else 0,
-                "design_exchanges": user.stats.design_exchanges if user.stats else 0,
-                "languages_exchanges": user.stats.languages_exchanges if user.stats else 0,
-                "math_exchanges": user.stats.math_exchanges if user.stats else 0,
-                "science_exchanges": user.stats.science_exchanges if user.stats else 0,
-                "business_exchanges": user.stats.business_exchanges if user.stats else 0,
-                "music_exchanges": user.stats.music_exchanges if user.stats else 0,
-                "sports_exchanges": user.stats.sports_exchanges if user.stats else 0,
-                "other_exchanges": user.stats.other_exchanges if user.stats else 0,
-            } if user.stats else {},
+                **{
+                    field: getattr(stats, field) if stats else 0
+                    for field in STATS_COUNTERS if field not in RATING_FIELDS
+                },
+                "average_rating": stats.average_rating if stats else 0.0,
+                "level": stats.level if stats else 1,
+                "next_level_exp": (stats.level if stats else 1) * self.EXP_PER_LEVEL,
+                "bayesian_rating": stats.bayesian_rating if stats else RATING_PRIOR_MEAN,
+                "trending_reputation": round(
+                    current_decayed_reputation(stats.decayed_reputation, stats.decayed_at), 2
+                ) if stats else 0.0,
+                "rating_histogram": {
+                    stars: getattr(stats, field) if stats else 0 for stars, field in enumerate(RATING_FIELDS, 1)
+                },
+            },
             "badges": [{
                 "id": badge.id,
                 "name": badge.name,
@@ -249,46 +502,14 @@ class GamificationService:
                 "description": badge.description,
                 "icon": badge.icon
             } for badge in user.badges],
-            "reviews": [{
-                "id": review.id,
-                "author_id": review.author_id,
-                "target_user_id": review.target_user_id,
-                "deal_id": review.deal_id,
-                "rating": review.rating,
-                "text": review.text,
-                "created_at": review.created_at,
-                "author_name": f"{review.author.profile.first_name} {review.author.profile.last_name}",
-                "author_avatar": review.author.profile.avatar_url
-            } for review in reviews]
+            "reviews": reviews
         }
         
         return profile_data
 
     async def get_leaderboard(self, limit: int = 50) -> List[Dict]:
         """Получение таблицы лидеров."""
-        result = await self.db.execute(
-            select(User, UserProfile, UserStats)
-            .join(UserProfile, User.id == UserProfile.user_id)
-            .join(UserStats, User.id == UserStats.user_id)
-            .where(User.is_active == True)
-            .order_by(UserStats.reputation.desc())
-            .limit(limit)
-        )
-        
-        leaderboard = []
-        for position, (user, profile, stats) in enumerate(result.all(), 1):
-            leaderboard.append({
-                "id": user.id,
-                "first_name": profile.first_name,
-                "last_name": profile.last_name,
-                "avatar_url": profile.avatar_url,
-                "university": profile.university,
-                "reputation": stats.reputation,
-                "level": stats.level,
-                "position": position
-            })
-        
-        return leaderboard
+        return await LeaderboardService(self.db).get_top(limit)
 
     async def get_level_progress(self, user_id: str) -> Dict:
         """Получение прогресса уровня пользователя."""
@@ -313,4 +534,19 @@ class GamificationService:
             "current_exp": stats.experience,
             "next_level_exp": next_level_exp,
             "progress_percentage": round(progress_percentage, 2)
-        }
\ No newline at end of file
+        }
+
+
+def _encode_review_cursor(created_at: datetime, review_id: int) -> str:
+    """Курсор пагинации: позиция последнего выданного отзыва"""
+    raw = f"{created_at.isoformat()}|{review_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_review_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, review_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(review_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
@@ -0,0 +1,424 @@
+import enum
+import json
+import logging
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+from uuid import uuid4
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_redis
+from app.models.ad import AdCategory
+from app.models.user import User, UserProfile
+from app.models.gamification import UserStats, REPUTATION_DECAY_RATE
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_KEY = "leaderboard:reputation"
+DAY_KEY = "leaderboard:reputation:day:{}"
+TRENDING_KEY = "leaderboard:trending"
+WINDOW_KEY = "leaderboard:reputation:{}:{}"
+UNIVERSITY_KEY = "leaderboard:university:{}"
+CATEGORY_KEY = "leaderboard:category:{}"
+USER_UNIVERSITY_KEY = "leaderboard:user_university"
+CARD_KEY = "leaderboard:card:{}"
+
+
+class LeaderboardScope(str, enum.Enum):
+    """Разрезы таблицы лидеров."""
+    ALL = "all"
+    WEEK = "week"
+    MONTH = "month"
+    TRENDING = "trending"
+    UNIVERSITY = "university"
+    CATEGORY = "category"
+
+
+WINDOW_DAYS = {
+    LeaderboardScope.WEEK: 7,
+    LeaderboardScope.MONTH: 30,
+}
+
+
+class LeaderboardService:
+    """
+    Таблицы лидеров в Redis sorted sets.
+
+    - all: общая репутация (score — репутация, член — id пользователя);
+    - week/month: репутация, набранная за скользящее окно. Прирост пишется
+      ZINCRBY в дневные корзины с TTL, окно собирается ZUNIONSTORE по
+      корзинам и кэшируется на WINDOW_CACHE_TTL; старые дни просто истекают;
+    - trending: затухающая репутация. Score — trending_score из user_stats
+      (логарифм значения плюс λ·момент отсчёта), поэтому порядок верен без
+      периодического пересчёта; в ответ отдаётся текущее значение репутации;
+    - university: общая репутация внутри университета из профиля;
+    - category: число завершённых обменов в категории (*_exchanges).
+
+    Ранг и срез топа в любом разрезе — O(log n). Карточки для отображения
+    кэшируются отдельными ключами с TTL и дочитываются из БД одним запросом
+    только для промахов.
+
+    Изменения вызываются после коммита и не должны ломать запрос: ошибки
+    Redis в update/remove/profile_updated логируются, а расхождение
+    исправляет rebuild (app.scripts.rebuild_leaderboard).
+    """
+
+    CARD_TTL = 10 * 60
+    WINDOW_CACHE_TTL = 60
+    DAY_BUCKET_TTL = (max(WINDOW_DAYS.values()) + 1) * 24 * 60 * 60
+    REBUILD_CHUNK = 1000
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_top(
+        self,
+        limit: int = 50,
+        scope: LeaderboardScope = LeaderboardScope.ALL,
+        university: Optional[str] = None,
+        category: Optional[AdCategory] = None
+    ) -> List[Dict]:
+        """Первые limit мест в выбранном разрезе"""
+        redis_client = await get_redis()
+        key = await self._scope_key(redis_client, scope, university, category)
+        entries = await redis_client.zrevrange(key, 0, limit - 1, withscores=True)
+        return await self._with_cards(self._display_scores(scope, entries), first_position=1)
+
+    async def get_around(
+        self,
+        user_id: str,
+        radius: int = 5,
+        scope: LeaderboardScope = LeaderboardScope.ALL,
+        university: Optional[str] = None,
+        category: Optional[AdCategory] = None
+    ) -> Dict:
+        """Место пользователя и radius соседей сверху и снизу"""
+        redis_client = await get_redis()
+        if scope == LeaderboardScope.UNIVERSITY and not university:
+            university = await redis_client.hget(USER_UNIVERSITY_KEY, user_id)
+        key = await self._scope_key(redis_client, scope, university, category)
+
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.zrevrank(key, user_id)
+        pipe.zcard(key)
+        rank, total = await pipe.execute()
+
+        if rank is None:
+            return {"position": None, "total": total, "entries": []}
+
+        start = max(rank - radius, 0)
+        entries = await redis_client.zrevrange(key, start, rank + radius, withscores=True)
+        return {
+            "position": rank + 1,
+            "total": total,
+            "entries": await self._with_cards(self._display_scores(scope, entries), first_position=start + 1)
+        }
+
+    async def update(
+        self,
+        stats_list: Iterable[UserStats],
+        gained: Optional[Dict[str, int]] = None,
+        category: Optional[AdCategory] = None
+    ):
+        """
+        Обновить таблицы после изменения статистики.
+
+        gained — прирост репутации по пользователям (идёт в дневную корзину),
+        category — категория завершённого обмена.
+        """
+        try:
+            stats_list = list(stats_list)
+            redis_client = await get_redis()
+            universities = await self._universities(redis_client, [stats.user_id for stats in stats_list])
+            day_key = DAY_KEY.format(self._today())
+
+            pipe = redis_client.pipeline(transaction=False)
+            for stats in stats_list:
+                pipe.zadd(LEADERBOARD_KEY, {stats.user_id: stats.reputation})
+                if stats.trending_score is not None:
+                    pipe.zadd(TRENDING_KEY, {stats.user_id: stats.trending_score})
+                if universities.get(stats.user_id):
+                    pipe.zadd(UNIVERSITY_KEY.format(universities[stats.user_id]), {stats.user_id: stats.reputation})
+                if category:
+                    exchanges = getattr(stats, f"{category.value}_exchanges", 0)
+                    pipe.zadd(CATEGORY_KEY.format(category.value), {stats.user_id: exchanges})
+                pipe.delete(CARD_KEY.format(stats.user_id))
+
+            for user_id, amount in (gained or {}).items():
+                if amount:
+                    pipe.zincrby(day_key, amount, user_id)
+            if gained:
+                pipe.expire(day_key, self.DAY_BUCKET_TTL)
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"Leaderboard update failed: {e}")
+
+    async def remove(self, user_id: str):
+        """Убрать пользователя из всех таблиц (блокировка)"""
+        try:
+            redis_client = await get_redis()
+            university = await redis_client.hget(USER_UNIVERSITY_KEY, user_id)
+
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.zrem(LEADERBOARD_KEY, user_id)
+            pipe.zrem(TRENDING_KEY, user_id)
+            if university:
+                pipe.zrem(UNIVERSITY_KEY.format(university), user_id)
+            for category in AdCategory:
+                pipe.zrem(CATEGORY_KEY.format(category.value), user_id)
+            for day in self._days(max(WINDOW_DAYS.values())):
+                pipe.zrem(DAY_KEY.format(day), user_id)
+            pipe.delete(CARD_KEY.format(user_id))
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"Leaderboard remove failed: {e}")
+
+    async def restore(self, user_id: str):
+        """Вернуть пользователя в таблицы с текущей статистикой (разблокировка)"""
+        result = await self.db.execute(select(UserStats).where(UserStats.user_id == user_id))
+        stats = result.scalar_one_or_none()
+        if not stats:
+            return
+
+        await self.update([stats])
+        try:
+            redis_client = await get_redis()
+            pipe = redis_client.pipeline(transaction=False)
+            for category in AdCategory:
+                exchanges = getattr(stats, f"{category.value}_exchanges", 0)
+                if exchanges:
+                    pipe.zadd(CATEGORY_KEY.format(category.value), {user_id: exchanges})
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"Leaderboard restore failed: {e}")
+
+    async def profile_updated(self, user_id: str, university: Optional[str]):
+        """Сбросить карточку и перенести пользователя, если сменился университет"""
+        try:
+            redis_client = await get_redis()
+            university = (university or "").strip()
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.hget(USER_UNIVERSITY_KEY, user_id)
+            pipe.zscore(LEADERBOARD_KEY, user_id)
+            old_university, reputation = await pipe.execute()
+
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.delete(CARD_KEY.format(user_id))
+            if old_university != university:
+                pipe.hset(USER_UNIVERSITY_KEY, user_id, university)
+                if old_university:
+                    pipe.zrem(UNIVERSITY_KEY.format(old_university), user_id)
+                if university and reputation is not None:
+                    pipe.zadd(UNIVERSITY_KEY.format(university), {user_id: reputation})
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"Leaderboard profile update failed: {e}")
+
+    async def rebuild(self) -> int:
+        """
+        Заполнить общую, университетские и категорийные таблицы из БД заново.
+
+        Очки пишутся во временные ключи пачками по id, затем ключи атомарно
+        переименовываются, так что читатели не видят частично собранных таблиц.
+        Недельные и месячные окна из БД не восстанавливаются: истории
+        прироста в ней нет, они наполняются заново по мере начислений.
+        """
+        redis_client = await get_redis()
+        suffix = f":rebuild:{uuid4().hex}"
+        tmp_keys: Dict[str, str] = {}
+        total = 0
+        last_id = ""
+
+        def tmp(key: str) -> str:
+            return tmp_keys.setdefault(key, key + suffix)
+
+        category_columns = [getattr(UserStats, f"{category.value}_exchanges") for category in AdCategory]
+
+        try:
+            while True:
+                result = await self.db.execute(
+                    select(
+                        UserStats.user_id, UserStats.reputation, UserStats.trending_score,
+                        UserProfile.university, *category_columns
+                    )
+                    .join(User, User.id == UserStats.user_id)
+                    .outerjoin(UserProfile, UserProfile.user_id == UserStats.user_id)
+                    .where(User.is_active == True, UserStats.user_id > last_id)
+                    .order_by(UserStats.user_id)
+                    .limit(self.REBUILD_CHUNK)
+                )
+                rows = result.all()
+                if not rows:
+                    break
+
+                pipe = redis_client.pipeline(transaction=False)
+                for row in rows:
+                    university = (row.university or "").strip()
+                    pipe.zadd(tmp(LEADERBOARD_KEY), {row.user_id: row.reputation})
+                    if row.trending_score is not None:
+                        pipe.zadd(tmp(TRENDING_KEY), {row.user_id: row.trending_score})
+                    pipe.hset(tmp(USER_UNIVERSITY_KEY), row.user_id, university)
+                    if university:
+                        pipe.zadd(tmp(UNIVERSITY_KEY.format(university)), {row.user_id: row.reputation})
+                    for category in AdCategory:
+                        exchanges = getattr(row, f"{category.value}_exchanges")
+                        if exchanges:
+                            pipe.zadd(tmp(CATEGORY_KEY.format(category.value)), {row.user_id: exchanges})
+                await pipe.execute()
+
+                total += len(rows)
+                last_id = rows[-1].user_id
+
+            stale = [LEADERBOARD_KEY, TRENDING_KEY, USER_UNIVERSITY_KEY]
+            stale += [CATEGORY_KEY.format(category.value) for category in AdCategory]
+            stale += [key async for key in redis_client.scan_iter(match=UNIVERSITY_KEY.format("*"))]
+
+            pipe = redis_client.pipeline(transaction=True)
+            for key in stale:
+                if key not in tmp_keys and ":rebuild:" not in key:
+                    pipe.delete(key)
+            for key, tmp_key in tmp_keys.items():
+                pipe.rename(tmp_key, key)
+            await pipe.execute()
+        finally:
+            if tmp_keys:
+                await redis_client.delete(*tmp_keys.values())
+
+        return total
+
+    async def rebuild_if_missing(self) -> int:
+        """Собрать таблицы при старте, если ключа в Redis нет (новый или очищенный Redis)"""
+        redis_client = await get_redis()
+        if await redis_client.exists(LEADERBOARD_KEY):
+            return 0
+        return await self.rebuild()
+
+    async def _scope_key(
+        self,
+        redis_client,
+        scope: LeaderboardScope,
+        university: Optional[str],
+        category: Optional[AdCategory]
+    ) -> str:
+        if scope == LeaderboardScope.UNIVERSITY:
+            if not university or not university.strip():
+                raise ValueError("University is required for this leaderboard")
+            return UNIVERSITY_KEY.format(university.strip())
+
+        if scope == LeaderboardScope.CATEGORY:
+            if not category:
+                raise ValueError("Category is required for this leaderboard")
+            return CATEGORY_KEY.format(category.value)
+
+        if scope in WINDOW_DAYS:
+            key = WINDOW_KEY.format(scope.value, self._today())
+            if not await redis_client.exists(key):
+                days = [DAY_KEY.format(day) for day in self._days(WINDOW_DAYS[scope])]
+                pipe = redis_client.pipeline(transaction=True)
+                pipe.zunionstore(key, days)
+                pipe.expire(key, self.WINDOW_CACHE_TTL)
+                await pipe.execute()
+            return key
+
+        if scope == LeaderboardScope.TRENDING:
+            return TRENDING_KEY
+
+        return LEADERBOARD_KEY
+
+    @staticmethod
+    def _display_scores(scope: LeaderboardScope, entries):
+        """Для trending перевести score из лог-пространства в текущую затухающую репутацию"""
+        if scope != LeaderboardScope.TRENDING:
+            return entries
+        offset = REPUTATION_DECAY_RATE * time.time()
+        return [(user_id, round(math.exp(score - offset))) for user_id, score in entries]
+
+    async def _universities(self, redis_client, user_ids: List[str]) -> Dict[str, str]:
+        """Университеты пользователей: из хэша в Redis, промахи — одним запросом к БД"""
+        if not user_ids:
+            return {}
+        cached = await redis_client.hmget(USER_UNIVERSITY_KEY, user_ids)
+        universities = {user_id: value for user_id, value in zip(user_ids, cached) if value is not None}
+
+        missing = [user_id for user_id in user_ids if user_id not in universities]
+        if missing:
+            result = await self.db.execute(
+                select(UserProfile.user_id, UserProfile.university)
+                .where(UserProfile.user_id.in_(missing))
+            )
+            loaded = {user_id: (university or "").strip() for user_id, university in result.all()}
+            if loaded:
+                await redis_client.hset(USER_UNIVERSITY_KEY, mapping=loaded)
+            universities.update(loaded)
+        return universities
+
+    @staticmethod
+    def _today() -> str:
+        return datetime.now(timezone.utc).strftime("%Y%m%d")
+
+    @staticmethod
+    def _days(count: int) -> List[str]:
+        today = datetime.now(timezone.utc).date()
+        return [(today - timedelta(days=offset)).strftime("%Y%m%d") for offset in range(count)]
+
+    async def _with_cards(self, entries, first_position: int) -> List[Dict]:
+        if not entries:
+            return []
+
+        redis_client = await get_redis()
+        user_ids = [user_id for user_id, _ in entries]
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.mget([CARD_KEY.format(user_id) for user_id in user_ids])
+        pipe.zmscore(LEADERBOARD_KEY, user_ids)
+        cached, reputations = await pipe.execute()
+        cards = {user_id: json.loads(raw) for user_id, raw in zip(user_ids, cached) if raw}
+
+        missing = [user_id for user_id in user_ids if user_id not in cards]
+        if missing:
+            cards.update(await self._load_cards(redis_client, missing))
+
+        leaderboard = []
+        for position, ((user_id, score), reputation) in enumerate(zip(entries, reputations), first_position):
+            card = cards.get(user_id)
+            if card is None:
+                continue
+            leaderboard.append({
+                "id": user_id,
+                **card,
+                "reputation": int(reputation or 0),
+                "score": int(score),
+                "position": position
+            })
+        return leaderboard
+
+    async def _load_cards(self, redis_client, user_ids: List[str]) -> Dict[str, Dict]:
+        result = await self.db.execute(
+            select(
+                UserProfile.user_id,
+                UserProfile.first_name,
+                UserProfile.last_name,
+                UserProfile.avatar_url,
+                UserProfile.university,
+                UserStats.level
+            )
+            .join(UserStats, UserStats.user_id == UserProfile.user_id)
+            .where(UserProfile.user_id.in_(user_ids))
+        )
+
+        cards = {}
+        pipe = redis_client.pipeline(transaction=False)
+        for row in result.all():
+            card = {
+                "first_name": row.first_name or "",
+                "last_name": row.last_name or "",
+                "avatar_url": row.avatar_url,
+                "university": row.university or "",
+                "level": row.level
+            }
+            cards[row.user_id] = card
+            pipe.set(CARD_KEY.format(row.user_id), json.dumps(card), ex=self.CARD_TTL)
+        await pipe.execute()
+        return cards
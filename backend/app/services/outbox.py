@@ -0,0 +1,184 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from sqlalchemy import select, update, func, or_, literal_column
+
+from app.config import settings
+from app.database import AsyncSessionLocal, get_redis
+from app.models.outbox import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+Consumer = Callable[[OutboxEvent], Awaitable[None]]
+
+
+def outbox_event(aggregate_type: str, aggregate_id, event_type: str, payload: dict) -> OutboxEvent:
+    """Создать событие outbox (добавляется в сессию вызывающим кодом, в его транзакции)"""
+    return OutboxEvent(
+        aggregate_type=aggregate_type,
+        aggregate_id=str(aggregate_id),
+        event_type=event_type,
+        payload=payload
+    )
+
+
+class OutboxRelay:
+    """
+    Фоновый релей транзакционного outbox.
+
+    Захватывает пачку неопубликованных событий короткой транзакцией (FOR
+    UPDATE SKIP LOCKED + аренда next_attempt_at на OUTBOX_LEASE_SECONDS), так
+    что потребители работают без открытой транзакции и блокировок строк.
+    Каждое событие отдаётся всем зарегистрированным потребителям; второй
+    короткой транзакцией событие помечается опубликованным, когда все
+    потребители отработали, а при ошибке откладывается с экспоненциальной
+    задержкой. Если релей упал посреди пачки, события снова станут доступны
+    по истечении аренды. Доставка at-least-once: успешные потребители
+    отмечаются в Redis и при повторе события пропускаются, но сами
+    потребители тоже должны быть идемпотентны.
+    """
+
+    DONE_KEY_TTL = 7 * 24 * 60 * 60
+
+    def __init__(self):
+        self._consumers: Dict[str, List[Tuple[str, Consumer]]] = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self.is_running = False
+        self.batch_size = settings.OUTBOX_BATCH_SIZE
+        self.poll_interval = settings.OUTBOX_POLL_INTERVAL
+        self.max_attempts = settings.OUTBOX_MAX_ATTEMPTS
+        self.lease_seconds = settings.OUTBOX_LEASE_SECONDS
+        self.retry_base_delay = settings.OUTBOX_RETRY_BASE_DELAY
+        self.retry_max_delay = settings.OUTBOX_RETRY_MAX_DELAY
+
+    def register(self, event_type: str, name: str, consumer: Consumer):
+        """Подписать потребителя name на события event_type"""
+        self._consumers.setdefault(event_type, []).append((name, consumer))
+
+    def notify(self):
+        """Разбудить релей сразу после коммита, не дожидаясь очередного опроса"""
+        self._wakeup.set()
+
+    async def start(self):
+        if self.is_running:
+            return
+        self.is_running = True
+        self._task = asyncio.create_task(self._run())
+        logger.info("Outbox relay started")
+
+    async def stop(self):
+        self.is_running = False
+        self._wakeup.set()
+        if self._task:
+            await self._task
+        logger.info("Outbox relay stopped")
+
+    async def _run(self):
+        while self.is_running:
+            try:
+                relayed = await self.relay_batch()
+            except Exception as e:
+                logger.error(f"Outbox relay error: {e}")
+                relayed = 0
+
+            if relayed >= self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def relay_batch(self) -> int:
+        """Опубликовать одну пачку событий. Возвращает количество обработанных событий."""
+        events = await self._claim()
+        if not events:
+            return 0
+
+        redis_client = await get_redis()
+        published, failed = [], []
+
+        for event in events:
+            if await self._deliver(redis_client, event):
+                published.append(event.id)
+            elif event.attempts >= self.max_attempts:
+                logger.error(f"Outbox event {event.id} ({event.event_type}) dropped after {event.attempts} attempts")
+                published.append(event.id)
+            else:
+                failed.append(event.id)
+
+        async with AsyncSessionLocal() as db:
+            if published:
+                await db.execute(
+                    update(OutboxEvent)
+                    .where(OutboxEvent.id.in_(published))
+                    .values(published_at=func.now(), next_attempt_at=None)
+                )
+            if failed:
+                delay = func.least(
+                    self.retry_max_delay,
+                    self.retry_base_delay * func.power(2, OutboxEvent.attempts - 1)
+                )
+                await db.execute(
+                    update(OutboxEvent)
+                    .where(OutboxEvent.id.in_(failed))
+                    .values(next_attempt_at=func.now() + delay * literal_column("interval '1 second'"))
+                )
+            await db.commit()
+        return len(events)
+
+    async def _claim(self) -> List[OutboxEvent]:
+        """Захватить пачку готовых к отправке событий: аренда и счётчик попыток фиксируются сразу"""
+        async with AsyncSessionLocal() as db:
+            ready = (
+                select(OutboxEvent.id)
+                .where(
+                    OutboxEvent.published_at.is_(None),
+                    or_(OutboxEvent.next_attempt_at.is_(None), OutboxEvent.next_attempt_at <= func.now())
+                )
+                .order_by(OutboxEvent.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+                .scalar_subquery()
+            )
+            result = await db.execute(
+                update(OutboxEvent)
+                .where(OutboxEvent.id.in_(ready))
+                .values(
+                    attempts=OutboxEvent.attempts + 1,
+                    next_attempt_at=func.now() + self.lease_seconds * literal_column("interval '1 second'")
+                )
+                .returning(OutboxEvent)
+                .execution_options(synchronize_session=False)
+            )
+            events = sorted(result.scalars().all(), key=lambda event: event.id)
+            await db.commit()
+            return events
+
+    async def _deliver(self, redis_client, event: OutboxEvent) -> bool:
+        """Отдать событие всем потребителям; True, если все отработали успешно"""
+        consumers = self._consumers.get(event.event_type, [])
+        if not consumers:
+            return True
+
+        done_keys = [f"outbox:done:{name}:{event.id}" for name, _ in consumers]
+        already_done = await redis_client.mget(done_keys)
+
+        delivered = True
+        for (name, consumer), done_key, done in zip(consumers, done_keys, already_done):
+            if done:
+                continue
+            try:
+                await consumer(event)
+            except Exception as e:
+                logger.error(f"Outbox consumer {name} failed on event {event.id}: {e}")
+                delivered = False
+                continue
+            await redis_client.set(done_key, 1, ex=self.DONE_KEY_TTL)
+
+        return delivered
+
+
+outbox_relay = OutboxRelay()
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Set
+
+from sqlalchemy import select, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import get_redis
+from app.models.ad import AdCategory
+from app.models.platform import PlatformCounter
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_DAY_KEY = "active:day:{day}"
+# Неделя плюс запас на часовые пояса и опоздавший сброс буфера
+ACTIVE_DAY_TTL = 9 * 24 * 60 * 60
+
+
+def _utc_day(moment: datetime) -> str:
+    return moment.strftime("%Y%m%d")
+
+
+class ActiveUserTracker:
+    """
+    Учёт активных пользователей в Redis HyperLogLog (active:day:{YYYYMMDD}).
+
+    track() вызывается на каждый аутентифицированный запрос и подключение
+    к WebSocket, поэтому только кладёт id в локальный буфер; воркер раз в
+    ACTIVITY_FLUSH_INTERVAL сбрасывает буфер одним PFADD. HLL даёт число
+    уникальных пользователей с погрешностью ~1% при 12 КБ на день.
+    """
+
+    def __init__(self):
+        self._pending: Set[str] = set()
+        self._task = None
+        self.is_running = False
+        self.flush_interval = settings.ACTIVITY_FLUSH_INTERVAL
+
+    def track(self, user_id: str):
+        self._pending.add(str(user_id))
+
+    async def flush(self) -> int:
+        """Записать буфер в HLL текущего дня. Возвращает число id."""
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, set()
+
+        key = ACTIVE_DAY_KEY.format(day=_utc_day(datetime.now(timezone.utc)))
+        try:
+            redis_client = await get_redis()
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.pfadd(key, *batch)
+            pipe.expire(key, ACTIVE_DAY_TTL)
+            await pipe.execute()
+        except Exception:
+            # Вернём id в буфер до следующей попытки
+            self._pending |= batch
+            raise
+        return len(batch)
+
+    async def start(self):
+        if self.is_running:
+            return
+        self.is_running = True
+        self._task = asyncio.create_task(self._run())
+        logger.info("Active user tracker started")
+
+    async def stop(self):
+        self.is_running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Active user tracker final flush failed: {e}")
+        logger.info("Active user tracker stopped")
+
+    async def _run(self):
+        while self.is_running:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Active user tracker flush failed: {e}")
+
+
+class PlatformStatsService:
+    """Глобальная статистика платформы из заранее посчитанных значений."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_global(self) -> Dict:
+        now = datetime.now(timezone.utc)
+
+        totals_result = await self.db.execute(
+            select(PlatformCounter.kind, PlatformCounter.key, PlatformCounter.value).where(
+                or_(
+                    PlatformCounter.kind == "total",
+                    and_(PlatformCounter.kind == "users_day", PlatformCounter.key == now.strftime("%Y-%m-%d"))
+                )
+            )
+        )
+        counters = {(kind, key): value for kind, key, value in totals_result.all()}
+        totals = {key: value for (kind, key), value in counters.items() if kind == "total"}
+
+        # Лидер каждого вида: DISTINCT ON по маленькой таблице счётчиков
+        leaders_result = await self.db.execute(
+            select(PlatformCounter.kind, PlatformCounter.key)
+            .distinct(PlatformCounter.kind)
+            .where(PlatformCounter.kind.in_(("category", "university")), PlatformCounter.value > 0)
+            .order_by(PlatformCounter.kind, PlatformCounter.value.desc(), PlatformCounter.key)
+        )
+        leaders = dict(leaders_result.all())
+
+        category = leaders.get("category")
+        total_reviews = totals.get("reviews", 0)
+        active_today, active_this_week = await self._active_users(now)
+
+        return {
+            "total_users": totals.get("users", 0),
+            "total_exchanges": totals.get("exchanges", 0),
+            "total_reviews": total_reviews,
+            "average_rating": totals.get("rating_sum", 0) / total_reviews if total_reviews else 0.0,
+            "most_popular_category": AdCategory[category].value if category in AdCategory.__members__ else "",
+            "top_university": leaders.get("university", ""),
+            "active_today": active_today,
+            "active_this_week": active_this_week,
+            "new_users_today": counters.get(("users_day", now.strftime("%Y-%m-%d")), 0),
+        }
+
+    async def _active_users(self, now: datetime):
+        """Уникальные активные за сегодня и за последние 7 дней (PFCOUNT объединяет HLL)"""
+        days = [ACTIVE_DAY_KEY.format(day=_utc_day(now - timedelta(days=i))) for i in range(7)]
+        try:
+            redis_client = await get_redis()
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.pfcount(days[0])
+            pipe.pfcount(*days)
+            today, week = await pipe.execute()
+            return today, week
+        except Exception as e:
+            logger.error(f"Active users count failed: {e}")
+            return 0, 0
+
+
+active_users = ActiveUserTracker()
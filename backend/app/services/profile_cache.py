@@ -0,0 +1,133 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict
+
+from app.database import get_redis
+
+logger = logging.getLogger(__name__)
+
+PROFILE_KEY = "profile:gamified:{}"
+GENERATION_KEY = "profile:gamified:{}:gen"
+METRICS_KEY = "profile:gamified:metrics"
+
+# Записать документ, только если профиль не инвалидировали, пока он собирался
+# (поколение не изменилось с момента промаха)
+FILL_SCRIPT = """
+local generation = redis.call('GET', KEYS[2]) or ''
+if generation ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+
+class ProfileCache:
+    """
+    Кэш собранного геймифицированного профиля как готового JSON.
+
+    Документ лежит в Redis и отдаётся клиенту без повторной сериализации.
+    Сбрасывается точечно событиями, которые его меняют (invalidate): правка
+    профиля, изменение статистики, выдача значка, новый отзыв; TTL — страховка
+    для редких косвенных изменений (например, имени автора отзыва).
+    Одновременные промахи по одному пользователю в процессе собирают документ
+    один раз. Запросы и промахи считаются в Redis для метрики hit ratio.
+    """
+
+    TTL = 10 * 60
+    GENERATION_TTL = 24 * 60 * 60
+
+    def __init__(self):
+        self._fill = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def get(self, user_id: str, loader: Callable[[], Awaitable[str]]) -> str:
+        """JSON профиля из кэша; при промахе собирается loader (исключения loader пробрасываются)"""
+        try:
+            redis_client = await get_redis()
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.get(PROFILE_KEY.format(user_id))
+            pipe.get(GENERATION_KEY.format(user_id))
+            pipe.hincrby(METRICS_KEY, "requests", 1)
+            cached, generation, _ = await pipe.execute()
+        except Exception as e:
+            logger.error(f"Profile cache read failed: {e}")
+            return await loader()
+
+        if cached is not None:
+            return cached
+
+        # Промах считается здесь, до загрузки: ошибки loader и ожидание чужой
+        # загрузки — тоже промахи
+        try:
+            await redis_client.hincrby(METRICS_KEY, "misses", 1)
+        except Exception as e:
+            logger.error(f"Profile cache metrics update failed: {e}")
+
+        inflight = self._inflight.get(user_id)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[user_id] = future
+        try:
+            document = await loader()
+            future.set_result(document)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Исключение получат ожидающие; если их нет, не оставляем его «непрочитанным»
+            future.exception()
+            raise
+        finally:
+            del self._inflight[user_id]
+
+        await self._store(redis_client, user_id, generation, document)
+        return document
+
+    async def _store(self, redis_client, user_id: str, generation, document: str):
+        try:
+            if self._fill is None:
+                self._fill = redis_client.register_script(FILL_SCRIPT)
+            await self._fill(
+                keys=[PROFILE_KEY.format(user_id), GENERATION_KEY.format(user_id)],
+                args=[generation or "", document, self.TTL]
+            )
+        except Exception as e:
+            logger.error(f"Profile cache write failed: {e}")
+
+    async def invalidate(self, *user_ids: str):
+        """Сбросить профили пользователей (после коммита изменений)"""
+        if not user_ids:
+            return
+        try:
+            redis_client = await get_redis()
+            pipe = redis_client.pipeline(transaction=False)
+            for user_id in set(user_ids):
+                pipe.delete(PROFILE_KEY.format(user_id))
+                pipe.incr(GENERATION_KEY.format(user_id))
+                pipe.expire(GENERATION_KEY.format(user_id), self.GENERATION_TTL)
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"Profile cache invalidation failed: {e}")
+
+    async def metrics(self) -> Dict:
+        """Счётчики кэша по всем процессам (coalesced — только текущий процесс)"""
+        redis_client = await get_redis()
+        raw = await redis_client.hgetall(METRICS_KEY)
+        requests = int(raw.get("requests", 0))
+        misses = int(raw.get("misses", 0))
+        return {
+            "requests": requests,
+            "hits": requests - misses,
+            "misses": misses,
+            "hit_ratio": round((requests - misses) / requests, 4) if requests else 0.0,
+            "coalesced": self.coalesced,
+        }
+
+
+profile_cache = ProfileCache()
@@ -0,0 +1,90 @@
+import asyncio
+import json
+import logging
+from typing import Awaitable, Callable, Dict, List
+
+from app.database import get_redis
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+class PubSubHub:
+    """
+    Одно Redis pub/sub соединение на процесс для всех внутренних каналов.
+
+    Обработчики регистрируются через subscribe() до start(); сообщения
+    передаются в них как dict (JSON на проводе).
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, List[Handler]] = {}
+        self._pubsub = None
+        self._task = None
+        self.is_running = False
+
+    def subscribe(self, channel: str, handler: Handler):
+        """Зарегистрировать обработчик канала"""
+        self._handlers.setdefault(channel, []).append(handler)
+
+    async def publish(self, channel: str, data: dict) -> bool:
+        """Опубликовать сообщение во всех процессах. False, если Redis недоступен."""
+        try:
+            redis_client = await get_redis()
+            await redis_client.publish(channel, json.dumps(data, default=str))
+            return True
+        except Exception as e:
+            logger.error(f"PubSub publish to {channel} failed: {e}")
+            return False
+
+    async def start(self):
+        if self.is_running or not self._handlers:
+            return
+        redis_client = await get_redis()
+        self._pubsub = redis_client.pubsub()
+        await self._pubsub.subscribe(*self._handlers.keys())
+        self.is_running = True
+        self._task = asyncio.create_task(self._listen())
+        logger.info(f"PubSub hub subscribed to: {', '.join(self._handlers)}")
+
+    async def stop(self):
+        self.is_running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._pubsub:
+            await self._pubsub.unsubscribe()
+            await self._pubsub.close()
+            self._pubsub = None
+
+    async def _listen(self):
+        while self.is_running:
+            try:
+                async for message in self._pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    await self._dispatch(message["channel"], message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"PubSub listener error: {e}")
+                await asyncio.sleep(1)
+
+    async def _dispatch(self, channel: str, raw: str):
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            logger.warning(f"PubSub: malformed message on {channel}")
+            return
+        for handler in self._handlers.get(channel, []):
+            try:
+                await handler(data)
+            except Exception as e:
+                logger.error(f"PubSub handler for {channel} failed: {e}")
+
+
+pubsub_hub = PubSubHub()
@@ -0,0 +1,174 @@
+"""
+Ограничение частоты запросов.
+
+Каждая проверка — один вызов Lua-скрипта в Redis: чтение состояния, решение
+и запись выполняются атомарно, ключ всегда получает TTL. Время берётся из
+Redis (TIME), поэтому часы воркеров на результат не влияют.
+
+Перед Redis стоит локальный быстрый путь: ключ, которому Redis уже отказал,
+блокируется в памяти процесса до Retry-After, а для скользящего окна процесс
+считает свои пропущенные запросы в текущем окне — если уже они исчерпали
+лимит, Redis заведомо откажет. Поток запросов от одного клиента отсекается
+без обращения к Redis.
+"""
+import enum
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+from app.database import get_redis
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_KEY = "ratelimit:{}:{}"
+
+# Скользящее окно по двум соседним фиксированным окнам: прошлое учитывается
+# с весом, равным непрошедшей доле текущего. Память — один хэш на ключ.
+# Возвращает {разрешено, осталось, повторить через мс}; отрицательный cost — возврат.
+SLIDING_WINDOW_SCRIPT = """
+local t = redis.call('TIME')
+local now = t[1] * 1000 + math.floor(t[2] / 1000)
+local limit, window, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local index = math.floor(now / window)
+local state = redis.call('HMGET', KEYS[1], 'index', 'current', 'previous')
+local stored, current, previous = tonumber(state[1]), tonumber(state[2]) or 0, tonumber(state[3]) or 0
+if stored ~= index then
+    if stored == index - 1 then previous = current else previous = 0 end
+    current = 0
+end
+local elapsed = now - index * window
+local used = previous * (1 - elapsed / window) + current
+if used + cost > limit then
+    local retry = window - elapsed
+    if previous > 0 and current + cost <= limit then
+        retry = math.ceil((1 - (limit - current - cost) / previous) * window - elapsed)
+    end
+    return {0, 0, math.max(retry, 1)}
+end
+redis.call('HSET', KEYS[1], 'index', index, 'current', math.max(current + cost, 0), 'previous', previous)
+redis.call('PEXPIRE', KEYS[1], window * 2)
+return {1, math.floor(limit - used - cost), 0}
+"""
+
+# Token bucket: ёмкость limit, полное пополнение за window
+TOKEN_BUCKET_SCRIPT = """
+local t = redis.call('TIME')
+local now = t[1] * 1000 + math.floor(t[2] / 1000)
+local capacity, window, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local rate = capacity / window
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(now - ts, 0) * rate)
+if tokens < cost then
+    return {0, math.floor(tokens), math.ceil((cost - tokens) / rate)}
+end
+redis.call('HSET', KEYS[1], 'tokens', math.min(tokens - cost, capacity), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], window)
+return {1, math.floor(tokens - cost), 0}
+"""
+
+
+class Algorithm(str, enum.Enum):
+    """Алгоритмы ограничения."""
+    SLIDING_WINDOW = "sliding_window"
+    TOKEN_BUCKET = "token_bucket"
+
+
+SCRIPTS = {
+    Algorithm.SLIDING_WINDOW: SLIDING_WINDOW_SCRIPT,
+    Algorithm.TOKEN_BUCKET: TOKEN_BUCKET_SCRIPT,
+}
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """
+    Правило: не больше limit запросов за window секунд.
+
+    Для token bucket limit — ёмкость (допустимый всплеск), window — время
+    полного пополнения.
+    """
+    name: str
+    limit: int
+    window: int
+    algorithm: Algorithm = Algorithm.SLIDING_WINDOW
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    allowed: bool
+    remaining: int
+    retry_after: float
+
+
+class RateLimiter:
+    """Проверка правил для произвольных идентификаторов (IP, пользователь, телефон)."""
+
+    LOCAL_MAX_KEYS = 10000
+
+    def __init__(self):
+        self._scripts = {}
+        self._blocked: Dict[str, float] = {}
+        self._passed: Dict[str, Tuple[float, int]] = {}
+
+    async def hit(self, rule: RateLimit, identity: str, cost: int = 1) -> RateLimitResult:
+        """Учесть запрос. При недоступности Redis запрос пропускается."""
+        key = RATE_LIMIT_KEY.format(rule.name, identity)
+        now = time.time()
+
+        blocked_until = self._blocked.get(key)
+        if blocked_until is not None:
+            if blocked_until > now:
+                return RateLimitResult(False, 0, blocked_until - now)
+            del self._blocked[key]
+
+        # Окна выровнены по эпохе, как и в скрипте: пропущенные этим процессом
+        # запросы текущего окна входят в общий счётчик
+        window_end = (now // rule.window + 1) * rule.window
+        if rule.algorithm == Algorithm.SLIDING_WINDOW:
+            passed_end, passed = self._passed.get(key, (0, 0))
+            if passed_end == window_end and passed + cost > rule.limit:
+                return self._block(key, now, window_end - now)
+
+        try:
+            redis_client = await get_redis()
+            script = self._scripts.get(rule.algorithm)
+            if script is None:
+                script = self._scripts[rule.algorithm] = redis_client.register_script(SCRIPTS[rule.algorithm])
+            allowed, remaining, retry_ms = await script(keys=[key], args=[rule.limit, rule.window * 1000, cost])
+        except Exception as e:
+            logger.error(f"Rate limit check {rule.name} failed: {e}")
+            return RateLimitResult(True, rule.limit, 0.0)
+
+        if not allowed:
+            return self._block(key, now, retry_ms / 1000)
+
+        if rule.algorithm == Algorithm.SLIDING_WINDOW:
+            passed_end, passed = self._passed.get(key, (0, 0))
+            self._passed[key] = (window_end, passed + cost if passed_end == window_end else cost)
+            self._prune(self._passed, lambda value: value[0] <= now)
+        return RateLimitResult(True, remaining, 0.0)
+
+    async def refund(self, rule: RateLimit, identity: str, cost: int = 1):
+        """Вернуть учтённые запросы (например, если действие не удалось не по вине клиента)"""
+        self._blocked.pop(RATE_LIMIT_KEY.format(rule.name, identity), None)
+        await self.hit(rule, identity, -cost)
+
+    def _block(self, key: str, now: float, retry_after: float) -> RateLimitResult:
+        self._blocked[key] = now + retry_after
+        self._prune(self._blocked, lambda until: until <= now)
+        return RateLimitResult(False, 0, retry_after)
+
+    def _prune(self, entries: Dict, is_stale):
+        """Не даём локальному состоянию расти без границ"""
+        if len(entries) <= self.LOCAL_MAX_KEYS:
+            return
+        for key in [key for key, value in entries.items() if is_stale(value)]:
+            del entries[key]
+        if len(entries) > self.LOCAL_MAX_KEYS:
+            entries.clear()
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,255 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from sqlalchemy import select, func
+
+from app.config import settings
+from app.database import AsyncSessionLocal, get_redis
+from app.models.deal import Deal, DealStatus
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = "deal:reminders"
+INFLIGHT_KEY = "deal:reminders:inflight"
+
+# Смещение до начала занятия (секунды) -> подпись в уведомлении
+REMINDER_OFFSETS = {
+    24 * 60 * 60: "через 24 часа",
+    60 * 60: "через час",
+}
+
+# Атомарно забрать пачку наступивших напоминаний: переносит их из очереди
+# в inflight с арендой до ARGV[3]. Напоминания с истёкшей арендой (воркер
+# упал, не успев отправить) сначала возвращаются в очередь.
+CLAIM_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+for _, member in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], member)
+    redis.call('ZADD', KEYS[1], ARGV[1], member)
+end
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, member in ipairs(due) do
+    redis.call('ZREM', KEYS[1], member)
+    redis.call('ZADD', KEYS[2], ARGV[3], member)
+end
+return due
+"""
+
+
+def _member(deal_id: int, offset: int) -> str:
+    return f"{deal_id}:{offset}"
+
+
+class DealReminderScheduler:
+    """
+    Напоминания о занятиях по подтверждённым сделкам (за 24 часа и за час).
+
+    Ожидающие напоминания лежат в Redis sorted set: score — момент отправки,
+    член — "{deal_id}:{offset}". Постановка и отмена — ZADD/ZREM, O(log n),
+    поэтому сотни тысяч напоминаний не влияют на стоимость операций. Воркер
+    раз в REMINDER_POLL_INTERVAL забирает наступившие напоминания Lua-скриптом
+    (несколько процессов не отправят одно напоминание дважды) и перед отправкой
+    сверяет пачку с БД одним запросом.
+
+    При старте очередь досчитывается из БД (rebuild): добавляются только
+    недостающие будущие напоминания. Наступившие за время простоя и
+    арендованные другим воркером не трогаются — их отправит fire_due или
+    вернёт в очередь истечение аренды. Перенос и отмену выполняет sync_deal.
+    """
+
+    LEASE_SECONDS = 60
+    REBUILD_CHUNK = 1000
+
+    def __init__(self):
+        self._claim = None
+        self._task = None
+        self.is_running = False
+        self.poll_interval = settings.REMINDER_POLL_INTERVAL
+        self.batch_size = settings.REMINDER_BATCH_SIZE
+
+    async def schedule(self, deal_id: int, scheduled_at: datetime):
+        """Поставить (или переставить) напоминания по сделке"""
+        redis_client = await get_redis()
+        pipe = redis_client.pipeline(transaction=True)
+
+        now = time.time()
+        start = scheduled_at.timestamp()
+        for offset in REMINDER_OFFSETS:
+            member = _member(deal_id, offset)
+            pipe.zrem(INFLIGHT_KEY, member)
+            if start - offset > now:
+                pipe.zadd(PENDING_KEY, {member: start - offset})
+            else:
+                pipe.zrem(PENDING_KEY, member)
+        await pipe.execute()
+
+    async def cancel(self, deal_id: int):
+        """Снять все напоминания по сделке"""
+        redis_client = await get_redis()
+        members = [_member(deal_id, offset) for offset in REMINDER_OFFSETS]
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.zrem(PENDING_KEY, *members)
+        pipe.zrem(INFLIGHT_KEY, *members)
+        await pipe.execute()
+
+    async def sync_deal(self, deal_id: int):
+        """Привести напоминания в соответствие с текущим состоянием сделки в БД"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Deal.status, Deal.scheduled_at).where(Deal.id == deal_id)
+            )
+            row = result.one_or_none()
+
+        if row and row.status == DealStatus.CONFIRMED and row.scheduled_at:
+            await self.schedule(deal_id, row.scheduled_at)
+        else:
+            await self.cancel(deal_id)
+
+    async def rebuild(self) -> int:
+        """Досчитать очередь из БД: все подтверждённые сделки с занятием в будущем"""
+        redis_client = await get_redis()
+        now = time.time()
+        scheduled = 0
+        last_id = 0
+        async with AsyncSessionLocal() as db:
+            while True:
+                result = await db.execute(
+                    select(Deal.id, Deal.scheduled_at)
+                    .where(
+                        Deal.status == DealStatus.CONFIRMED,
+                        Deal.scheduled_at > func.now(),
+                        Deal.id > last_id
+                    )
+                    .order_by(Deal.id)
+                    .limit(self.REBUILD_CHUNK)
+                )
+                rows = result.all()
+                if not rows:
+                    break
+
+                pipe = redis_client.pipeline(transaction=False)
+                for deal_id, scheduled_at in rows:
+                    self._restore(pipe, deal_id, scheduled_at, now)
+                await pipe.execute()
+
+                scheduled += len(rows)
+                last_id = rows[-1].id
+        return scheduled
+
+    @staticmethod
+    def _restore(pipe, deal_id: int, scheduled_at: datetime, now: float):
+        """Добавить будущие напоминания сделки, которых нет в очереди (ZADD NX)"""
+        start = scheduled_at.timestamp()
+        for offset in REMINDER_OFFSETS:
+            if start - offset > now:
+                pipe.zadd(PENDING_KEY, {_member(deal_id, offset): start - offset}, nx=True)
+
+    async def start(self):
+        if self.is_running:
+            return
+        redis_client = await get_redis()
+        self._claim = redis_client.register_script(CLAIM_SCRIPT)
+        restored = await self.rebuild()
+        self.is_running = True
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Deal reminder scheduler started, {restored} deals scheduled")
+
+    async def stop(self):
+        self.is_running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        logger.info("Deal reminder scheduler stopped")
+
+    async def _run(self):
+        while self.is_running:
+            try:
+                fired = await self.fire_due()
+            except Exception as e:
+                logger.error(f"Deal reminder scheduler error: {e}")
+                fired = 0
+            if fired < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    async def fire_due(self) -> int:
+        """Отправить одну пачку наступивших напоминаний. Возвращает размер пачки."""
+        now = time.time()
+        members = await self._claim(
+            keys=[PENDING_KEY, INFLIGHT_KEY],
+            args=[now, self.batch_size, now + self.LEASE_SECONDS]
+        )
+        if not members:
+            return 0
+
+        due: List[Tuple[str, int, int]] = []
+        for member in members:
+            deal_id, offset = member.split(":")
+            due.append((member, int(deal_id), int(offset)))
+
+        deals = await self._load_confirmed({deal_id for _, deal_id, _ in due})
+
+        handled = []
+        for member, deal_id, offset in due:
+            deal = deals.get(deal_id)
+            if deal and self._is_current(deal.scheduled_at.timestamp(), offset, now):
+                try:
+                    await self._send(deal, offset)
+                except Exception as e:
+                    # Аренда истечёт, и напоминание вернётся в очередь
+                    logger.error(f"Deal reminder {member} failed: {e}")
+                    continue
+            handled.append(member)
+
+        if handled:
+            redis_client = await get_redis()
+            await redis_client.zrem(INFLIGHT_KEY, *handled)
+        return len(due)
+
+    async def _load_confirmed(self, deal_ids) -> Dict[int, Deal]:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Deal).where(
+                    Deal.id.in_(list(deal_ids)),
+                    Deal.status == DealStatus.CONFIRMED,
+                    Deal.scheduled_at.is_not(None)
+                )
+            )
+            return {deal.id: deal for deal in result.scalars().all()}
+
+    @staticmethod
+    def _is_current(start: float, offset: int, now: float) -> bool:
+        """Напоминание ещё актуально: по времени из БД оно наступило (занятие не
+        переносили на более поздний срок), занятие ещё не началось и не наступило
+        время более позднего напоминания (после простоя отправляется одно)"""
+        if now < start - offset - 1 or now >= start:
+            return False
+        return not any(now >= start - other for other in REMINDER_OFFSETS if other < offset)
+
+    async def _send(self, deal: Deal, offset: int):
+        from app.websocket.manager import manager
+        from app.services.telegram_service import telegram_service
+
+        when = REMINDER_OFFSETS[offset]
+        await manager.publish_to_chat({
+            "type": "deal_reminder",
+            "deal_id": deal.id,
+            "scheduled_at": deal.scheduled_at.isoformat(),
+            "offset_seconds": offset
+        }, deal.chat_id)
+
+        details = f"Занятие {when}: {deal.proposed_time}"
+        if deal.proposed_skill:
+            details += f"\nНавык: {deal.proposed_skill}"
+        if deal.proposed_place:
+            details += f"\nМесто: {deal.proposed_place}"
+        for user_id in (deal.student_id, deal.teacher_id):
+            await telegram_service.send_deal_notification(user_id, "Напоминание о занятии", details)
+
+
+deal_reminders = DealReminderScheduler()
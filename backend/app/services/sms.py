@@ -1,18 +1,34 @@
 from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+import asyncio
 import httpx
 import logging
-from app.config import settings
+import random
+import time
+from sqlalchemy import select
+from app.config import settings, is_telegram_enabled
+from app.database import AsyncSessionLocal
+from app.models.user import User
 
 logger = logging.getLogger(__name__)
 
+SMS_TEXT = "Ваш код для Скилл Свап: {code}"
+
 class SMSProvider(ABC):
+    name: str = "provider"
+
     @abstractmethod
     async def send_code(self, phone: str, code: str) -> bool:
         pass
 
+    async def aclose(self):
+        """Release pooled connections."""
+
 class MockSMSProvider(SMSProvider):
     """Mock provider for development - logs code to console."""
-    
+    name = "mock"
+
     async def send_code(self, phone: str, code: str) -> bool:
         logger.info(f"[MOCK SMS] Sending code {code} to {phone}")
         print(f"\n{'='*50}")
@@ -21,75 +37,357 @@ class MockSMSProvider(SMSProvider):
         print(f"{'='*50}\n")
         return True
 
-class TwilioSMSProvider(SMSProvider):
+class HTTPSMSProvider(SMSProvider):
+    """Provider with one long-lived pooled HTTP client (keep-alive, no TLS handshake per code)."""
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(settings.SMS_HTTP_TIMEOUT),
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+class TwilioSMSProvider(HTTPSMSProvider):
     """Twilio SMS provider for production."""
-    
+    name = "twilio"
+
     def __init__(self, account_sid: str, auth_token: str, from_number: str):
+        super().__init__()
         self.account_sid = account_sid
         self.auth_token = auth_token
         self.from_number = from_number
         self.base_url = f"https://api.twilio.com/2010-04-01/Accounts/{account_sid}/Messages.json"
-    
+
     async def send_code(self, phone: str, code: str) -> bool:
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    self.base_url,
-                    auth=(self.account_sid, self.auth_token),
-                    data={
-                        "To": phone,
-                        "From": self.from_number,
-                        "Body": f"Ваш код для Скилл Свап: {code}"
-                    }
-                )
-                return response.status_code == 201
+            response = await self.client.post(
+                self.base_url,
+                auth=(self.account_sid, self.auth_token),
+                data={
+                    "To": phone,
+                    "From": self.from_number,
+                    "Body": SMS_TEXT.format(code=code)
+                }
+            )
+            return response.status_code == 201
         except Exception as e:
             logger.error(f"Twilio SMS error: {e}")
             return False
 
-class SMSRuProvider(SMSProvider):
+class SMSRuProvider(HTTPSMSProvider):
     """SMS.ru provider for Russian market."""
-    
+    name = "smsru"
+
     def __init__(self, api_key: str):
+        super().__init__()
         self.api_key = api_key
         self.base_url = "https://sms.ru/sms/send"
-    
+
     async def send_code(self, phone: str, code: str) -> bool:
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    self.base_url,
-                    params={
-                        "api_id": self.api_key,
-                        "to": phone.replace("+", ""),
-                        "msg": f"Ваш код для Скилл Свап: {code}",
-                        "json": 1
-                    }
-                )
-                data = response.json()
-                return data.get("status") == "OK"
+            response = await self.client.get(
+                self.base_url,
+                params={
+                    "api_id": self.api_key,
+                    "to": phone.replace("+", ""),
+                    "msg": SMS_TEXT.format(code=code),
+                    "json": 1
+                }
+            )
+            data = response.json()
+            return data.get("status") == "OK"
         except Exception as e:
             logger.error(f"SMS.ru error: {e}")
             return False
 
-def get_sms_provider() -> SMSProvider:
-    """Factory function to get configured SMS provider."""
-
-    if settings.SMS_PROVIDER != "mock" and settings.SMS_API_KEY is None:
-        raise ValueError(f"SMS_API_KEY must be set in .env when SMS_PROVIDER is '{settings.SMS_PROVIDER}'")
-
-    if settings.SMS_PROVIDER == "twilio":
-
-        assert settings.SMS_API_KEY is not None 
-             
-        parts = settings.SMS_API_KEY.split(":")
-        if len(parts) != 3:
-            raise ValueError("Twilio SMS_API_KEY format must be: SID:TOKEN:FROM_NUMBER")
-            
-        return TwilioSMSProvider(parts[0], parts[1], parts[2])
-        
-    elif settings.SMS_PROVIDER == "mock":
-        return MockSMSProvider()
-        
-    else:
-        raise ValueError(f"Unknown SMS provider: {settings.SMS_PROVIDER}")
\ No newline at end of file
+def build_sms_providers() -> List[SMSProvider]:
+    """
+    Providers from settings, in order of preference.
+    SMS_PROVIDER is a comma-separated list (e.g. "smsru,twilio"); each provider
+    takes its own key (SMSRU_API_KEY / TWILIO_API_KEY) or falls back to SMS_API_KEY.
+    """
+    providers: List[SMSProvider] = []
+    for name in [part.strip() for part in settings.SMS_PROVIDER.split(",") if part.strip()]:
+        if name == "mock":
+            providers.append(MockSMSProvider())
+            continue
+
+        if name == "twilio":
+            api_key = settings.TWILIO_API_KEY or settings.SMS_API_KEY
+        elif name == "smsru":
+            api_key = settings.SMSRU_API_KEY or settings.SMS_API_KEY
+        else:
+            raise ValueError(f"Unknown SMS provider: {name}")
+
+        if api_key is None:
+            raise ValueError(f"SMS_API_KEY must be set in .env when SMS_PROVIDER is '{name}'")
+
+        if name == "twilio":
+            parts = api_key.split(":")
+            if len(parts) != 3:
+                raise ValueError("Twilio SMS_API_KEY format must be: SID:TOKEN:FROM_NUMBER")
+            providers.append(TwilioSMSProvider(parts[0], parts[1], parts[2]))
+        else:
+            providers.append(SMSRuProvider(api_key))
+
+    if not providers:
+        raise ValueError("SMS_PROVIDER must name at least one provider")
+    return providers
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `threshold` consecutive failures; after `cooldown`
+    seconds one trial call is let through (half-open), its result closes or
+    reopens the circuit.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial:
+            self._trial = True
+            return True
+        return False
+
+    def record(self, success: bool):
+        self._trial = False
+        if success:
+            self.failures = 0
+            self.opened_at = None
+            return
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+@dataclass
+class ProviderHealth:
+    provider: SMSProvider
+    breaker: CircuitBreaker
+    latency: Optional[float] = None
+    sent: int = 0
+    failed: int = 0
+
+    def observe(self, success: bool, elapsed: float):
+        self.breaker.record(success)
+        if success:
+            self.sent += 1
+        else:
+            self.failed += 1
+        alpha = SMSDispatcher.LATENCY_ALPHA
+        self.latency = elapsed if self.latency is None else alpha * elapsed + (1 - alpha) * self.latency
+
+
+@dataclass
+class SMSJob:
+    phone: str
+    code: str
+    on_failure: Optional[Callable[[], Awaitable[None]]] = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+    last_provider: Optional[str] = None
+
+
+class SMSDispatcher(SMSProvider):
+    """
+    Background delivery of verification codes.
+
+    send_code()/enqueue() only queue the code, so /auth/request_code does not
+    wait on the provider. Workers first try the cheap channel — Telegram, if
+    the phone's owner is subscribed — and then SMS providers: healthy ones
+    (circuit closed or half-open) ordered by recent failures and EWMA latency,
+    preferring a different provider than the one that just failed. Failed
+    jobs are retried with full-jitter exponential backoff until
+    SMS_MAX_ATTEMPTS or until the code expires; on final failure the job's
+    on_failure callback runs.
+    """
+
+    name = "dispatcher"
+    LATENCY_ALPHA = 0.2
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._retries: set = set()
+        self._health: List[ProviderHealth] = []
+        self._delivery_latency: Optional[float] = None
+        self._counters: Dict[str, int] = {"enqueued": 0, "rejected": 0, "delivered": 0, "failed": 0, "retried": 0}
+        self._by_channel: Dict[str, int] = {}
+        self.is_running = False
+
+    async def start(self):
+        if self.is_running:
+            return
+        self._health = [
+            ProviderHealth(provider, CircuitBreaker(settings.SMS_BREAKER_THRESHOLD, settings.SMS_BREAKER_COOLDOWN))
+            for provider in build_sms_providers()
+        ]
+        self._queue = asyncio.Queue(maxsize=settings.SMS_QUEUE_SIZE)
+        self.is_running = True
+        self._workers = [asyncio.create_task(self._run()) for _ in range(settings.SMS_WORKERS)]
+        logger.info(f"SMS dispatcher started: {', '.join(h.provider.name for h in self._health)}")
+
+    async def stop(self):
+        self.is_running = False
+        for task in [*self._workers, *self._retries]:
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._retries, return_exceptions=True)
+        self._workers, self._retries = [], set()
+        for health in self._health:
+            await health.provider.aclose()
+        logger.info("SMS dispatcher stopped")
+
+    async def send_code(self, phone: str, code: str) -> bool:
+        return await self.enqueue(phone, code)
+
+    async def enqueue(
+        self, phone: str, code: str, on_failure: Optional[Callable[[], Awaitable[None]]] = None
+    ) -> bool:
+        """
+        Queue a code for delivery. False if the dispatcher is not running or the queue is full.
+        on_failure runs in the worker if every attempt fails.
+        """
+        if not self.is_running:
+            return False
+        try:
+            self._queue.put_nowait(SMSJob(phone, code, on_failure))
+        except asyncio.QueueFull:
+            self._counters["rejected"] += 1
+            return False
+        self._counters["enqueued"] += 1
+        return True
+
+    def metrics(self) -> Dict:
+        """Queue depth, counters and latencies of this process"""
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "retry_pending": len(self._retries),
+            **self._counters,
+            "by_channel": dict(self._by_channel),
+            "delivery_latency_ms": round(self._delivery_latency * 1000, 1) if self._delivery_latency is not None else None,
+            "providers": [
+                {
+                    "name": health.provider.name,
+                    "state": health.breaker.state,
+                    "latency_ms": round(health.latency * 1000, 1) if health.latency is not None else None,
+                    "sent": health.sent,
+                    "failed": health.failed,
+                } for health in self._health
+            ],
+        }
+
+    async def _run(self):
+        while self.is_running:
+            job = await self._queue.get()
+            try:
+                await self._deliver(job)
+            except Exception as e:
+                logger.error(f"SMS delivery to {job.phone} crashed: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, job: SMSJob):
+        job.attempts += 1
+        channel = None
+        if job.attempts == 1 and await self._send_telegram(job):
+            channel = "telegram"
+        else:
+            channel = await self._send_sms(job)
+
+        if channel:
+            self._counters["delivered"] += 1
+            self._by_channel[channel] = self._by_channel.get(channel, 0) + 1
+            elapsed = time.monotonic() - job.enqueued_at
+            alpha = self.LATENCY_ALPHA
+            self._delivery_latency = (
+                elapsed if self._delivery_latency is None else alpha * elapsed + (1 - alpha) * self._delivery_latency
+            )
+            return
+
+        delay = random.uniform(0, min(settings.SMS_RETRY_MAX_DELAY, settings.SMS_RETRY_BASE_DELAY * 2 ** job.attempts))
+        expires_in = settings.CODE_EXPIRY - (time.monotonic() - job.enqueued_at)
+        if job.attempts >= settings.SMS_MAX_ATTEMPTS or delay >= expires_in:
+            self._counters["failed"] += 1
+            logger.error(f"Failed to deliver code to {job.phone} after {job.attempts} attempts")
+            if job.on_failure:
+                await job.on_failure()
+            return
+
+        self._counters["retried"] += 1
+        task = asyncio.create_task(self._retry_later(job, delay))
+        self._retries.add(task)
+        task.add_done_callback(self._retries.discard)
+
+    async def _retry_later(self, job: SMSJob, delay: float):
+        await asyncio.sleep(delay)
+        await self._queue.put(job)
+
+    async def _send_sms(self, job: SMSJob) -> Optional[str]:
+        """Try healthy providers by latency; returns the provider name on success"""
+        candidates = sorted(
+            self._health,
+            key=lambda h: (
+                h.provider.name == job.last_provider,
+                h.breaker.failures,
+                h.latency if h.latency is not None else 0.0,
+            )
+        )
+        for health in candidates:
+            if not health.breaker.allow():
+                continue
+            started = time.monotonic()
+            success = await health.provider.send_code(job.phone, job.code)
+            health.observe(success, time.monotonic() - started)
+            if success:
+                return health.provider.name
+            job.last_provider = health.provider.name
+            # One provider per pass: the next one is tried after the backoff
+            break
+        return None
+
+    async def _send_telegram(self, job: SMSJob) -> bool:
+        """Deliver via the Telegram bot if the phone's owner is subscribed"""
+        if not is_telegram_enabled():
+            return False
+        from app.services.telegram_service import telegram_service
+        try:
+            async with AsyncSessionLocal() as db:
+                user_id = await db.scalar(select(User.id).where(User.phone == job.phone))
+            if user_id is None:
+                return False
+            return bool(await telegram_service.send_sms_code(user_id, job.phone, job.code))
+        except Exception as e:
+            logger.error(f"Telegram code delivery to {job.phone} failed: {e}")
+            return False
+
+
+sms_dispatcher = SMSDispatcher()
+
+def get_sms_provider() -> SMSDispatcher:
+    """DI for code delivery: the process-wide dispatcher."""
+    return sms_dispatcher
@@ -0,0 +1,305 @@
+import math
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+from sqlalchemy import select, update, func, union_all, literal, cast, Float
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.ad import Ad, AdCategory
+from app.models.chat import Chat
+from app.models.deal import Deal, DealStatus
+from app.models.gamification import Review, UserStats, GamificationProcessedDeal, REPUTATION_DECAY_RATE
+from app.models.user import User
+from app.services.gamification import (
+    GamificationService, RATING_FIELDS, bayesian_rating, current_decayed_reputation
+)
+from app.services.profile_cache import profile_cache
+
+CATEGORY_FIELDS = tuple(f"{category.value}_exchanges" for category in AdCategory)
+
+COMPARED_FIELDS = (
+    "reputation",
+    "exchanges_completed",
+    "total_ratings",
+    "average_rating",
+    "level",
+    "experience",
+    *RATING_FIELDS,
+    "bayesian_rating",
+    *CATEGORY_FIELDS,
+    "decayed_reputation",
+)
+
+# Колонки с плавающей точкой сравниваются с округлением
+FLOAT_PRECISION = {"average_rating": 2, "bayesian_rating": 4, "decayed_reputation": 2}
+
+
+class StatsRecomputeService:
+    """
+    Пересчёт user_stats всех пользователей из исходных таблиц.
+
+    Пользователи обрабатываются пачками по id. Для пачки агрегаты считает
+    Postgres (GROUP BY по завершённым сделкам обоих участников с категорией
+    объявления и GROUP BY по отзывам), в Python остаётся только сравнение
+    с текущими строками. Изменившиеся строки пишутся
+    пакетным UPDATE по первичному ключу, недостающие — одной вставкой;
+    память ограничена размером пачки.
+
+    Затухающая репутация пересчитывается так же, как в миграции 011: сумма
+    начислений, каждое со своим затуханием от момента события (deals.updated_at
+    для обмена, reviews.created_at для отзыва) до начала обработки пачки.
+    Текущее значение сравнивается, приведённое к тому же моменту; при
+    расхождении пишутся decayed_reputation, decayed_at и trending_score.
+
+    Задачу стоит запускать при остановленном релее outbox: сделки,
+    завершённые во время пересчёта, иначе могут быть учтены дважды.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.gamification = GamificationService(db)
+
+    async def recompute(self, chunk_size: int = 5000, dry_run: bool = False, sample_size: int = 10) -> Dict:
+        """
+        Пересчитать статистику. В режиме dry_run ничего не пишет, только
+        возвращает отчёт о расхождениях.
+        """
+        report = {
+            "users": 0,
+            "changed": 0,
+            "created": 0,
+            "fields": Counter(),
+            "samples": [],
+        }
+        last_id = ""
+
+        if not dry_run:
+            await self._mark_completed_deals_processed()
+
+        while True:
+            ids_result = await self.db.execute(
+                select(User.id).where(User.id > last_id).order_by(User.id).limit(chunk_size)
+            )
+            user_ids = ids_result.scalars().all()
+            if not user_ids:
+                break
+            first_id, last_id = user_ids[0], user_ids[-1]
+
+            now = datetime.now(timezone.utc)
+            computed = await self._aggregate(first_id, last_id, now)
+            current = await self._current(first_id, last_id, now)
+
+            changed, created = self._diff(computed, current, report, sample_size, now)
+            report["users"] += len(user_ids)
+            report["changed"] += len(changed)
+            report["created"] += len(created)
+
+            if not dry_run:
+                if changed:
+                    await self.db.execute(update(UserStats), changed)
+                if created:
+                    await self.db.execute(pg_insert(UserStats).values(created).on_conflict_do_nothing())
+                await self.db.commit()
+                await profile_cache.invalidate(*[row["user_id"] for row in changed + created])
+
+        if dry_run:
+            await self.db.rollback()
+        report["fields"] = dict(report["fields"])
+        return report
+
+    async def _mark_completed_deals_processed(self):
+        """Пересчитанные сделки не должны начисляться повторно при доставке старых событий"""
+        await self.db.execute(
+            pg_insert(GamificationProcessedDeal)
+            .from_select(["deal_id"], select(Deal.id).where(Deal.status == DealStatus.COMPLETED))
+            .on_conflict_do_nothing()
+        )
+        await self.db.commit()
+
+    async def _aggregate(self, first_id: str, last_id: str, now: datetime) -> Dict[str, Dict]:
+        """Агрегаты по пользователям из диапазона [first_id, last_id] на момент now"""
+        participants = union_all(*[
+            select(role.label("user_id"), Ad.category.label("category"))
+            .join(Chat, Chat.id == Deal.chat_id)
+            .join(Ad, Ad.id == Chat.ad_id)
+            .where(Deal.status == DealStatus.COMPLETED, role.between(first_id, last_id))
+            for role in (Deal.student_id, Deal.teacher_id)
+        ]).subquery("participants")
+
+        exchanges_result = await self.db.execute(
+            select(
+                participants.c.user_id,
+                func.count().label("exchanges_completed"),
+                *[
+                    func.count().filter(participants.c.category == category).label(field)
+                    for category, field in zip(AdCategory, CATEGORY_FIELDS)
+                ]
+            ).group_by(participants.c.user_id)
+        )
+        ratings_result = await self.db.execute(
+            select(
+                Review.target_user_id.label("user_id"),
+                func.count().label("total_ratings"),
+                *[
+                    func.count().filter(Review.rating == stars).label(field)
+                    for stars, field in enumerate(RATING_FIELDS, 1)
+                ]
+            )
+            .where(Review.target_user_id.between(first_id, last_id))
+            .group_by(Review.target_user_id)
+        )
+        decayed_result = await self.db.execute(self._decayed_query(first_id, last_id, now))
+
+        computed: Dict[str, Dict] = {}
+        for row in exchanges_result.mappings().all():
+            computed[row["user_id"]] = self._empty_stats() | {
+                field: row[field] for field in ("exchanges_completed", *CATEGORY_FIELDS)
+            }
+        for row in ratings_result.mappings().all():
+            stats = computed.setdefault(row["user_id"], self._empty_stats())
+            stats.update({field: row[field] for field in ("total_ratings", *RATING_FIELDS)})
+        for row in decayed_result.mappings().all():
+            computed.setdefault(row["user_id"], self._empty_stats())["decayed_reputation"] = row["decayed_reputation"]
+
+        for stats in computed.values():
+            rating_sum = sum(stars * stats[field] for stars, field in enumerate(RATING_FIELDS, 1))
+            if stats["total_ratings"]:
+                stats["average_rating"] = round(rating_sum / stats["total_ratings"], 2)
+            stats["bayesian_rating"] = bayesian_rating(rating_sum, stats["total_ratings"])
+            stats["reputation"] = (
+                stats["exchanges_completed"] * self.gamification.REPUTATION_PER_EXCHANGE
+                + rating_sum * self.gamification.REPUTATION_PER_RATING_POINT
+            )
+            stats["level"], stats["experience"] = self._level_for(
+                stats["exchanges_completed"] * self.gamification.EXP_PER_EXCHANGE
+            )
+        return computed
+
+    def _decayed_query(self, first_id: str, last_id: str, now: datetime):
+        """Затухающая репутация на момент now: сумма начислений, каждое со своим затуханием"""
+        events = union_all(
+            *[
+                select(
+                    role.label("user_id"),
+                    Deal.updated_at.label("at"),
+                    literal(self.gamification.REPUTATION_PER_EXCHANGE).label("points"),
+                ).where(Deal.status == DealStatus.COMPLETED, role.between(first_id, last_id))
+                for role in (Deal.student_id, Deal.teacher_id)
+            ],
+            select(
+                Review.target_user_id,
+                Review.created_at,
+                Review.rating * self.gamification.REPUTATION_PER_RATING_POINT,
+            ).where(Review.target_user_id.between(first_id, last_id)),
+        ).subquery("events")
+
+        # Показатель экспоненты ограничен: exp() в PostgreSQL ошибается на underflow
+        elapsed = func.greatest(cast(func.extract("epoch", literal(now) - events.c.at), Float), 0.0)
+        return select(
+            events.c.user_id,
+            func.sum(
+                events.c.points * func.exp(-func.least(REPUTATION_DECAY_RATE * elapsed, 700.0))
+            ).label("decayed_reputation"),
+        ).group_by(events.c.user_id)
+
+    async def _current(self, first_id: str, last_id: str, now: datetime) -> Dict[str, Dict]:
+        result = await self.db.execute(
+            select(UserStats.user_id, UserStats.decayed_at, *[getattr(UserStats, field) for field in COMPARED_FIELDS])
+            .where(UserStats.user_id.between(first_id, last_id))
+        )
+        current = {}
+        for row in result.mappings().all():
+            stats = dict(row)
+            # Сохранённое значение отнесено к decayed_at — приводим к тому же моменту, что и пересчёт
+            stats["decayed_reputation"] = current_decayed_reputation(
+                stats["decayed_reputation"], stats.pop("decayed_at"), now
+            )
+            current[row["user_id"]] = stats
+        return current
+
+    def _diff(
+        self,
+        computed: Dict[str, Dict],
+        current: Dict[str, Dict],
+        report: Dict,
+        sample_size: int,
+        now: datetime
+    ) -> Tuple[List[Dict], List[Dict]]:
+        """Изменившиеся строки (для UPDATE) и недостающие строки (для INSERT)"""
+        changed, created = [], []
+        empty = self._empty_stats()
+
+        for user_id in computed.keys() | current.keys():
+            target = computed.get(user_id, empty)
+            existing = current.get(user_id)
+
+            if existing is None:
+                fields = [
+                    field for field in COMPARED_FIELDS
+                    if self._rounded(field, target[field]) != self._rounded(field, empty[field])
+                ]
+                if fields:
+                    created.append(self._with_decay_anchor(
+                        {"user_id": user_id, **{field: target[field] for field in COMPARED_FIELDS}}, now
+                    ))
+                    report["fields"].update(fields)
+                continue
+
+            fields = [
+                field for field in COMPARED_FIELDS
+                if self._rounded(field, existing[field]) != self._rounded(field, target[field])
+            ]
+            if not fields:
+                continue
+
+            changed.append(self._with_decay_anchor(
+                {"user_id": user_id, **{field: target[field] for field in fields}}, now
+            ))
+            report["fields"].update(fields)
+            if len(report["samples"]) < sample_size:
+                report["samples"].append({
+                    "user_id": user_id,
+                    **{field: (existing[field], target[field]) for field in fields}
+                })
+
+        return changed, created
+
+    def _level_for(self, total_experience: int) -> Tuple[int, int]:
+        """Уровень и остаток опыта для суммарного опыта (уровень L стоит L * EXP_PER_LEVEL)"""
+        level = 1
+        while total_experience >= level * self.gamification.EXP_PER_LEVEL:
+            total_experience -= level * self.gamification.EXP_PER_LEVEL
+            level += 1
+        return level, total_experience
+
+    @staticmethod
+    def _with_decay_anchor(row: Dict, now: datetime) -> Dict:
+        """Новая затухающая репутация пишется вместе с моментом отсчёта и trending_score"""
+        if "decayed_reputation" in row:
+            decayed = row["decayed_reputation"]
+            row["decayed_at"] = now
+            row["trending_score"] = (
+                math.log(decayed) + REPUTATION_DECAY_RATE * now.timestamp() if decayed > 0 else None
+            )
+        return row
+
+    @staticmethod
+    def _rounded(field: str, value):
+        return round(value, FLOAT_PRECISION[field]) if field in FLOAT_PRECISION else value
+
+    @staticmethod
+    def _empty_stats() -> Dict:
+        return {
+            "reputation": 0,
+            "exchanges_completed": 0,
+            "total_ratings": 0,
+            "average_rating": 0.0,
+            "level": 1,
+            "experience": 0,
+            **{field: 0 for field in RATING_FIELDS},
+            "bayesian_rating": bayesian_rating(0, 0),
+            **{field: 0 for field in CATEGORY_FIELDS},
+            "decayed_reputation": 0.0,
+        }
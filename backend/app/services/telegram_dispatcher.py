@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from app.config import settings
+from app.services.pubsub import pubsub_hub
+from app.services.rate_limit import Algorithm, RateLimit, rate_limiter
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Локальный token bucket с резервированием: reserve() сразу списывает
+    токен и возвращает, сколько секунд ждать, пока он накопится. Баланс может
+    уйти в минус, поэтому параллельные воркеры не превышают темп.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(wait, self.blocked_until - now)
+
+    def block(self, seconds: float):
+        """Ответ 429: до retry_after в этот чат не отправляем"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def is_idle(self) -> bool:
+        now = time.monotonic()
+        self._refill(now)
+        return self.tokens >= self.capacity and self.blocked_until <= now
+
+
+@dataclass
+class TelegramJob:
+    chat_id: str
+    text: str
+    parse_mode: str = "Markdown"
+    attempts: int = 0
+    reserved: bool = False
+    result: Optional[asyncio.Future] = None
+
+
+class TelegramDispatcher:
+    """
+    Очередь исходящих сообщений Telegram.
+
+    Обработчики запросов только ставят сообщение в очередь (enqueue) и не
+    ждут Telegram. Пул воркеров отправляет сообщения через общий пул
+    соединений бота, соблюдая лимиты Telegram: token bucket на каждый чат и
+    общий на бота (TELEGRAM_GLOBAL_RATE сообщений в секунду). Общий лимит
+    делится всеми процессами через token bucket в Redis (rate_limiter), а
+    локальный bucket ограничивает процесс, если Redis недоступен. Если чат
+    ещё не готов, сообщение откладывается, а воркер берёт следующее — один
+    активный чат не задерживает остальные.
+
+    На 429 сообщение повторяется через retry_after из ответа, а отправка
+    приостанавливается целиком: flood-лимит Telegram действует на бота, и
+    пауза рассылается остальным процессам через pub/sub. На сетевые ошибки
+    и 5xx — экспоненциальная задержка, не более TELEGRAM_MAX_ATTEMPTS попыток.
+    """
+
+    CHANNEL = "telegram:pause"
+
+    CHAT_BUCKETS_LIMIT = 10000
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._delayed: set = set()
+        self._global = TokenBucket(settings.TELEGRAM_GLOBAL_RATE, settings.TELEGRAM_GLOBAL_RATE)
+        self._global_rule = RateLimit(
+            "telegram:global", max(int(settings.TELEGRAM_GLOBAL_RATE), 1), 1, Algorithm.TOKEN_BUCKET
+        )
+        self._paused_until = 0.0
+        self._chats: Dict[str, TokenBucket] = {}
+        self._counters: Dict[str, int] = {"enqueued": 0, "rejected": 0, "sent": 0, "failed": 0, "retried": 0, "rate_limited": 0}
+        self.is_running = False
+
+    async def start(self):
+        if self.is_running:
+            return
+        self._queue = asyncio.Queue(maxsize=settings.TELEGRAM_QUEUE_SIZE)
+        self.is_running = True
+        self._workers = [asyncio.create_task(self._run()) for _ in range(settings.TELEGRAM_WORKERS)]
+        logger.info("Telegram dispatcher started")
+
+    async def stop(self):
+        self.is_running = False
+        for task in [*self._workers, *self._delayed]:
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._delayed, return_exceptions=True)
+        self._workers, self._delayed = [], set()
+        logger.info("Telegram dispatcher stopped")
+
+    def enqueue(self, chat_id: str, text: str, parse_mode: str = "Markdown") -> bool:
+        """Поставить сообщение в очередь. False, если диспетчер не запущен или очередь переполнена."""
+        return self._put(TelegramJob(str(chat_id), text, parse_mode))
+
+    async def send(
+        self, chat_id: str, text: str, parse_mode: str = "Markdown", timeout: Optional[float] = None
+    ) -> bool:
+        """
+        Поставить в очередь и дождаться результата доставки (не дольше
+        timeout, по умолчанию TELEGRAM_SEND_TIMEOUT) — для фоновых задач,
+        которым нужен ответ.
+        """
+        job = TelegramJob(str(chat_id), text, parse_mode, result=asyncio.get_running_loop().create_future())
+        if not self._put(job):
+            return False
+        try:
+            return await asyncio.wait_for(asyncio.shield(job.result), timeout or settings.TELEGRAM_SEND_TIMEOUT)
+        except asyncio.TimeoutError:
+            return False
+
+    def metrics(self) -> Dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "delayed": len(self._delayed),
+            **self._counters,
+        }
+
+    def _put(self, job: TelegramJob) -> bool:
+        if not self.is_running:
+            return False
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self._counters["rejected"] += 1
+            return False
+        self._counters["enqueued"] += 1
+        return True
+
+    async def _run(self):
+        while self.is_running:
+            job = await self._queue.get()
+            try:
+                await self._process(job)
+            except Exception as e:
+                logger.error(f"Telegram delivery to {job.chat_id} crashed: {e}")
+                self._finish(job, False)
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, job: TelegramJob):
+        if not job.reserved:
+            wait = self._chat_bucket(job.chat_id).reserve()
+            if wait > 0:
+                # Место в темпе чата уже занято за этим сообщением
+                job.reserved = True
+                self._delay(job, wait)
+                return
+        job.reserved = False
+
+        await self._acquire_global()
+
+        from app.telegram.bot import telegram_bot_instance
+        job.attempts += 1
+        delivered, retry_after = await telegram_bot_instance.deliver(job.chat_id, job.text, job.parse_mode)
+        if delivered:
+            self._counters["sent"] += 1
+            self._finish(job, True)
+            return
+
+        if retry_after is None or job.attempts >= settings.TELEGRAM_MAX_ATTEMPTS:
+            self._counters["failed"] += 1
+            self._finish(job, False)
+            return
+
+        if retry_after > 0:
+            self._counters["rate_limited"] += 1
+            self._chat_bucket(job.chat_id).block(retry_after)
+            await self._pause(retry_after)
+        else:
+            retry_after = random.uniform(0, min(30.0, 2 ** job.attempts))
+        self._counters["retried"] += 1
+        self._delay(job, retry_after)
+
+    async def _acquire_global(self):
+        """Дождаться паузы после 429 и места в общем темпе бота (процесса и всех процессов)"""
+        while True:
+            pause = self._paused_until - time.time()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            wait = self._global.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            result = await rate_limiter.hit(self._global_rule, "bot")
+            if result.allowed:
+                return
+            await asyncio.sleep(result.retry_after)
+
+    async def _pause(self, seconds: float):
+        until = time.time() + seconds
+        self._paused_until = max(self._paused_until, until)
+        await pubsub_hub.publish(self.CHANNEL, {"until": until})
+
+    async def _on_pause(self, data: dict):
+        self._paused_until = max(self._paused_until, float(data["until"]))
+
+    def _delay(self, job: TelegramJob, seconds: float):
+        task = asyncio.create_task(self._requeue(job, seconds))
+        self._delayed.add(task)
+        task.add_done_callback(self._delayed.discard)
+
+    async def _requeue(self, job: TelegramJob, seconds: float):
+        await asyncio.sleep(seconds)
+        await self._queue.put(job)
+
+    def _chat_bucket(self, chat_id: str) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.CHAT_BUCKETS_LIMIT:
+                for idle in [key for key, value in self._chats.items() if value.is_idle()]:
+                    del self._chats[idle]
+            bucket = self._chats[chat_id] = TokenBucket(settings.TELEGRAM_PER_CHAT_RATE, 1)
+        return bucket
+
+    @staticmethod
+    def _finish(job: TelegramJob, delivered: bool):
+        if job.result is not None and not job.result.done():
+            job.result.set_result(delivered)
+
+
+telegram_dispatcher = TelegramDispatcher()
+pubsub_hub.subscribe(TelegramDispatcher.CHANNEL, telegram_dispatcher._on_pause)
@@ -1,19 +1,37 @@
 import logging
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import json
 from app.config import settings
 from app.database import get_redis
+from app.services.telegram_dispatcher import telegram_dispatcher
 
 logger = logging.getLogger(__name__)
 
+SUBSCRIPTIONS_KEY = "telegram:subscriptions"
+LEGACY_SUBSCRIPTION_PREFIX = "telegram:subscription:"
+# Ставит скрипт migrate_telegram_subscriptions, когда старых ключей не осталось
+LEGACY_MIGRATED_KEY = "telegram:subscriptions:migrated"
+
+def announcement_text(title: str, content: str) -> str:
+    return f"📢 **{title}**\n\n{content}"
+
 class TelegramService:
+    """
+    Подписки хранятся в одном хэше telegram:subscriptions: поле — id
+    пользователя, значение — JSON с chat_id и временем подписки. Поиск по
+    пользователю — HGET, по пачке пользователей — один HMGET, число подписок —
+    HLEN, список для админки — постранично через HSCAN.
+
+    Пока не выполнен перенос (app.scripts.migrate_telegram_subscriptions),
+    чтение по пользователям дополнительно смотрит старые ключи
+    telegram:subscription:{user_id}, а подписка и отписка их удаляют, чтобы
+    перенос не вернул отменённую подписку. Число подписок и постраничный
+    список (админка, рассылка) видят только хэш.
+    """
+
     def __init__(self):
-        self.redis_key_prefix = "telegram:subscription:"
-    
-    def _get_user_key(self, user_id: int) -> str:
-        """Генерация ключа Redis для пользователя"""
-        return f"{self.redis_key_prefix}{user_id}"
-    
+        self._legacy_migrated = False
+
     async def subscribe_user(self, user_id: int, chat_id: str):
         """Подписка пользователя на уведомления"""
         redis_client = await get_redis()
@@ -24,118 +42,127 @@ class TelegramService:
             "subscribed_at": self._get_current_timestamp()
         }
         
-        await redis_client.set(
-            self._get_user_key(user_id),
-            json.dumps(subscription_data),
-            ex=60*60*24*30 
-        )
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.hset(SUBSCRIPTIONS_KEY, str(user_id), json.dumps(subscription_data))
+        pipe.delete(f"{LEGACY_SUBSCRIPTION_PREFIX}{user_id}")
+        await pipe.execute()
         
         logger.info(f"User {user_id} subscribed to Telegram notifications with chat_id {chat_id}")
     
     async def unsubscribe_user(self, user_id: int):
         """Отписка пользователя от уведомлений"""
         redis_client = await get_redis()
-        await redis_client.delete(self._get_user_key(user_id))
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.hdel(SUBSCRIPTIONS_KEY, str(user_id))
+        pipe.delete(f"{LEGACY_SUBSCRIPTION_PREFIX}{user_id}")
+        await pipe.execute()
         logger.info(f"User {user_id} unsubscribed from Telegram notifications")
     
     async def is_subscribed(self, user_id: int) -> bool:
         """Проверка подписки пользователя"""
-        redis_client = await get_redis()
-        subscription = await redis_client.get(self._get_user_key(user_id))
-        return subscription is not None
+        return await self.get_subscription_info(user_id) is not None
     
     async def get_chat_id(self, user_id: int) -> Optional[str]:
         """Получение chat_id пользователя"""
+        subscription = await self.get_subscription_info(user_id)
+        return subscription.get("chat_id") if subscription else None
+    
+    async def get_chat_ids(self, user_ids: List) -> Dict[str, str]:
+        """chat_id для пачки пользователей одним HMGET (неподписанные пропускаются)"""
+        if not user_ids:
+            return {}
+        fields = [str(user_id) for user_id in user_ids]
         redis_client = await get_redis()
-        subscription_data = await redis_client.get(self._get_user_key(user_id))
-        
-        if subscription_data:
-            data = json.loads(subscription_data)
-            return data.get("chat_id")
-        return None
+        values = await redis_client.hmget(SUBSCRIPTIONS_KEY, fields)
+        missing = [i for i, value in enumerate(values) if value is None]
+        if missing and await self._read_legacy(redis_client):
+            legacy = await redis_client.mget([f"{LEGACY_SUBSCRIPTION_PREFIX}{fields[i]}" for i in missing])
+            for i, value in zip(missing, legacy):
+                values[i] = value
+        return {
+            field: json.loads(value)["chat_id"]
+            for field, value in zip(fields, values) if value
+        }
     
     async def get_subscription_info(self, user_id: int) -> Optional[dict]:
         """Получение полной информации о подписке"""
         redis_client = await get_redis()
-        subscription_data = await redis_client.get(self._get_user_key(user_id))
+        subscription_data = await redis_client.hget(SUBSCRIPTIONS_KEY, str(user_id))
+        if subscription_data is None and await self._read_legacy(redis_client):
+            subscription_data = await redis_client.get(f"{LEGACY_SUBSCRIPTION_PREFIX}{user_id}")
         
         if subscription_data:
             return json.loads(subscription_data)
         return None
     
     async def send_message(self, chat_id: str, message: str, parse_mode: str = "Markdown") -> bool:
-        """Отправка сообщения пользователю через бота"""
-        from app.telegram.bot import telegram_bot_instance
-        return await telegram_bot_instance.send_message(chat_id, message, parse_mode)
+        """Постановка сообщения в очередь отправки (без ожидания Telegram)"""
+        return telegram_dispatcher.enqueue(chat_id, message, parse_mode)
     
     async def send_sms_code(self, user_id: int, phone: str, code: str):
-        """Отправка SMS кода через телеграм"""
-        if await self.is_subscribed(user_id):
-            chat_id = await self.get_chat_id(user_id)
-            if chat_id:
-                message = f"🔐 **Код подтверждения**\nДля номера: `{phone}`\n\nВаш код: `{code}`"
-                return await self.send_message(chat_id, message)
+        """Отправка SMS кода через телеграм (ждёт доставки: при неудаче код уходит по SMS)"""
+        chat_id = await self.get_chat_id(user_id)
+        if chat_id:
+            message = f"🔐 **Код подтверждения**\nДля номера: `{phone}`\n\nВаш код: `{code}`"
+            return await telegram_dispatcher.send(chat_id, message)
         return False
     
     async def send_new_message_notification(self, user_id: int, from_user: str, message_preview: str):
         """Уведомление о новом сообщении"""
-        if await self.is_subscribed(user_id):
-            chat_id = await self.get_chat_id(user_id)
-            if chat_id:
-                message = (
-                    f"💬 **Новое сообщение**\n"
-                    f"От: **{from_user}**\n"
-                    f"Сообщение: _{message_preview[:100]}..._"
-                )
-                return await self.send_message(chat_id, message)
+        chat_id = await self.get_chat_id(user_id)
+        if chat_id:
+            message = (
+                f"💬 **Новое сообщение**\n"
+                f"От: **{from_user}**\n"
+                f"Сообщение: _{message_preview[:100]}..._"
+            )
+            return await self.send_message(chat_id, message)
         return False
     
     async def send_deal_notification(self, user_id: int, deal_type: str, details: str):
         """Уведомление о сделке"""
-        if await self.is_subscribed(user_id):
-            chat_id = await self.get_chat_id(user_id)
-            if chat_id:
-                message = f"🤝 **{deal_type}**\n{details}"
-                return await self.send_message(chat_id, message)
+        chat_id = await self.get_chat_id(user_id)
+        if chat_id:
+            message = f"🤝 **{deal_type}**\n{details}"
+            return await self.send_message(chat_id, message)
         return False
     
     async def send_announcement(self, user_id: int, title: str, content: str):
         """Отправка объявления"""
-        if await self.is_subscribed(user_id):
-            chat_id = await self.get_chat_id(user_id)
-            if chat_id:
-                message = f"📢 **{title}**\n\n{content}"
-                return await self.send_message(chat_id, message)
+        chat_id = await self.get_chat_id(user_id)
+        if chat_id:
+            return await self.send_message(chat_id, announcement_text(title, content))
         return False
     
     async def send_gamification_notification(self, user_id: int, achievement: str, points: int):
         """Уведомление о геймификации"""
-        if await self.is_subscribed(user_id):
-            chat_id = await self.get_chat_id(user_id)
-            if chat_id:
-                message = f"🏆 **Новое достижение!**\n{achievement}\n🎯 +{points} очков!"
-                return await self.send_message(chat_id, message)
+        chat_id = await self.get_chat_id(user_id)
+        if chat_id:
+            message = f"🏆 **Новое достижение!**\n{achievement}\n🎯 +{points} очков!"
+            return await self.send_message(chat_id, message)
         return False
     
-    async def get_all_subscriptions(self) -> List[dict]:
-        """Получение всех подписок (для админки)"""
+    async def scan_subscriptions(self, cursor: int = 0, count: int = 100) -> Tuple[int, List[dict]]:
+        """
+        Страница подписок (для админки).
+        Returns: (следующий курсор, подписки); курсор 0 — страниц больше нет.
+        count — подсказка HSCAN, размер страницы может немного отличаться.
+        """
         redis_client = await get_redis()
-        keys = await redis_client.keys(f"{self.redis_key_prefix}*")
-        subscriptions = []
-        
-        for key in keys:
-            data = await redis_client.get(key)
-            if data:
-                subscriptions.append(json.loads(data))
-        
-        return subscriptions
+        next_cursor, page = await redis_client.hscan(SUBSCRIPTIONS_KEY, cursor=cursor, count=count)
+        return next_cursor, [json.loads(value) for value in page.values()]
     
     async def get_subscriptions_count(self) -> int:
         """Получение количества подписок"""
         redis_client = await get_redis()
-        keys = await redis_client.keys(f"{self.redis_key_prefix}*")
-        return len(keys)
+        return await redis_client.hlen(SUBSCRIPTIONS_KEY)
     
+    async def _read_legacy(self, redis_client) -> bool:
+        """Нужно ли смотреть старые ключи: да, пока перенос не отмечен выполненным"""
+        if not self._legacy_migrated:
+            self._legacy_migrated = bool(await redis_client.exists(LEGACY_MIGRATED_KEY))
+        return not self._legacy_migrated
+
     def _get_current_timestamp(self) -> str:
         """Получение текущего времени в строковом формате"""
         from datetime import datetime
@@ -0,0 +1,170 @@
+import logging
+import time
+from typing import Dict, Optional, Tuple
+from uuid import uuid4
+
+from fastapi import Depends
+from redis.asyncio import Redis
+
+from app.config import settings
+from app.database import get_redis
+from app.models.user import User
+from app.schemas.auth import TokenPayload
+from app.services.auth import create_tokens
+from app.services.pubsub import pubsub_hub
+
+logger = logging.getLogger(__name__)
+
+FAMILY_KEY = "auth:refresh:family:{}"
+USER_FAMILIES_KEY = "auth:refresh:user:{}"
+REVOKED_KEY = "auth:revoked"
+
+ROTATED, UNKNOWN, ALREADY_ROTATED, REUSED = 1, 0, 2, -1
+
+# Rotate a refresh token family: the presented jti must be the current one.
+# The previous jti presented within the grace period is a concurrent refresh
+# (e.g. two tabs) and is rejected without revoking; any other stale jti means
+# the token was replayed, so the whole family is destroyed.
+ROTATE_SCRIPT = """
+local family = redis.call('HMGET', KEYS[1], 'jti', 'prev', 'rotated_at')
+if not family[1] then
+    return 0
+end
+if family[1] == ARGV[1] then
+    local now = redis.call('TIME')[1]
+    redis.call('HSET', KEYS[1], 'jti', ARGV[2], 'prev', ARGV[1], 'rotated_at', now)
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+    return 1
+end
+if family[2] == ARGV[1] and tonumber(redis.call('TIME')[1]) - tonumber(family[3]) <= tonumber(ARGV[4]) then
+    return 2
+end
+redis.call('DEL', KEYS[1])
+return -1
+"""
+
+
+class RefreshTokenStore:
+    """
+    Refresh token families in Redis.
+
+    Each login creates a family (auth:refresh:family:{id}) holding the jti of
+    the only refresh token currently valid for it. Refreshing atomically swaps
+    the jti (ROTATE_SCRIPT); presenting an already rotated token is treated as
+    theft: the family is deleted and the user's access tokens are revoked.
+    """
+
+    def __init__(self, redis: Redis):
+        self.redis = redis
+        self.ttl = settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60
+        self._rotate = redis.register_script(ROTATE_SCRIPT)
+
+    async def issue(self, user: User) -> Tuple[str, int, str, int]:
+        """Start a new family for a fresh login. Returns the same tuple as create_tokens."""
+        family, jti = uuid4().hex, uuid4().hex
+        user_families = USER_FAMILIES_KEY.format(user.id)
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hset(FAMILY_KEY.format(family), mapping={"jti": jti, "user_id": str(user.id)})
+        pipe.expire(FAMILY_KEY.format(family), self.ttl)
+        pipe.sadd(user_families, family)
+        pipe.expire(user_families, self.ttl)
+        await pipe.execute()
+        return create_tokens(user, family, jti)
+
+    async def rotate(self, user: User, payload: TokenPayload) -> Tuple[Optional[Tuple[str, int, str, int]], Optional[str]]:
+        """
+        Exchange a refresh token for a new pair.
+        Returns: (tokens, error)
+        """
+        if not payload.fam or not payload.jti:
+            return None, "Refresh token is no longer valid"
+
+        new_jti = uuid4().hex
+        status = await self._rotate(
+            keys=[FAMILY_KEY.format(payload.fam)],
+            args=[payload.jti, new_jti, self.ttl, settings.REFRESH_REUSE_GRACE_SECONDS]
+        )
+        if status == ROTATED:
+            return create_tokens(user, payload.fam, new_jti), None
+        if status == ALREADY_ROTATED:
+            return None, "Refresh token already rotated"
+        if status == REUSED:
+            logger.warning(f"Refresh token reuse detected for user {payload.sub}, revoking sessions")
+            await self.revoke_user(payload.sub)
+        return None, "Refresh token is no longer valid"
+
+    async def revoke_family(self, family: str):
+        """Invalidate one login session (logout)."""
+        await self.redis.delete(FAMILY_KEY.format(family))
+
+    async def revoke_user(self, user_id: str):
+        """Invalidate all refresh tokens of the user and every access token issued so far."""
+        user_families = USER_FAMILIES_KEY.format(user_id)
+        families = await self.redis.smembers(user_families)
+        await self.redis.delete(user_families, *[FAMILY_KEY.format(family) for family in families])
+        await revocations.revoke(user_id)
+
+
+def get_token_store(redis: Redis = Depends(get_redis)) -> RefreshTokenStore:
+    """DI for the refresh token store."""
+    return RefreshTokenStore(redis)
+
+
+class TokenRevocations:
+    """
+    In-memory map user_id -> issued-before timestamp.
+
+    Access tokens are stateless, so revoking them means rejecting tokens with
+    iat older than the user's revocation time. The map is checked on every
+    request without I/O; changes are written to the auth:revoked hash (read on
+    startup) and broadcast to other workers via the pub/sub hub. Entries older
+    than the access token lifetime are dropped: such tokens have expired anyway.
+    """
+
+    CHANNEL = "auth:revocations"
+
+    def __init__(self):
+        self._issued_before: Dict[str, float] = {}
+        self.lifetime = settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
+    def is_revoked(self, payload: TokenPayload) -> bool:
+        before = self._issued_before.get(payload.sub)
+        if before is None:
+            return False
+        if before + self.lifetime < time.time():
+            self._issued_before.pop(payload.sub, None)
+            return False
+        # Tokens issued before iat was added to the claims are treated as old
+        return (payload.iat or 0) <= before
+
+    async def revoke(self, user_id: str):
+        """Reject tokens of the user issued up to now in all workers."""
+        before = time.time()
+        self._apply(user_id, before)
+        redis_client = await get_redis()
+        await redis_client.hset(REVOKED_KEY, user_id, before)
+        await pubsub_hub.publish(self.CHANNEL, {"user_id": user_id, "before": before})
+
+    async def load(self) -> int:
+        """Read current revocations on startup and prune expired ones. Returns the number loaded."""
+        redis_client = await get_redis()
+        cutoff = time.time() - self.lifetime
+        expired = []
+        for user_id, before in (await redis_client.hgetall(REVOKED_KEY)).items():
+            if float(before) < cutoff:
+                expired.append(user_id)
+            else:
+                self._apply(user_id, float(before))
+        if expired:
+            await redis_client.hdel(REVOKED_KEY, *expired)
+        return len(self._issued_before)
+
+    def _apply(self, user_id: str, before: float):
+        self._issued_before[user_id] = max(before, self._issued_before.get(user_id, 0.0))
+
+    async def _on_revoke(self, data: dict):
+        self._apply(data["user_id"], float(data["before"]))
+
+
+revocations = TokenRevocations()
+pubsub_hub.subscribe(TokenRevocations.CHANNEL, revocations._on_revoke)
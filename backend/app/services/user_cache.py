@@ -0,0 +1,164 @@
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.config import settings
+from app.database import get_redis
+from app.models.user import User, UserProfile, UserRole
+from app.services.pubsub import pubsub_hub
+
+logger = logging.getLogger(__name__)
+
+USER_KEY = "auth:user:{}"
+GENERATION_KEY = "auth:user:{}:gen"
+
+USER_FIELDS = ("id", "phone", "is_active")
+PROFILE_FIELDS = (
+    "id", "user_id", "first_name", "last_name", "avatar_url", "bio", "university", "faculty", "year",
+    "rating", "total_ratings", "exchanges_completed", "reviews_received",
+)
+
+# Записать снимок, только если пользователя не инвалидировали, пока он читался из БД
+FILL_SCRIPT = """
+local generation = redis.call('GET', KEYS[2]) or ''
+if generation ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+
+class UserCache:
+    """
+    Кэш аутентифицированного пользователя для get_current_user.
+
+    Два уровня: LRU в памяти процесса с коротким TTL перед снимком в Redis
+    (роль, флаг активности, профиль). При промахе обоих уровней пользователь
+    читается из БД вместе с профилем. Блокировка, разблокировка и правка
+    профиля вызывают invalidate(): ключ в Redis удаляется, а остальные
+    процессы сбрасывают локальную копию по сообщению в pub/sub; локальный TTL
+    ограничивает устаревание, если сообщение потеряется.
+
+    Из кэша возвращается несвязанный с сессией User с профилем — только для
+    чтения. Изменять профиль нужно через объект, загруженный в сессию.
+    """
+
+    CHANNEL = "auth:user_cache"
+
+    def __init__(self):
+        self._local: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._fill = None
+        self.ttl = settings.USER_CACHE_TTL
+        self.local_ttl = settings.USER_CACHE_LOCAL_TTL
+        self.local_size = settings.USER_CACHE_LOCAL_SIZE
+
+    async def get(self, user_id: str, db: AsyncSession) -> Optional[User]:
+        """Пользователь по id или None, если его нет"""
+        snapshot = self._get_local(user_id)
+        if snapshot is not None:
+            return self._build(snapshot)
+
+        generation = None
+        redis_client = None
+        try:
+            redis_client = await get_redis()
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.get(USER_KEY.format(user_id))
+            pipe.get(GENERATION_KEY.format(user_id))
+            cached, generation = await pipe.execute()
+            if cached is not None:
+                snapshot = json.loads(cached)
+                self._put_local(user_id, snapshot)
+                return self._build(snapshot)
+        except Exception as e:
+            logger.error(f"User cache read failed: {e}")
+
+        result = await db.execute(select(User).options(selectinload(User.profile)).where(User.id == user_id))
+        user = result.scalar_one_or_none()
+        if user is None:
+            return None
+
+        snapshot = self._snapshot(user)
+        self._put_local(user_id, snapshot)
+        if redis_client is not None:
+            await self._store(redis_client, user_id, generation, snapshot)
+        return user
+
+    async def invalidate(self, *user_ids: str):
+        """Сбросить пользователей во всех процессах (после коммита изменений)"""
+        if not user_ids:
+            return
+        user_ids = list(set(user_ids))
+        self._drop_local(user_ids)
+        try:
+            redis_client = await get_redis()
+            pipe = redis_client.pipeline(transaction=False)
+            for user_id in user_ids:
+                pipe.delete(USER_KEY.format(user_id))
+                pipe.incr(GENERATION_KEY.format(user_id))
+                pipe.expire(GENERATION_KEY.format(user_id), self.ttl)
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"User cache invalidation failed: {e}")
+        await pubsub_hub.publish(self.CHANNEL, {"user_ids": user_ids})
+
+    async def _on_invalidate(self, data: dict):
+        self._drop_local(data.get("user_ids", []))
+
+    async def _store(self, redis_client, user_id: str, generation, snapshot: Dict):
+        try:
+            if self._fill is None:
+                self._fill = redis_client.register_script(FILL_SCRIPT)
+            await self._fill(
+                keys=[USER_KEY.format(user_id), GENERATION_KEY.format(user_id)],
+                args=[generation or "", json.dumps(snapshot), self.ttl]
+            )
+        except Exception as e:
+            logger.error(f"User cache write failed: {e}")
+
+    def _get_local(self, user_id: str) -> Optional[Dict]:
+        entry = self._local.get(user_id)
+        if entry is None:
+            return None
+        expires_at, snapshot = entry
+        if expires_at < time.monotonic():
+            del self._local[user_id]
+            return None
+        self._local.move_to_end(user_id)
+        return snapshot
+
+    def _put_local(self, user_id: str, snapshot: Dict):
+        self._local[user_id] = (time.monotonic() + self.local_ttl, snapshot)
+        self._local.move_to_end(user_id)
+        while len(self._local) > self.local_size:
+            self._local.popitem(last=False)
+
+    def _drop_local(self, user_ids):
+        for user_id in user_ids:
+            self._local.pop(user_id, None)
+
+    @staticmethod
+    def _snapshot(user: User) -> Dict:
+        profile = user.profile
+        return {
+            **{field: getattr(user, field) for field in USER_FIELDS},
+            "role": user.role.value,
+            "profile": {field: getattr(profile, field) for field in PROFILE_FIELDS} if profile else None,
+        }
+
+    @staticmethod
+    def _build(snapshot: Dict) -> User:
+        user = User(**{field: snapshot[field] for field in USER_FIELDS}, role=UserRole(snapshot["role"]))
+        user.profile = UserProfile(**snapshot["profile"]) if snapshot["profile"] else None
+        return user
+
+
+user_cache = UserCache()
+pubsub_hub.subscribe(UserCache.CHANNEL, user_cache._on_invalidate)
@@ -1,5 +1,7 @@
 import logging
 import asyncio
+from typing import Optional, Tuple
+import httpx
 from app.config import settings
 
 logger = logging.getLogger(__name__)
@@ -12,7 +14,18 @@ class SimpleTelegramBot:
         else:
             self.base_url = None
         self._user_chat_ids = {}
+        self._client: Optional[httpx.AsyncClient] = None
         self.is_running = False
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Общий пул соединений с api.telegram.org для опроса и отправки"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(15.0),
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20)
+            )
+        return self._client
         
     async def start(self):
         """Запуск бота в фоновом режиме"""
@@ -28,6 +41,9 @@ class SimpleTelegramBot:
     async def stop(self):
         """Остановка бота"""
         self.is_running = False
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
         logger.info("🤖 Simple Telegram Bot stopped")
     
     async def _poll_updates(self):
@@ -48,9 +64,7 @@ class SimpleTelegramBot:
         """Получить обновления от Telegram"""
         if not self.token:
             return []
-            
-        import httpx
-        
+
         url = f"{self.base_url}/getUpdates"
         params = {
             "offset": offset,
@@ -59,21 +73,20 @@ class SimpleTelegramBot:
         }
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, params=params, timeout=15.0)
-                if response.status_code == 200:
-                    data = response.json()
-                    if not data.get('ok'):
-                        logger.error(f"❌ Telegram API error: {data}")
-                        return []
-                    
-                    updates = data.get('result', [])
-                    if updates:
-                        logger.info(f"✅ Received {len(updates)} updates")
-                    return updates
-                else:
-                    logger.error(f"❌ HTTP error {response.status_code}: {response.text}")
+            response = await self.client.get(url, params=params, timeout=15.0)
+            if response.status_code == 200:
+                data = response.json()
+                if not data.get('ok'):
+                    logger.error(f"❌ Telegram API error: {data}")
                     return []
+                
+                updates = data.get('result', [])
+                if updates:
+                    logger.info(f"✅ Received {len(updates)} updates")
+                return updates
+            else:
+                logger.error(f"❌ HTTP error {response.status_code}: {response.text}")
+                return []
         except httpx.ConnectTimeout:
             logger.debug("⏱️  Connection timeout (normal for polling)")
             return []
@@ -154,12 +167,19 @@ class SimpleTelegramBot:
     
     async def _send_message(self, chat_id, text, parse_mode="Markdown"):
         """Отправить сообщение через HTTP API"""
+        delivered, _ = await self.deliver(chat_id, text, parse_mode)
+        return delivered
+
+    async def deliver(self, chat_id, text, parse_mode="Markdown") -> Tuple[bool, Optional[float]]:
+        """
+        Один вызов sendMessage.
+        Returns: (доставлено, через сколько секунд повторить) — None, если
+        повтор бессмысленен (нет токена, чат недоступен, неверный запрос)
+        """
         if not self.token:
             logger.warning("Cannot send message - TELEGRAM_BOT_TOKEN not set")
-            return False
-            
-        import httpx
-        
+            return False, None
+
         url = f"{self.base_url}/sendMessage"
         payload = {
             "chat_id": chat_id,
@@ -168,18 +188,23 @@ class SimpleTelegramBot:
         }
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, json=payload)
-                if response.status_code == 200:
-                    logger.info(f"📨 Message sent to {chat_id}")
-                    return True
-                else:
-                    error_text = await response.text()
-                    logger.error(f"Failed to send message to {chat_id}: {error_text}")
-                    return False
+            response = await self.client.post(url, json=payload)
         except Exception as e:
             logger.error(f"Error sending message to {chat_id}: {e}")
-            return False
+            return False, 0.0
+
+        if response.status_code == 200:
+            logger.info(f"📨 Message sent to {chat_id}")
+            return True, None
+        if response.status_code == 429:
+            try:
+                retry_after = float(response.json().get("parameters", {}).get("retry_after", 1))
+            except Exception:
+                retry_after = 1.0
+            logger.warning(f"Telegram rate limit for {chat_id}, retry after {retry_after}s")
+            return False, retry_after
+        logger.error(f"Failed to send message to {chat_id}: {response.text}")
+        return False, (0.0 if response.status_code >= 500 else None)
     
     def subscribe_user(self, user_id, chat_id):
         """Подписать пользователя на уведомления"""
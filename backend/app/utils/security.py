@@ -8,25 +8,34 @@ import secrets
 def create_access_token(user_id: str, role: str) -> tuple[str, int]:
     """Create JWT access token. Returns (token, expires_in_seconds)."""
     expires_delta = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    expire = datetime.now(timezone.utc) + expires_delta
+    now = datetime.now(timezone.utc)
+    expire = now + expires_delta
     
     payload = {
         "sub": user_id,
         "role": role,
+        "iat": now.timestamp(),
         "exp": expire.timestamp(), 
         "type": "access"
     }
     token = jwt.encode(payload, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return token, int(expires_delta.total_seconds())
 
-def create_refresh_token(user_id: str, role: str) -> tuple[str, int]:
-    """Create JWT refresh token. Returns (token, expires_in_seconds)."""
+def create_refresh_token(user_id: str, role: str, family: str, jti: str) -> tuple[str, int]:
+    """
+    Create JWT refresh token. Returns (token, expires_in_seconds).
+    family identifies the login session, jti the current token in its rotation chain.
+    """
     expires_delta = timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
-    expire = datetime.now(timezone.utc) + expires_delta
+    now = datetime.now(timezone.utc)
+    expire = now + expires_delta
     
     payload = {
         "sub": user_id,
         "role": role,
+        "jti": jti,
+        "fam": family,
+        "iat": now.timestamp(),
         "exp": expire.timestamp(),
         "type": "refresh"
     }
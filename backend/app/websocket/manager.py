@@ -1,8 +1,13 @@
-from typing import Dict, Set
+from typing import Dict, Set, Optional
 from fastapi import WebSocket
 import json
 import datetime
 
+from app.services.pubsub import pubsub_hub
+
+# Канал Redis, через который события чатов расходятся по всем воркерам
+BACKPLANE_CHANNEL = "ws:chat"
+
 
 class ConnectionManager:
     def __init__(self):
@@ -52,25 +57,39 @@ class ConnectionManager:
         }
         await self.broadcast_to_chat(json.dumps(message), chat_id)
 
-    async def send_deal_update(self, chat_id: int, deal_data: dict):
+    async def publish_to_chat(self, message: dict, chat_id: int):
+        """Разослать сообщение в чат на всех воркерах (через Redis backplane)"""
+        if pubsub_hub.is_running:
+            if await pubsub_hub.publish(BACKPLANE_CHANNEL, {"chat_id": chat_id, "message": message}):
+                return
+        await self.broadcast_to_chat(json.dumps(message), chat_id)
+
+    async def deliver_from_backplane(self, data: dict):
+        """Обработчик backplane: доставить сообщение локальным соединениям чата"""
+        await self.broadcast_to_chat(json.dumps(data["message"]), data["chat_id"])
+
+    async def send_deal_update(self, chat_id: int, deal_data: dict, event_id: Optional[int] = None):
         message = {
             "type": "deal_update",
+            "event_id": event_id,
             "data": deal_data
         }
-        await self.broadcast_to_chat(json.dumps(message), chat_id)
+        await self.publish_to_chat(message, chat_id)
 
-    async def send_deal_proposal(self, chat_id: int, proposal_data: dict, user_id: int):
+    async def send_deal_proposal(self, chat_id: int, proposal_data: dict, user_id: int, event_id: Optional[int] = None):
         message = {
             "type": "deal_proposal", 
+            "event_id": event_id,
             "chat_id": chat_id,
             "user_id": user_id,
             "data": proposal_data
         }
-        await self.broadcast_to_chat(json.dumps(message), chat_id)
+        await self.publish_to_chat(message, chat_id)
 
-    async def send_deal_status_change(self, chat_id: int, old_status: str, new_status: str, user_id: int, reason: str = None):
+    async def send_deal_status_change(self, chat_id: int, old_status: str, new_status: str, user_id: int, reason: str = None, event_id: Optional[int] = None):
         message = {
             "type": "deal_status_change",
+            "event_id": event_id,
             "chat_id": chat_id,
             "user_id": user_id,
             "data": {
@@ -80,7 +99,7 @@ class ConnectionManager:
                 "timestamp": datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ')
             }
         }
-        await self.broadcast_to_chat(json.dumps(message), chat_id)
+        await self.publish_to_chat(message, chat_id)
 
     def _get_user_id_by_connection(self, websocket: WebSocket) -> int:
         for user_id, connections in self.user_connections.items():
@@ -89,4 +108,5 @@ class ConnectionManager:
         return None
 
 
-manager = ConnectionManager()
\ No newline at end of file
+manager = ConnectionManager()
+pubsub_hub.subscribe(BACKPLANE_CHANNEL, manager.deliver_from_backplane)
@@ -0,0 +1,31 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+
+@pytest.fixture
+def redis_run(monkeypatch):
+    """
+    Run scenario(redis) on a fresh fakeredis with Lua support.
+
+    Modules passed after the scenario get their get_redis patched to return
+    the same client, so services that look Redis up themselves use it too.
+    """
+    def run(scenario, *modules):
+        async def main():
+            client = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+            async def get_redis():
+                return client
+
+            for module in modules:
+                monkeypatch.setattr(module, "get_redis", get_redis)
+            try:
+                return await scenario(client)
+            finally:
+                await client.aclose()
+
+        return asyncio.run(main())
+
+    return run
@@ -0,0 +1,62 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import app.services.ad_views as ad_views_module
+from app.services.ad_views import STATS_KEY, AdViewCounter
+
+
+def test_failed_db_flush_is_retried_without_recounting_redis(redis_run, monkeypatch):
+    async def scenario(redis):
+        counter = AdViewCounter()
+        saved = []
+        failures = [RuntimeError("db down")]
+
+        async def flush_db(views):
+            if failures:
+                raise failures.pop()
+            saved.append(dict(views))
+
+        monkeypatch.setattr(counter, "_flush_db", flush_db)
+        day = datetime.now(timezone.utc).strftime("%Y%m%d")
+
+        counter.record_view("ad1", "viewer1")
+        with pytest.raises(RuntimeError):
+            await counter.flush()
+        assert await counter.flush() == 1
+
+        assert await redis.hget(STATS_KEY.format("ad1"), f"views:{day}") == "1"
+        assert saved == [{"ad1": 1}]
+
+        # Views recorded after the failure are written to both stores once
+        counter.record_view("ad1", "viewer2")
+        await counter.flush()
+        assert await redis.hget(STATS_KEY.format("ad1"), f"views:{day}") == "2"
+        assert saved == [{"ad1": 1}, {"ad1": 1}]
+
+    redis_run(scenario, ad_views_module)
+
+
+def test_failed_db_flush_merges_with_new_views(redis_run, monkeypatch):
+    async def scenario(redis):
+        counter = AdViewCounter()
+        saved = []
+        failures = [RuntimeError("db down")]
+
+        async def flush_db(views):
+            if failures:
+                raise failures.pop()
+            saved.append(dict(views))
+
+        monkeypatch.setattr(counter, "_flush_db", flush_db)
+
+        counter.record_view("ad1", "viewer1")
+        with pytest.raises(RuntimeError):
+            await counter.flush()
+        counter.record_view("ad1", "viewer2")
+        counter.record_view("ad2", "viewer2")
+        await counter.flush()
+
+        assert saved == [{"ad1": 2, "ad2": 1}]
+
+    redis_run(scenario, ad_views_module)
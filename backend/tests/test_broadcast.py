@@ -0,0 +1,131 @@
+import json
+
+import pytest
+
+import app.services.broadcast as broadcast_module
+import app.services.telegram_service as telegram_service_module
+from app.services.broadcast import (
+    ACTIVE_KEY, CHECKPOINT_SCRIPT, JOB_KEY, LOCK_KEY, TelegramBroadcast
+)
+from app.services.telegram_service import SUBSCRIPTIONS_KEY
+
+MODULES = (broadcast_module, telegram_service_module)
+JOB = JOB_KEY.format("job1")
+
+
+async def running_job(redis, owner="me"):
+    await redis.hset(JOB, mapping={
+        "id": "job1", "title": "t", "content": "c", "status": "running", "cursor": 0,
+        "total": 3, "sent": 0, "failed": 0, "created_at": 0, "updated_at": 0,
+    })
+    await redis.set(ACTIVE_KEY, "job1")
+    await redis.set(broadcast_module.CURRENT_KEY, "job1")
+    if owner:
+        await redis.set(LOCK_KEY, owner)
+    return redis.register_script(CHECKPOINT_SCRIPT)
+
+
+def checkpoint_args(cursor, sent=1, failed=0, owner="me"):
+    return [owner, sent, failed, cursor, 1, "job1", 3600]
+
+
+def test_checkpoint_without_lock_writes_nothing(redis_run):
+    async def scenario(redis):
+        checkpoint = await running_job(redis, owner="other")
+
+        status = await checkpoint(keys=[LOCK_KEY, JOB, ACTIVE_KEY], args=checkpoint_args(42))
+        assert status is None
+        job = await redis.hgetall(JOB)
+        assert (job["sent"], job["cursor"], job["status"]) == ("0", "0", "running")
+
+    redis_run(scenario)
+
+
+def test_checkpoint_at_cursor_zero_completes_job(redis_run):
+    async def scenario(redis):
+        checkpoint = await running_job(redis)
+
+        assert await checkpoint(keys=[LOCK_KEY, JOB, ACTIVE_KEY], args=checkpoint_args(42, sent=2)) == "running"
+        assert await redis.get(ACTIVE_KEY) == "job1"
+
+        assert await checkpoint(keys=[LOCK_KEY, JOB, ACTIVE_KEY], args=checkpoint_args(0, failed=1)) == "completed"
+        job = await redis.hgetall(JOB)
+        assert (job["status"], job["sent"], job["failed"]) == ("completed", "3", "1")
+        assert await redis.get(ACTIVE_KEY) is None
+        assert 0 < await redis.ttl(JOB) <= 3600
+
+    redis_run(scenario)
+
+
+def test_cancel_stops_job_at_next_checkpoint(redis_run):
+    async def scenario(redis):
+        checkpoint = await running_job(redis)
+
+        progress = await TelegramBroadcast().cancel()
+        assert progress["status"] == "cancelled"
+        assert await redis.get(ACTIVE_KEY) is None
+
+        assert await checkpoint(keys=[LOCK_KEY, JOB, ACTIVE_KEY], args=checkpoint_args(42)) == "cancelled"
+        assert await redis.hget(JOB, "status") == "cancelled"
+
+    redis_run(scenario, *MODULES)
+
+
+def test_cancel_does_not_overwrite_completed(redis_run):
+    async def scenario(redis):
+        checkpoint = await running_job(redis)
+        await checkpoint(keys=[LOCK_KEY, JOB, ACTIVE_KEY], args=checkpoint_args(0))
+
+        progress = await TelegramBroadcast().cancel()
+        assert progress["status"] == "completed"
+
+    redis_run(scenario, *MODULES)
+
+
+def test_create_allows_one_active_job(redis_run, monkeypatch):
+    monkeypatch.setattr(broadcast_module.telegram_dispatcher, "is_running", True)
+
+    async def scenario(redis):
+        broadcast = TelegramBroadcast()
+
+        async def resume():
+            pass
+
+        monkeypatch.setattr(broadcast, "resume", resume)
+        first = await broadcast.create("t", "c", "admin")
+        assert first["status"] == "running"
+        with pytest.raises(ValueError):
+            await broadcast.create("t2", "c2", "admin")
+        assert await redis.get(ACTIVE_KEY) == first["id"]
+
+    redis_run(scenario, *MODULES)
+
+
+def test_send_job_sends_every_page_and_completes(redis_run, monkeypatch):
+    sent = []
+
+    async def send(chat_id, text, parse_mode="Markdown", timeout=None):
+        sent.append(chat_id)
+        return chat_id != "bad"
+
+    monkeypatch.setattr(broadcast_module.telegram_dispatcher, "send", send)
+
+    async def scenario(redis):
+        chats = ["100", "200", "bad"]
+        await redis.hset(SUBSCRIPTIONS_KEY, mapping={
+            f"u{i}": json.dumps({"chat_id": chat_id}) for i, chat_id in enumerate(chats)
+        })
+        await running_job(redis, owner=None)
+
+        broadcast = TelegramBroadcast()
+        broadcast.page_size = 1
+        broadcast.is_running = True
+        await redis.set(LOCK_KEY, broadcast._owner)
+        await broadcast._send_job("job1")
+
+        assert sorted(sent) == sorted(chats)
+        progress = await broadcast.get_progress("job1")
+        assert (progress["status"], progress["sent"], progress["failed"]) == ("completed", 2, 1)
+        assert await redis.get(LOCK_KEY) is None
+
+    redis_run(scenario, *MODULES)
@@ -0,0 +1,95 @@
+import asyncio
+
+import app.services.profile_cache as profile_cache_module
+from app.services.profile_cache import FILL_SCRIPT, GENERATION_KEY, METRICS_KEY, PROFILE_KEY, ProfileCache
+
+KEYS = [PROFILE_KEY.format("u1"), GENERATION_KEY.format("u1")]
+
+
+def test_fill_writes_when_generation_unchanged(redis_run):
+    async def scenario(redis):
+        fill = redis.register_script(FILL_SCRIPT)
+        assert await fill(keys=KEYS, args=["", "{}", 60]) == 1
+        assert await redis.get(KEYS[0]) == "{}"
+        assert 0 < await redis.ttl(KEYS[0]) <= 60
+
+    redis_run(scenario)
+
+
+def test_fill_skips_after_invalidation(redis_run):
+    async def scenario(redis):
+        fill = redis.register_script(FILL_SCRIPT)
+        # Read at generation "" and invalidated while the document was built
+        await redis.incr(KEYS[1])
+        assert await fill(keys=KEYS, args=["", "stale", 60]) == 0
+        assert await redis.get(KEYS[0]) is None
+
+        assert await fill(keys=KEYS, args=["1", "fresh", 60]) == 1
+        assert await redis.get(KEYS[0]) == "fresh"
+
+    redis_run(scenario)
+
+
+def test_get_counts_misses_and_hits(redis_run):
+    async def scenario(redis):
+        cache = ProfileCache()
+        calls = []
+
+        async def loader():
+            calls.append(1)
+            return '{"id": "u1"}'
+
+        assert await cache.get("u1", loader) == '{"id": "u1"}'
+        assert await cache.get("u1", loader) == '{"id": "u1"}'
+        assert len(calls) == 1
+        assert await redis.hgetall(METRICS_KEY) == {"requests": "2", "misses": "1"}
+
+    redis_run(scenario, profile_cache_module)
+
+
+def test_get_counts_miss_when_loader_fails(redis_run):
+    async def scenario(redis):
+        cache = ProfileCache()
+
+        async def loader():
+            raise RuntimeError("db down")
+
+        try:
+            await cache.get("u1", loader)
+        except RuntimeError:
+            pass
+        assert await redis.hget(METRICS_KEY, "misses") == "1"
+
+    redis_run(scenario, profile_cache_module)
+
+
+def test_invalidate_during_load_keeps_stale_document_out(redis_run):
+    async def scenario(redis):
+        cache = ProfileCache()
+
+        async def loader():
+            await cache.invalidate("u1")
+            return "stale"
+
+        assert await cache.get("u1", loader) == "stale"
+        assert await redis.get(PROFILE_KEY.format("u1")) is None
+
+    redis_run(scenario, profile_cache_module)
+
+
+def test_concurrent_misses_load_once(redis_run):
+    async def scenario(redis):
+        cache = ProfileCache()
+        calls = []
+
+        async def loader():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "doc"
+
+        results = await asyncio.gather(*[cache.get("u1", loader) for _ in range(5)])
+        assert results == ["doc"] * 5
+        assert len(calls) == 1
+        assert cache.coalesced == 4
+
+    redis_run(scenario, profile_cache_module)
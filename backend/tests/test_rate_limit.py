@@ -0,0 +1,88 @@
+import asyncio
+
+import app.services.rate_limit as rate_limit_module
+from app.services.rate_limit import (
+    SLIDING_WINDOW_SCRIPT, TOKEN_BUCKET_SCRIPT, Algorithm, RateLimit, RateLimiter
+)
+
+KEYS = ["ratelimit:test:client"]
+
+
+def test_sliding_window_allows_up_to_limit(redis_run):
+    async def scenario(redis):
+        script = redis.register_script(SLIDING_WINDOW_SCRIPT)
+        results = [await script(keys=KEYS, args=[3, 60000, 1]) for _ in range(4)]
+
+        assert [allowed for allowed, _, _ in results] == [1, 1, 1, 0]
+        assert [remaining for _, remaining, _ in results[:3]] == [2, 1, 0]
+        assert 0 < results[3][2] <= 60000
+        assert 0 < await redis.pttl(KEYS[0]) <= 120000
+
+    redis_run(scenario)
+
+
+def test_sliding_window_refund(redis_run):
+    async def scenario(redis):
+        script = redis.register_script(SLIDING_WINDOW_SCRIPT)
+        for _ in range(2):
+            await script(keys=KEYS, args=[2, 60000, 1])
+        assert (await script(keys=KEYS, args=[2, 60000, 1]))[0] == 0
+
+        await script(keys=KEYS, args=[2, 60000, -1])
+        assert (await script(keys=KEYS, args=[2, 60000, 1]))[0] == 1
+
+    redis_run(scenario)
+
+
+def test_token_bucket_spends_and_refills(redis_run):
+    async def scenario(redis):
+        script = redis.register_script(TOKEN_BUCKET_SCRIPT)
+        # Capacity 2, full refill in 200 ms
+        assert (await script(keys=KEYS, args=[2, 200, 1]))[0] == 1
+        assert (await script(keys=KEYS, args=[2, 200, 1]))[0] == 1
+        allowed, remaining, retry_ms = await script(keys=KEYS, args=[2, 200, 1])
+        assert (allowed, remaining) == (0, 0)
+        assert 0 < retry_ms <= 100
+
+        await asyncio.sleep(0.12)
+        assert (await script(keys=KEYS, args=[2, 200, 1]))[0] == 1
+
+    redis_run(scenario)
+
+
+def test_limiter_blocks_locally_after_denial(redis_run):
+    async def scenario(redis):
+        limiter = RateLimiter()
+        rule = RateLimit("test", 1, 60)
+
+        assert (await limiter.hit(rule, "client")).allowed
+        denied = await limiter.hit(rule, "client")
+        assert not denied.allowed and denied.retry_after > 0
+
+        # The next denial comes from the local block without touching Redis
+        await redis.delete("ratelimit:test:client")
+        assert not (await limiter.hit(rule, "client")).allowed
+
+        await limiter.refund(rule, "client")
+        assert (await limiter.hit(rule, "client")).allowed
+
+    redis_run(scenario, rate_limit_module)
+
+
+def test_limiter_token_bucket_rule(redis_run):
+    async def scenario(redis):
+        limiter = RateLimiter()
+        rule = RateLimit("bucket", 2, 60, Algorithm.TOKEN_BUCKET)
+
+        assert [(await limiter.hit(rule, "client")).allowed for _ in range(3)] == [True, True, False]
+
+    redis_run(scenario, rate_limit_module)
+
+
+def test_limiter_fails_open_without_redis(monkeypatch):
+    async def get_redis():
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr(rate_limit_module, "get_redis", get_redis)
+    result = asyncio.run(RateLimiter().hit(RateLimit("test", 1, 60), "client"))
+    assert result.allowed
@@ -0,0 +1,69 @@
+import time
+
+from app.services.tokens import ALREADY_ROTATED, FAMILY_KEY, REUSED, ROTATE_SCRIPT, ROTATED, UNKNOWN
+
+KEYS = [FAMILY_KEY.format("f1")]
+TTL = 3600
+GRACE = 30
+
+
+async def issue(redis, jti="a"):
+    await redis.hset(KEYS[0], mapping={"jti": jti, "user_id": "u1"})
+    return redis.register_script(ROTATE_SCRIPT)
+
+
+def test_rotate_current_token(redis_run):
+    async def scenario(redis):
+        rotate = await issue(redis)
+        assert await rotate(keys=KEYS, args=["a", "b", TTL, GRACE]) == ROTATED
+
+        family = await redis.hgetall(KEYS[0])
+        assert family["jti"] == "b"
+        assert family["prev"] == "a"
+        assert 0 < await redis.ttl(KEYS[0]) <= TTL
+
+    redis_run(scenario)
+
+
+def test_unknown_family(redis_run):
+    async def scenario(redis):
+        rotate = redis.register_script(ROTATE_SCRIPT)
+        assert await rotate(keys=KEYS, args=["a", "b", TTL, GRACE]) == UNKNOWN
+
+    redis_run(scenario)
+
+
+def test_concurrent_refresh_within_grace_keeps_family(redis_run):
+    async def scenario(redis):
+        rotate = await issue(redis)
+        await rotate(keys=KEYS, args=["a", "b", TTL, GRACE])
+
+        assert await rotate(keys=KEYS, args=["a", "c", TTL, GRACE]) == ALREADY_ROTATED
+        assert await redis.hget(KEYS[0], "jti") == "b"
+
+    redis_run(scenario)
+
+
+def test_previous_token_after_grace_is_reuse(redis_run):
+    async def scenario(redis):
+        rotate = await issue(redis)
+        await rotate(keys=KEYS, args=["a", "b", TTL, GRACE])
+        await redis.hset(KEYS[0], "rotated_at", int(time.time()) - GRACE - 5)
+
+        assert await rotate(keys=KEYS, args=["a", "c", TTL, GRACE]) == REUSED
+        assert not await redis.exists(KEYS[0])
+
+    redis_run(scenario)
+
+
+def test_older_token_is_reuse(redis_run):
+    async def scenario(redis):
+        rotate = await issue(redis)
+        await rotate(keys=KEYS, args=["a", "b", TTL, GRACE])
+        await rotate(keys=KEYS, args=["b", "c", TTL, GRACE])
+
+        assert await rotate(keys=KEYS, args=["a", "d", TTL, GRACE]) == REUSED
+        # The family is gone, so even the current token stops working
+        assert await rotate(keys=KEYS, args=["c", "e", TTL, GRACE]) == UNKNOWN
+
+    redis_run(scenario)
@@ -0,0 +1,155 @@
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+import app.services.reminders as reminders_module
+from app.services.deal import parse_proposed_time
+from app.services.reminders import CLAIM_SCRIPT, INFLIGHT_KEY, PENDING_KEY, DealReminderScheduler
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+KEYS = [PENDING_KEY, INFLIGHT_KEY]
+
+
+def test_claim_moves_due_reminders_to_inflight(redis_run):
+    async def scenario(redis):
+        claim = redis.register_script(CLAIM_SCRIPT)
+        await redis.zadd(PENDING_KEY, {"1:3600": 100, "2:3600": 150, "3:3600": 300})
+
+        due = await claim(keys=KEYS, args=[200, 10, 260])
+
+        assert sorted(due) == ["1:3600", "2:3600"]
+        assert await redis.zrange(PENDING_KEY, 0, -1) == ["3:3600"]
+        assert await redis.zrange(INFLIGHT_KEY, 0, -1, withscores=True) == [("1:3600", 260), ("2:3600", 260)]
+
+    redis_run(scenario)
+
+
+def test_claim_respects_batch_size(redis_run):
+    async def scenario(redis):
+        claim = redis.register_script(CLAIM_SCRIPT)
+        await redis.zadd(PENDING_KEY, {f"{deal_id}:3600": deal_id for deal_id in range(1, 6)})
+
+        assert await claim(keys=KEYS, args=[100, 2, 160]) == ["1:3600", "2:3600"]
+        assert await claim(keys=KEYS, args=[100, 2, 160]) == ["3:3600", "4:3600"]
+        assert await redis.zcard(PENDING_KEY) == 1
+
+    redis_run(scenario)
+
+
+def test_claim_is_exclusive_while_lease_holds(redis_run):
+    async def scenario(redis):
+        claim = redis.register_script(CLAIM_SCRIPT)
+        await redis.zadd(PENDING_KEY, {"1:3600": 100})
+
+        assert await claim(keys=KEYS, args=[200, 10, 260]) == ["1:3600"]
+        assert await claim(keys=KEYS, args=[250, 10, 310]) == []
+
+    redis_run(scenario)
+
+
+def test_claim_returns_expired_leases_to_queue(redis_run):
+    async def scenario(redis):
+        claim = redis.register_script(CLAIM_SCRIPT)
+        await redis.zadd(PENDING_KEY, {"1:3600": 100})
+        await claim(keys=KEYS, args=[200, 10, 260])
+
+        # The worker died: after the lease the reminder is claimed again
+        assert await claim(keys=KEYS, args=[300, 10, 360]) == ["1:3600"]
+        assert await redis.zscore(INFLIGHT_KEY, "1:3600") == 360
+
+    redis_run(scenario)
+
+
+def fake_session(monkeypatch, rows):
+    """AsyncSessionLocal that returns rows as a single page"""
+    first, last = MagicMock(), MagicMock()
+    first.all.return_value = rows
+    last.all.return_value = []
+    db = MagicMock()
+    db.execute = AsyncMock(side_effect=[first, last])
+    session = MagicMock()
+    session.__aenter__ = AsyncMock(return_value=db)
+    session.__aexit__ = AsyncMock(return_value=False)
+    monkeypatch.setattr(reminders_module, "AsyncSessionLocal", lambda: session)
+
+
+def test_rebuild_keeps_due_and_inflight_reminders(redis_run, monkeypatch):
+    # The session starts in 30 minutes: the hour-before reminder came due during
+    # downtime, the day-before one is leased by a worker that crashed mid-send
+    scheduled_at = datetime.now(timezone.utc) + timedelta(minutes=30)
+    row = MagicMock(id=7, scheduled_at=scheduled_at)
+    row.__iter__.return_value = iter((7, scheduled_at))
+    fake_session(monkeypatch, [row])
+
+    async def scenario(redis):
+        due_at = scheduled_at.timestamp() - HOUR
+        await redis.zadd(PENDING_KEY, {"7:3600": due_at})
+        await redis.zadd(INFLIGHT_KEY, {"7:86400": time.time() + 60})
+
+        assert await DealReminderScheduler().rebuild() == 1
+
+        assert await redis.zrange(PENDING_KEY, 0, -1, withscores=True) == [("7:3600", due_at)]
+        assert await redis.zrange(INFLIGHT_KEY, 0, -1) == ["7:86400"]
+
+    redis_run(scenario, reminders_module)
+
+
+def test_rebuild_adds_missing_future_reminders(redis_run, monkeypatch):
+    scheduled_at = datetime.now(timezone.utc) + timedelta(days=2)
+    row = MagicMock(id=7, scheduled_at=scheduled_at)
+    row.__iter__.return_value = iter((7, scheduled_at))
+    fake_session(monkeypatch, [row])
+
+    async def scenario(redis):
+        await DealReminderScheduler().rebuild()
+
+        start = scheduled_at.timestamp()
+        assert await redis.zrange(PENDING_KEY, 0, -1, withscores=True) == [
+            ("7:86400", start - DAY), ("7:3600", start - HOUR)
+        ]
+
+    redis_run(scenario, reminders_module)
+
+
+def test_is_current_within_window():
+    start = 10 * DAY
+    assert DealReminderScheduler._is_current(start, DAY, start - DAY)
+    assert DealReminderScheduler._is_current(start, HOUR, start - HOUR + 5)
+
+
+def test_is_current_rejects_rescheduled_later():
+    start = 10 * DAY
+    assert not DealReminderScheduler._is_current(start, DAY, start - DAY - 60)
+
+
+def test_is_current_rejects_started_session():
+    start = 10 * DAY
+    assert not DealReminderScheduler._is_current(start, HOUR, start)
+    assert not DealReminderScheduler._is_current(start, HOUR, start + 60)
+
+
+def test_is_current_skips_superseded_reminder():
+    start = 10 * DAY
+    # After downtime the day-before reminder is due together with the hour-before one
+    assert not DealReminderScheduler._is_current(start, DAY, start - HOUR + 60)
+    assert DealReminderScheduler._is_current(start, HOUR, start - HOUR + 60)
+
+
+def test_parse_proposed_time_iso_with_offset():
+    assert parse_proposed_time("2026-10-20T15:30:00+03:00") == datetime(2026, 10, 20, 12, 30, tzinfo=timezone.utc)
+    assert parse_proposed_time("2026-10-20T12:30:00Z") == datetime(2026, 10, 20, 12, 30, tzinfo=timezone.utc)
+
+
+def test_parse_proposed_time_naive_uses_deal_timezone():
+    expected = datetime(2026, 10, 20, 12, 30, tzinfo=timezone.utc)
+    assert parse_proposed_time("2026-10-20 15:30") == expected
+    assert parse_proposed_time("20.10.2026 15:30") == expected
+    assert parse_proposed_time("20.10.2026, 15:30") == expected
+    assert parse_proposed_time("20.10.26 15:30") == expected
+
+
+def test_parse_proposed_time_unparseable():
+    assert parse_proposed_time(None) is None
+    assert parse_proposed_time("") is None
+    assert parse_proposed_time("завтра вечером") is None
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import random
+import time
+
+import app.services.pubsub as pubsub_module
+import app.services.rate_limit as rate_limit_module
+from app.config import settings
+from app.services.telegram_dispatcher import TelegramDispatcher
+from app.telegram.bot import telegram_bot_instance
+
+MODULES = (rate_limit_module, pubsub_module)
+
+
+def stub_deliver(monkeypatch, responses):
+    """deliver answers from responses in turn, repeating the last one; returns the list of calls"""
+    calls = []
+
+    async def deliver(chat_id, text, parse_mode="Markdown"):
+        calls.append(chat_id)
+        return responses[min(len(calls), len(responses)) - 1]
+
+    monkeypatch.setattr(telegram_bot_instance, "deliver", deliver)
+    return calls
+
+
+def fast_settings(monkeypatch):
+    monkeypatch.setattr(settings, "TELEGRAM_WORKERS", 2)
+    monkeypatch.setattr(settings, "TELEGRAM_PER_CHAT_RATE", 20.0)
+    monkeypatch.setattr(random, "uniform", lambda low, high: 0.01)
+
+
+def test_429_blocks_chat_and_pauses_all_processes(redis_run, monkeypatch):
+    fast_settings(monkeypatch)
+    calls = stub_deliver(monkeypatch, [(False, 0.3), (True, None)])
+
+    async def scenario(redis):
+        pubsub = redis.pubsub()
+        await pubsub.subscribe(TelegramDispatcher.CHANNEL)
+        await pubsub.get_message(timeout=1)
+
+        dispatcher = TelegramDispatcher()
+        await dispatcher.start()
+        try:
+            started = time.time()
+            assert await dispatcher.send("100", "hi", timeout=5)
+            assert time.time() - started >= 0.3
+            assert calls == ["100", "100"]
+            assert dispatcher._paused_until >= started + 0.3
+            assert dispatcher._chats["100"].blocked_until > 0
+            assert dispatcher.metrics()["rate_limited"] == 1
+
+            message = await pubsub.get_message(timeout=1)
+            assert json.loads(message["data"])["until"] == dispatcher._paused_until
+        finally:
+            await dispatcher.stop()
+            await pubsub.aclose()
+
+    redis_run(scenario, *MODULES)
+
+
+def test_pause_from_other_process_delays_sends(redis_run, monkeypatch):
+    fast_settings(monkeypatch)
+    stub_deliver(monkeypatch, [(True, None)])
+
+    async def scenario(redis):
+        dispatcher = TelegramDispatcher()
+        await dispatcher.start()
+        try:
+            await dispatcher._on_pause({"until": time.time() + 0.3})
+            started = time.time()
+            assert await dispatcher.send("100", "hi", timeout=5)
+            assert time.time() - started >= 0.25
+        finally:
+            await dispatcher.stop()
+
+    redis_run(scenario, *MODULES)
+
+
+def test_permanent_error_fails_without_retry(redis_run, monkeypatch):
+    fast_settings(monkeypatch)
+    calls = stub_deliver(monkeypatch, [(False, None)])
+
+    async def scenario(redis):
+        dispatcher = TelegramDispatcher()
+        await dispatcher.start()
+        try:
+            assert await dispatcher.send("100", "hi", timeout=5) is False
+            assert calls == ["100"]
+            assert dispatcher.metrics()["failed"] == 1
+            assert dispatcher.metrics()["retried"] == 0
+        finally:
+            await dispatcher.stop()
+
+    redis_run(scenario, *MODULES)
+
+
+def test_send_fails_after_max_attempts(redis_run, monkeypatch):
+    fast_settings(monkeypatch)
+    monkeypatch.setattr(settings, "TELEGRAM_MAX_ATTEMPTS", 3)
+    calls = stub_deliver(monkeypatch, [(False, 0.0)])
+
+    async def scenario(redis):
+        dispatcher = TelegramDispatcher()
+        await dispatcher.start()
+        try:
+            assert await dispatcher.send("100", "hi", timeout=5) is False
+            assert len(calls) == 3
+            assert dispatcher.metrics()["retried"] == 2
+        finally:
+            await dispatcher.stop()
+
+    redis_run(scenario, *MODULES)
+
+
+def test_busy_chat_does_not_hold_other_chats(redis_run, monkeypatch):
+    fast_settings(monkeypatch)
+    monkeypatch.setattr(settings, "TELEGRAM_PER_CHAT_RATE", 2.0)
+    monkeypatch.setattr(settings, "TELEGRAM_WORKERS", 1)
+    calls = stub_deliver(monkeypatch, [(True, None)])
+
+    async def scenario(redis):
+        dispatcher = TelegramDispatcher()
+        await dispatcher.start()
+        try:
+            busy = [asyncio.create_task(dispatcher.send("100", str(i), timeout=5)) for i in range(2)]
+            await asyncio.sleep(0.05)
+            started = time.time()
+            assert await dispatcher.send("200", "other", timeout=5)
+            assert time.time() - started < 0.3
+            assert await asyncio.gather(*busy) == [True, True]
+            # The second message for chat 100 waited for its own slot, after chat 200
+            assert calls == ["100", "200", "100"]
+        finally:
+            await dispatcher.stop()
+
+    redis_run(scenario, *MODULES)
+
+
+def test_idle_chat_buckets_are_evicted():
+    dispatcher = TelegramDispatcher()
+    dispatcher.CHAT_BUCKETS_LIMIT = 2
+    dispatcher._chat_bucket("1")
+    dispatcher._chat_bucket("2").reserve()
+
+    dispatcher._chat_bucket("3")
+    assert set(dispatcher._chats) == {"2", "3"}
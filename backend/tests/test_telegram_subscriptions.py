@@ -0,0 +1,53 @@
+import json
+
+import app.scripts.migrate_telegram_subscriptions as migration
+import app.services.telegram_service as telegram_service_module
+from app.services.telegram_service import LEGACY_SUBSCRIPTION_PREFIX, SUBSCRIPTIONS_KEY, TelegramService
+
+MODULES = (telegram_service_module, migration)
+
+
+async def legacy_subscribe(redis, user_id, chat_id):
+    await redis.set(f"{LEGACY_SUBSCRIPTION_PREFIX}{user_id}", json.dumps({"user_id": user_id, "chat_id": chat_id}))
+
+
+def test_reads_fall_back_to_legacy_keys_until_migrated(redis_run):
+    async def scenario(redis):
+        service = TelegramService()
+        await legacy_subscribe(redis, "u1", "100")
+        await service.subscribe_user("u2", "200")
+
+        assert await service.is_subscribed("u1")
+        assert await service.get_chat_id("u1") == "100"
+        assert await service.get_chat_ids(["u1", "u2", "u3"]) == {"u1": "100", "u2": "200"}
+
+        assert await migration.migrate() == 1
+        assert await redis.hlen(SUBSCRIPTIONS_KEY) == 2
+        assert await TelegramService().get_chat_ids(["u1", "u2"]) == {"u1": "100", "u2": "200"}
+
+    redis_run(scenario, *MODULES)
+
+
+def test_unsubscribe_before_migration_is_not_undone(redis_run):
+    async def scenario(redis):
+        service = TelegramService()
+        await legacy_subscribe(redis, "u1", "100")
+
+        await service.unsubscribe_user("u1")
+        assert not await service.is_subscribed("u1")
+
+        assert await migration.migrate() == 0
+        assert not await service.is_subscribed("u1")
+        assert await redis.hlen(SUBSCRIPTIONS_KEY) == 0
+
+    redis_run(scenario, *MODULES)
+
+
+def test_legacy_keys_ignored_after_migration(redis_run):
+    async def scenario(redis):
+        await migration.migrate()
+        await legacy_subscribe(redis, "u1", "100")
+
+        assert not await TelegramService().is_subscribed("u1")
+
+    redis_run(scenario, *MODULES)
@@ -0,0 +1,69 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import app.models.ad  # noqa: F401
+import app.models.admin  # noqa: F401
+import app.models.chat  # noqa: F401
+import app.models.deal  # noqa: F401
+import app.models.gamification  # noqa: F401
+import app.models.platform  # noqa: F401
+import app.services.pubsub as pubsub_module
+import app.services.user_cache as user_cache_module
+from app.models.user import User, UserProfile, UserRole
+from app.services.user_cache import FILL_SCRIPT, GENERATION_KEY, USER_KEY, UserCache
+
+KEYS = [USER_KEY.format("u1"), GENERATION_KEY.format("u1")]
+
+
+def make_db(first_name="Anna"):
+    user = User(id="u1", phone="+79990000000", is_active=True, role=UserRole.STUDENT)
+    user.profile = UserProfile(id="p1", user_id="u1", first_name=first_name)
+    result = MagicMock()
+    result.scalar_one_or_none.return_value = user
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=result)
+    return db
+
+
+def test_fill_writes_only_for_read_generation(redis_run):
+    async def scenario(redis):
+        fill = redis.register_script(FILL_SCRIPT)
+        await redis.set(KEYS[1], 3)
+        assert await fill(keys=KEYS, args=["2", "stale", 60]) == 0
+        assert await redis.get(KEYS[0]) is None
+        assert await fill(keys=KEYS, args=["3", "fresh", 60]) == 1
+        assert await redis.get(KEYS[0]) == "fresh"
+
+    redis_run(scenario)
+
+
+def test_get_reads_db_once_then_serves_cache(redis_run):
+    async def scenario(redis):
+        cache = UserCache()
+        db = make_db()
+
+        user = await cache.get("u1", db)
+        assert user.profile.first_name == "Anna"
+        assert await redis.get(KEYS[0]) is not None
+
+        # Local copy dropped: the snapshot comes from Redis, not from the DB
+        cache._drop_local(["u1"])
+        cached = await cache.get("u1", db)
+        assert cached.role == UserRole.STUDENT
+        assert cached.profile.first_name == "Anna"
+        assert db.execute.await_count == 1
+
+    redis_run(scenario, user_cache_module, pubsub_module)
+
+
+def test_invalidate_drops_both_levels(redis_run):
+    async def scenario(redis):
+        cache = UserCache()
+        await cache.get("u1", make_db("Anna"))
+
+        await cache.invalidate("u1")
+        assert await redis.get(KEYS[0]) is None
+
+        user = await cache.get("u1", make_db("Maria"))
+        assert user.profile.first_name == "Maria"
+
+    redis_run(scenario, user_cache_module, pubsub_module)
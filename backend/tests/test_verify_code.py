@@ -0,0 +1,68 @@
+from app.services.auth import VERIFY_CODE_SCRIPT
+
+KEYS = ["auth:code:+79990000000", "auth:code_attempts:+79990000000"]
+MAX_ATTEMPTS = 3
+LOCK_SECONDS = 900
+
+OK, WRONG, MISSING, LOCKED = 1, 0, -1, -2
+
+
+async def verify(redis, code):
+    script = redis.register_script(VERIFY_CODE_SCRIPT)
+    return await script(keys=KEYS, args=[code, MAX_ATTEMPTS, LOCK_SECONDS])
+
+
+def test_correct_code_is_consumed(redis_run):
+    async def scenario(redis):
+        await redis.set(KEYS[0], "1234")
+        assert await verify(redis, "1234") == [OK, MAX_ATTEMPTS]
+        assert await verify(redis, "1234") == [MISSING, MAX_ATTEMPTS]
+
+    redis_run(scenario)
+
+
+def test_wrong_code_counts_attempts(redis_run):
+    async def scenario(redis):
+        await redis.set(KEYS[0], "1234")
+        assert await verify(redis, "0000") == [WRONG, 2]
+        assert await verify(redis, "1111") == [WRONG, 1]
+        assert 0 < await redis.ttl(KEYS[1]) <= LOCK_SECONDS
+
+        # A correct code within the limit clears the counter
+        assert await verify(redis, "1234") == [OK, 1]
+        assert not await redis.exists(KEYS[1])
+
+    redis_run(scenario)
+
+
+def test_lockout_burns_code(redis_run):
+    async def scenario(redis):
+        await redis.set(KEYS[0], "1234")
+        for _ in range(MAX_ATTEMPTS - 1):
+            await verify(redis, "0000")
+        assert await verify(redis, "0000") == [WRONG, 0]
+        assert not await redis.exists(KEYS[0])
+
+        assert await verify(redis, "1234") == [LOCKED, 0]
+
+    redis_run(scenario)
+
+
+def test_new_code_does_not_reset_lockout(redis_run):
+    async def scenario(redis):
+        await redis.set(KEYS[0], "1234")
+        for _ in range(MAX_ATTEMPTS):
+            await verify(redis, "0000")
+
+        await redis.set(KEYS[0], "5678")
+        assert await verify(redis, "5678") == [LOCKED, 0]
+
+    redis_run(scenario)
+
+
+def test_missing_code(redis_run):
+    async def scenario(redis):
+        assert await verify(redis, "1234") == [MISSING, MAX_ATTEMPTS]
+        assert not await redis.exists(KEYS[1])
+
+    redis_run(scenario)